@@ -0,0 +1,225 @@
+# coding=utf-8
+"""
+Exports units, groups and statics to Arrow record batches and Parquet files
+
+The columns are built in a single walk over the raw mission tables (no BaseUnit, Group or Static objects are
+created). Missions are processed one at a time, so a whole library can be written without holding more than one
+mission in memory.
+
+Requires the optional "pyarrow" dependency (pip install emiz[arrow]).
+"""
+import typing
+from pathlib import Path
+
+import elib
+
+from emiz.mission import Mission
+from emiz.miz import Miz
+from emiz.miz_archive import file_sha256
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:  # pragma: no cover
+    pyarrow = None
+
+LOGGER = elib.custom_logging.get_logger('EMIZ')
+
+_GROUP_CATEGORIES = ('helicopter', 'plane', 'ship', 'vehicle')
+
+# table name -> ((column name, type name), ...); type names are resolved by _arrow_type
+COLUMNS: typing.Dict[str, typing.Tuple[typing.Tuple[str, str], ...]] = {
+    'units': (
+        ('mission_hash', 'category'),
+        ('coalition', 'category'),
+        ('country_id', 'int32'),
+        ('category', 'category'),
+        ('group_id', 'int32'),
+        ('unit_id', 'int32'),
+        ('unit_name', 'string'),
+        ('unit_type', 'category'),
+        ('skill', 'category'),
+        ('x', 'float64'),
+        ('y', 'float64'),
+        ('alt', 'float64'),
+        ('heading', 'float64'),
+    ),
+    'groups': (
+        ('mission_hash', 'category'),
+        ('coalition', 'category'),
+        ('country_id', 'int32'),
+        ('category', 'category'),
+        ('group_id', 'int32'),
+        ('group_name', 'string'),
+        ('hidden', 'bool_'),
+        ('start_time', 'int32'),
+        ('unit_count', 'int32'),
+        ('x', 'float64'),
+        ('y', 'float64'),
+    ),
+    'statics': (
+        ('mission_hash', 'category'),
+        ('coalition', 'category'),
+        ('country_id', 'int32'),
+        ('static_id', 'int32'),
+        ('static_name', 'string'),
+        ('static_type', 'category'),
+        ('category', 'category'),
+        ('x', 'float64'),
+        ('y', 'float64'),
+        ('heading', 'float64'),
+    ),
+}
+
+
+def _require_pyarrow():
+    if pyarrow is None:
+        raise ImportError('Arrow export requires pyarrow; install it with: pip install emiz[arrow]')
+
+
+def _arrow_type(type_name: str):
+    if type_name == 'category':
+        return pyarrow.dictionary(pyarrow.int32(), pyarrow.string())
+    return getattr(pyarrow, type_name)()
+
+
+def schema(table: str) -> 'pyarrow.Schema':
+    """
+    Args:
+        table: one of "units", "groups" or "statics"
+
+    Returns: Arrow schema of the table
+
+    """
+    _require_pyarrow()
+    return pyarrow.schema([pyarrow.field(name, _arrow_type(type_name)) for name, type_name in COLUMNS[table]])
+
+
+def _values(container) -> typing.Iterable:
+    # lua tables with consecutive integer keys may be decoded as either dictionaries or lists
+    if isinstance(container, dict):
+        return container.values()
+    return container or ()
+
+
+# pylint: disable=too-many-locals
+def _walk(mission_dict: dict, l10n: dict, mission_hash: str) -> typing.Dict[str, typing.Dict[str, list]]:
+    columns: typing.Dict[str, typing.Dict[str, list]] = {
+        table: {name: [] for name, _ in table_columns} for table, table_columns in COLUMNS.items()
+    }
+    units, groups, statics = columns['units'], columns['groups'], columns['statics']
+    for coalition, coalition_dict in mission_dict['coalition'].items():
+        for country in _values(coalition_dict.get('country')):
+            country_id = country['id']
+            for category in _GROUP_CATEGORIES:
+                for group in _values(country.get(category, {}).get('group')):
+                    group_units = list(_values(group.get('units')))
+                    group_id = group['groupId']
+                    for key, value in (
+                            ('mission_hash', mission_hash), ('coalition', coalition), ('country_id', country_id),
+                            ('category', category), ('group_id', group_id),
+                            ('group_name', l10n.get(group.get('name'), group.get('name'))),
+                            ('hidden', bool(group.get('hidden', False))), ('start_time', group.get('start_time')),
+                            ('unit_count', len(group_units)), ('x', group.get('x')), ('y', group.get('y')),
+                    ):
+                        groups[key].append(value)
+                    for unit in group_units:
+                        for key, value in (
+                                ('mission_hash', mission_hash), ('coalition', coalition),
+                                ('country_id', country_id), ('category', category), ('group_id', group_id),
+                                ('unit_id', unit['unitId']),
+                                ('unit_name', l10n.get(unit.get('name'), unit.get('name'))),
+                                ('unit_type', unit.get('type')), ('skill', unit.get('skill')), ('x', unit.get('x')),
+                                ('y', unit.get('y')), ('alt', unit.get('alt')), ('heading', unit.get('heading')),
+                        ):
+                            units[key].append(value)
+            for static in _values(country.get('static', {}).get('group')):
+                static_unit = next(iter(_values(static.get('units'))), {})
+                for key, value in (
+                        ('mission_hash', mission_hash), ('coalition', coalition), ('country_id', country_id),
+                        ('static_id', static['groupId']),
+                        ('static_name', l10n.get(static.get('name'), static.get('name'))),
+                        ('static_type', static_unit.get('type')), ('category', static_unit.get('category')),
+                        ('x', static_unit.get('x')), ('y', static_unit.get('y')),
+                        ('heading', static_unit.get('heading')),
+                ):
+                    statics[key].append(value)
+    return columns
+
+
+def _record_batch(table: str, columns: typing.Dict[str, list]) -> 'pyarrow.RecordBatch':
+    arrays = []
+    for name, type_name in COLUMNS[table]:
+        if type_name == 'category':
+            arrays.append(pyarrow.array(columns[name], type=pyarrow.string()).dictionary_encode())
+        else:
+            arrays.append(pyarrow.array(columns[name], type=_arrow_type(type_name)))
+    return pyarrow.RecordBatch.from_arrays(arrays, schema=schema(table))
+
+
+def record_batches(mission: Mission, mission_hash: str = '') -> typing.Dict[str, 'pyarrow.RecordBatch']:
+    """
+    Converts the units, groups and statics of a mission to Arrow record batches
+
+    Args:
+        mission: mission to convert
+        mission_hash: identifier of the mission, written in every row
+
+    Returns: dictionary of table name ("units", "groups" or "statics") -> record batch
+
+    """
+    _require_pyarrow()
+    columns = _walk(mission.d, mission.l10n, mission_hash)
+    return {table: _record_batch(table, table_columns) for table, table_columns in columns.items()}
+
+
+def iter_record_batches(
+        miz_files: typing.Iterable[typing.Union[str, Path]]
+) -> typing.Iterator[typing.Tuple[Path, typing.Dict[str, 'pyarrow.RecordBatch']]]:
+    """
+    Converts MIZ files one at a time
+
+    Each mission is identified by the SHA-256 of its MIZ file.
+
+    Args:
+        miz_files: MIZ files to convert
+
+    Returns: generator of tuples of MIZ file, record batches (see record_batches)
+
+    """
+    _require_pyarrow()
+    for miz_file in miz_files:
+        miz_path = elib.path.ensure_file(miz_file)
+        LOGGER.debug('converting to Arrow: %s', miz_path)
+        yield miz_path, record_batches(Miz.read_mission(miz_path), file_sha256(miz_path))
+
+
+def write_parquet(
+        miz_files: typing.Iterable[typing.Union[str, Path]],
+        output_folder: typing.Union[str, Path],
+) -> typing.Dict[str, Path]:
+    """
+    Writes the units, groups and statics of MIZ files to Parquet files (one per table)
+
+    Rows are appended mission after mission; only one mission is held in memory at a time.
+
+    Args:
+        miz_files: MIZ files to export
+        output_folder: folder to write "units.parquet", "groups.parquet" and "statics.parquet" into
+
+    Returns: dictionary of table name -> Parquet file
+
+    """
+    _require_pyarrow()
+    output_folder = elib.path.ensure_dir(output_folder, must_exist=False)
+    output_folder.mkdir(parents=True, exist_ok=True)
+    paths = {table: output_folder.joinpath(f'{table}.parquet') for table in COLUMNS}
+    writers = {table: pyarrow.parquet.ParquetWriter(str(path), schema(table)) for table, path in paths.items()}
+    try:
+        for _, batches in iter_record_batches(miz_files):
+            for table, batch in batches.items():
+                writers[table].write_table(pyarrow.Table.from_batches([batch]))
+    finally:
+        for writer in writers.values():
+            writer.close()
+    return paths
@@ -0,0 +1,186 @@
+# coding=utf-8
+"""
+asyncio front-end for Miz
+
+The blocking steps (unzipping, decoding, encoding and zipping) run in executors, so the event loop stays responsive
+while a mission is opened or saved:
+
+- disk access, zlib and small edits run in a thread pool
+- the lua (SLTP) decoding and encoding can be sent to a separate executor, typically a process pool, since they are
+  pure Python and hold the GIL; the three tables of a mission are decoded (or encoded) concurrently
+
+Awaiting coroutines can be cancelled: the event loop is released right away, while the step that was already running
+completes in the background. A cancelled "save" never leaves a partially written MIZ file behind.
+"""
+import asyncio
+import functools
+import os
+import threading
+import typing
+from concurrent.futures import Executor, Future, ThreadPoolExecutor
+from pathlib import Path
+
+import elib
+
+from emiz.edit_miz import apply_weather_and_time
+from emiz.mission import Mission
+from emiz.miz import Miz, decode_table_file, encode_table
+
+LOGGER = elib.custom_logging.get_logger('EMIZ')
+
+
+def _zip(miz: Miz, destination: Path, compression_level: typing.Optional[int], cancelled: threading.Event) -> str:
+    partial_file = destination.with_name(f'{destination.name}.part')
+    try:
+        miz.zip(partial_file, encode=False, compression_level=compression_level)
+        if cancelled.is_set():
+            LOGGER.debug('save cancelled, discarding: %s', partial_file)
+            return ''
+        os.replace(str(partial_file), str(destination))
+        return str(destination)
+    finally:
+        if partial_file.exists():
+            partial_file.unlink()
+
+
+class AsyncMiz:
+    """
+    Asynchronous counterpart of Miz, to be used as an async context manager:
+
+        async with AsyncMiz('some.miz') as miz:
+            await miz.apply(metar='UGTB 240830Z 31017KT CAVOK 11/02 Q1012', time='20180201225000')
+            await miz.save('other.miz')
+
+    The mission can also be edited directly, through "mission" (the usual Mission object); such edits run in the
+    event loop thread.
+    """
+
+    def __init__(
+            self,
+            path_to_miz_file: typing.Union[str, Path],
+            executor: Executor = None,
+            sltp_executor: Executor = None,
+            keep_temp_dir: bool = False,
+            overwrite: bool = False,
+    ) -> None:
+        """
+        Args:
+            path_to_miz_file: MIZ file
+            executor: executor used for disk access and zlib (defaults to a thread pool owned by this object)
+            sltp_executor: executor used to decode and encode the lua tables, for example a ProcessPoolExecutor
+                (defaults to "executor")
+            keep_temp_dir: do not remove the temp dir when closing
+            overwrite: overwrite the temp dir if it already exists
+        """
+        self.miz = Miz(path_to_miz_file, keep_temp_dir=keep_temp_dir, overwrite=overwrite)
+        self._own_executor = executor is None
+        self._executor = executor or ThreadPoolExecutor(max_workers=3)
+        self._sltp_executor = sltp_executor or self._executor
+        self._running: typing.Set[Future] = set()
+
+    async def __aenter__(self):
+        LOGGER.debug('instantiating new AsyncMiz object as a context')
+        await self.open()
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, _):
+        await self.close(error=exc_type is not None and exc_type is not asyncio.CancelledError)
+        return False
+
+    @property
+    def mission(self) -> Mission:
+        """
+        Returns: mission of the MIZ file (must be opened first)
+        """
+        return self.miz.mission
+
+    async def _run(self, executor: Executor, function, *args):
+        future = executor.submit(functools.partial(function, *args))
+        self._running.add(future)
+        future.add_done_callback(self._running.discard)
+        return await asyncio.wrap_future(future)
+
+    async def open(self):
+        """
+        Extracts the MIZ file and decodes its lua tables
+        """
+        miz = self.miz
+        if miz._mission is not None:  # pylint: disable=protected-access
+            return
+        await self._run(self._executor, miz.unzip, miz.overwrite)
+        tables = await asyncio.gather(*(
+            self._run(self._sltp_executor, decode_table_file, str(file_path))
+            for file_path in (miz.map_res_file, miz.dictionary_file, miz.mission_file)
+        ))
+        await self._run(self._executor, miz._load_tables, *tables)  # pylint: disable=protected-access
+
+    async def apply(
+            self,
+            metar: str = None,
+            time: str = None,
+            min_wind: int = 0,
+            max_wind: int = 40,
+    ):
+        """
+        Sets the weather and/or the date and time of the mission
+
+        Args:
+            metar: METAR string or ICAO to apply
+            time: time string to apply (YYYYMMDDHHMMSS)
+            min_wind: minimum wind
+            max_wind: maximum wind
+
+        Raises ValueError if the METAR or the time string cannot be applied.
+
+        """
+        if not metar and not time:
+            raise ValueError('nothing to do!')
+        await self._run(self._executor, apply_weather_and_time, self.miz, metar, time, min_wind, max_wind)
+
+    async def save(self, destination: typing.Union[str, Path] = None, compression_level: int = None) -> str:
+        """
+        Encodes the modified lua tables and writes the MIZ file
+
+        The MIZ file is written next to its destination first, then moved in place; if the save is cancelled, the
+        destination is left untouched.
+
+        Args:
+            destination: target MIZ file (if none, defaults to source MIZ + "_EMIZ")
+            compression_level: zlib compression level (see Miz.zip)
+
+        Returns: destination file
+
+        """
+        miz = self.miz
+        tables = miz._tables_to_encode()  # pylint: disable=protected-access
+        texts = await asyncio.gather(*(
+            self._run(self._sltp_executor, encode_table, table, qualifier) for _, table, qualifier in tables
+        ))
+        for (file_path, _, _), text in zip(tables, texts):
+            await self._run(self._executor, miz._write_text, file_path, text)  # pylint: disable=protected-access
+        miz._take_snapshot()  # pylint: disable=protected-access
+
+        cancelled = threading.Event()
+        destination_path = miz._destination(destination)  # pylint: disable=protected-access
+        try:
+            return await self._run(self._executor, _zip, miz, destination_path, compression_level, cancelled)
+        except asyncio.CancelledError:
+            cancelled.set()
+            raise
+
+    async def close(self, error: bool = False):
+        """
+        Waits for the steps still running in the background, then removes the temp dir
+
+        Args:
+            error: keep the temp dir, for inspection
+        """
+        if self._running:
+            await asyncio.wait([asyncio.wrap_future(future) for future in list(self._running)])
+        if error:
+            LOGGER.error('there were error with this mission, keeping temp dir at "%s"', self.miz.temp_dir)
+        elif not self.miz.keep_temp_dir:
+            LOGGER.debug('removing temp dir: %s', self.miz.temp_dir)
+            await self._run(self._executor, self.miz._remove_temp_dir)  # pylint: disable=protected-access
+        if self._own_executor:
+            self._executor.shutdown(wait=False)
@@ -0,0 +1,155 @@
+# coding=utf-8
+"""
+Runs an operation over many files, optionally in worker processes, profiling and timing it
+
+Every input is processed by a task (a module-level function, so that it can be sent to worker processes). When
+asked to, each task runs under cProfile and records the spans of the pipeline (see emiz.metrics); the profiles and
+spans of all tasks are gathered in the calling process, whichever process ran them.
+"""
+import contextlib
+import cProfile
+import os
+import pstats
+import tempfile
+import time as time_
+import typing
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+
+import elib
+
+from emiz.metrics import Span, SpanRecorder, subscribed
+
+LOGGER = elib.custom_logging.get_logger('EMIZ')
+
+
+@dataclass
+class TaskResult:
+    """
+    Outcome of a single task
+    """
+    item: str
+    value: typing.Any = None
+    error: str = ''
+    seconds: float = 0.0
+    spans: typing.List[Span] = field(default_factory=list)
+
+
+@dataclass
+class StageTimings:
+    """
+    Spans of the same name, aggregated over all the tasks of a batch
+    """
+    name: str
+    count: int = 0
+    seconds: float = 0.0
+    size: int = 0
+
+
+@dataclass
+class BatchResult:
+    """
+    Outcome of run_batch
+    """
+    tasks: typing.List[TaskResult] = field(default_factory=list)
+    # profile of all the tasks, if profiling was requested
+    profile: typing.Optional[pstats.Stats] = None
+
+    @property
+    def failed(self) -> typing.List[TaskResult]:
+        """
+        Returns: tasks that raised an error
+        """
+        return [task for task in self.tasks if task.error]
+
+    def timings(self) -> typing.List[StageTimings]:
+        """
+        Returns: spans of all the tasks, aggregated by name, in the order they first closed
+        """
+        stages: typing.Dict[str, StageTimings] = {}
+        for task in self.tasks:
+            for span in task.spans:
+                stage = stages.setdefault(span.name, StageTimings(span.name))
+                stage.count += 1
+                stage.seconds += span.seconds
+                stage.size += span.size
+        return list(stages.values())
+
+
+def _run_task(
+        func: typing.Callable,
+        item: str,
+        args: tuple,
+        profile_dir: typing.Optional[str],
+        timings: bool,
+) -> typing.Tuple[TaskResult, typing.Optional[str]]:
+    result = TaskResult(item)
+    recorder = SpanRecorder()
+    profiler = cProfile.Profile() if profile_dir else None
+    start = time_.perf_counter()
+    try:
+        with contextlib.ExitStack() as stack:
+            if timings:
+                stack.enter_context(subscribed(recorder))
+            if profiler:
+                profiler.enable()
+            try:
+                result.value = func(item, *args)
+            finally:
+                if profiler:
+                    profiler.disable()
+    except Exception as error:  # pylint: disable=broad-except
+        LOGGER.exception('error while processing: %s', item)
+        result.error = str(error) or type(error).__name__
+    result.seconds = time_.perf_counter() - start
+    result.spans = recorder.spans
+
+    profile_file = None
+    if profiler:
+        profile_file = str(Path(profile_dir, f'{uuid.uuid4().hex}.prof'))
+        profiler.dump_stats(profile_file)
+    return result, profile_file
+
+
+def run_batch(
+        func: typing.Callable,
+        items: typing.Iterable[typing.Union[str, Path]],
+        args: tuple = (),
+        jobs: int = None,
+        profile: bool = False,
+        timings: bool = False,
+) -> BatchResult:
+    """
+    Calls func(item, *args) for every item
+
+    Errors raised by a task are recorded in its TaskResult; the other tasks still run.
+
+    Args:
+        func: module-level function (it is sent to worker processes by reference)
+        items: inputs, usually files
+        args: additional arguments given to every call
+        jobs: amount of worker processes (defaults to the amount of CPUs; 1 runs the tasks in this process)
+        profile: run every task under cProfile, and gather the profiles in BatchResult.profile
+        timings: record the spans of every task (see emiz.metrics) in TaskResult.spans
+
+    Returns: BatchResult, with the tasks in the order of the items
+
+    """
+    items = [str(item) for item in items]
+    jobs = max(1, min(jobs or os.cpu_count() or 1, len(items)))
+    LOGGER.debug('processing %s item(s) using %s worker(s)', len(items), jobs)
+    with tempfile.TemporaryDirectory(prefix='EMIZ_PROFILE') as profile_dir:
+        task_args = [(func, item, args, profile_dir if profile else None, timings) for item in items]
+        if jobs == 1:
+            outcomes = [_run_task(*task) for task in task_args]
+        else:
+            with ProcessPoolExecutor(jobs) as executor:
+                outcomes = list(executor.map(_run_task, *zip(*task_args)))
+
+        batch = BatchResult(tasks=[task for task, _ in outcomes])
+        profile_files = [profile_file for _, profile_file in outcomes if profile_file]
+        if profile_files:
+            batch.profile = pstats.Stats(*profile_files)
+    return batch
@@ -0,0 +1,336 @@
+# coding=utf-8
+"""
+Benchmarks of the MIZ pipeline, stage by stage
+
+Each MIZ file goes through the stages below; every stage is timed on its own (best of "repeat" runs), then run once
+more under tracemalloc to measure its peak memory (tracing slows Python down, so the two are kept apart):
+
+- unzip: extraction of the archive (Miz.unzip)
+- decode:<table>: decoding of each lua table (SLTP.decode)
+- traverse: walk over all the groups and units through the Mission object model
+- encode:<table>: encoding of each lua table (SLTP.encode)
+- zip: writing the archive, re-compressing all members (Miz.zip)
+
+Results can be saved as JSON, along with the versions of Python and emiz, so that runs can be compared between
+releases. Larger inputs can be generated from any MIZ file with "inflate_miz", or from scratch with
+emiz.synthetic.generate_miz.
+
+"bench_layouts" compares the two decomposition layouts instead: the folder of JSON files (emiz.new_miz) and the
+single-file pack (emiz.miz_pack).
+"""
+import json
+import platform
+import shutil
+import tempfile
+import time as time_
+import tracemalloc
+import typing
+import zlib
+from dataclasses import asdict, dataclass, field
+from datetime import datetime
+from pathlib import Path
+
+import elib
+
+import emiz
+from emiz.mission import Mission
+from emiz.miz import Miz, decode_table_file, encode_table
+from emiz.miz_pack import decompose_to_pack, recompose_from_pack
+from emiz.new_miz import NewMiz
+
+LOGGER = elib.custom_logging.get_logger('EMIZ')
+
+# (stage name, attribute of Miz holding the file of the table)
+_TABLES = (('mapResource', 'map_res_file'), ('dictionary', 'dictionary_file'), ('mission', 'mission_file'))
+
+
+@dataclass
+class StageResult:
+    """
+    Measures of a single stage
+    """
+    stage: str
+    seconds: float
+    peak_memory: int = 0
+    # bytes processed: size of the lua text for decode and encode, size of the archive for unzip and zip
+    size: int = 0
+
+
+@dataclass
+class BenchResult:
+    """
+    Measures of all the stages for a MIZ file
+    """
+    file: str
+    groups: int = 0
+    units: int = 0
+    stages: typing.List[StageResult] = field(default_factory=list)
+
+    @property
+    def total(self) -> float:
+        """
+        Returns: total duration of the stages, in seconds
+        """
+        return sum(stage.seconds for stage in self.stages)
+
+
+def _traverse(mission: Mission) -> typing.Tuple[int, int]:
+    groups = units = 0
+    for group in mission.groups:
+        groups += 1
+        _ = group.group_name, group.group_id
+        for unit in group.units:
+            units += 1
+            _ = unit.unit_name, unit.unit_type, unit.unit_id, unit.unit_pos_x, unit.unit_pos_y
+    return groups, units
+
+
+class _Pipeline:
+    """
+    Runs the stages one after the other, keeping the intermediate results
+    """
+
+    def __init__(self, path: Path, work_dir: Path) -> None:
+        self.path = path
+        self.work_dir = work_dir
+        self.miz: typing.Optional[Miz] = None
+        self.tables: typing.Dict[str, typing.Tuple[dict, str]] = {}
+        self.counts = (0, 0)
+
+    def stages(self) -> typing.List[typing.Tuple[str, typing.Callable[[], int]]]:
+        """
+        Returns: list of (stage name, function running the stage and returning the amount of bytes processed)
+        """
+        stages: typing.List[typing.Tuple[str, typing.Callable[[], int]]] = [('unzip', self.unzip)]
+        stages.extend((f'decode:{name}', self._decode(name, attribute)) for name, attribute in _TABLES)
+        stages.append(('traverse', self.traverse))
+        stages.extend((f'encode:{name}', self._encode(name, attribute)) for name, attribute in _TABLES)
+        stages.append(('zip', self.zip))
+        return stages
+
+    def unzip(self) -> int:
+        """
+        Extracts the archive
+        """
+        if self.miz is not None:
+            self.close()
+        self.miz = Miz(self.path)
+        self.miz.unzip()
+        return self.path.stat().st_size
+
+    def _decode(self, name: str, attribute: str) -> typing.Callable[[], int]:
+        def _stage() -> int:
+            file_path = getattr(self.miz, attribute)
+            self.tables[name] = decode_table_file(file_path)
+            if len(self.tables) == len(_TABLES):
+                self.miz._load_tables(  # pylint: disable=protected-access
+                    self.tables['mapResource'], self.tables['dictionary'], self.tables['mission']
+                )
+            return file_path.stat().st_size
+
+        return _stage
+
+    def traverse(self) -> int:
+        """
+        Walks over the groups and units
+        """
+        self.counts = _traverse(self.miz.mission)
+        return 0
+
+    def _encode(self, name: str, attribute: str) -> typing.Callable[[], int]:
+        def _stage() -> int:
+            table, qualifier = self.tables[name]
+            text = encode_table(table, qualifier)
+            self.miz._write_text(getattr(self.miz, attribute), text)  # pylint: disable=protected-access
+            return len(text)
+
+        return _stage
+
+    def zip(self) -> int:
+        """
+        Writes the archive
+        """
+        destination = self.work_dir.joinpath(self.path.name)
+        self.miz.zip(destination, encode=False, compression_level=zlib.Z_DEFAULT_COMPRESSION)
+        return destination.stat().st_size
+
+    def close(self):
+        """
+        Removes the temp dir of the current Miz
+        """
+        if self.miz is not None:
+            self.miz._remove_temp_dir()  # pylint: disable=protected-access
+            self.miz = None
+
+
+def bench_miz(path_to_miz_file: typing.Union[str, Path], repeat: int = 3, memory: bool = True) -> BenchResult:
+    """
+    Measures each stage of the pipeline for a MIZ file
+
+    Args:
+        path_to_miz_file: MIZ file
+        repeat: amount of runs; the fastest one is kept for each stage
+        memory: measure the peak memory of each stage (in an additional run)
+
+    Returns: BenchResult
+
+    """
+    path = elib.path.ensure_file(path_to_miz_file)
+    result = BenchResult(file=str(path))
+    work_dir = Path(tempfile.mkdtemp('EMIZ_BENCH'))
+    try:
+        measures: typing.Dict[str, StageResult] = {}
+        for _ in range(max(repeat, 1)):
+            pipeline = _Pipeline(path, work_dir)
+            try:
+                for stage, function in pipeline.stages():
+                    start = time_.perf_counter()
+                    size = function()
+                    seconds = time_.perf_counter() - start
+                    if stage not in measures or seconds < measures[stage].seconds:
+                        measures[stage] = StageResult(stage, seconds, size=size)
+                result.groups, result.units = pipeline.counts
+            finally:
+                pipeline.close()
+
+        if memory:
+            pipeline = _Pipeline(path, work_dir)
+            tracemalloc.start()
+            try:
+                for stage, function in pipeline.stages():
+                    tracemalloc.clear_traces()
+                    function()
+                    measures[stage].peak_memory = tracemalloc.get_traced_memory()[1]
+            finally:
+                tracemalloc.stop()
+                pipeline.close()
+
+        result.stages = list(measures.values())
+    finally:
+        shutil.rmtree(str(work_dir), ignore_errors=True)
+    LOGGER.debug('bench: %s: %.3fs', path, result.total)
+    return result
+
+
+def _disk_size(path: Path) -> int:
+    if path.is_file():
+        return path.stat().st_size
+    return sum(file.stat().st_size for file in path.rglob('*') if file.is_file())
+
+
+def bench_layouts(path_to_miz_file: typing.Union[str, Path], repeat: int = 3) -> BenchResult:
+    """
+    Measures the decomposition of a MIZ file, and its recomposition, with the JSON layout and with the pack layout
+
+    Stages are "decompose:json", "recompose:json", "decompose:pack" and "recompose:pack"; the size of the decompose
+    stages is the amount of bytes written.
+
+    Args:
+        path_to_miz_file: MIZ file
+        repeat: amount of runs; the fastest one is kept for each stage
+
+    Returns: BenchResult
+
+    """
+    path = elib.path.ensure_file(path_to_miz_file)
+    result = BenchResult(file=str(path))
+    work_dir = Path(tempfile.mkdtemp('EMIZ_BENCH'))
+    layouts = (
+        ('json', work_dir.joinpath('json'), NewMiz.decompose, NewMiz.recompose),
+        ('pack', work_dir.joinpath('mission.emizpack'), decompose_to_pack, recompose_from_pack),
+    )
+    try:
+        measures: typing.Dict[str, StageResult] = {}
+        for _ in range(max(repeat, 1)):
+            for layout, output, decompose, recompose in layouts:
+                target = work_dir.joinpath(f'{layout}.miz')
+                for stage, function, size in (
+                        (f'decompose:{layout}', lambda: decompose(path, output), lambda: _disk_size(output)),
+                        (f'recompose:{layout}', lambda: recompose(output, target), lambda: target.stat().st_size),
+                ):
+                    if target.exists():
+                        target.unlink()
+                    start = time_.perf_counter()
+                    function()
+                    seconds = time_.perf_counter() - start
+                    if stage not in measures or seconds < measures[stage].seconds:
+                        measures[stage] = StageResult(stage, seconds, size=size())
+        result.stages = list(measures.values())
+    finally:
+        shutil.rmtree(str(work_dir), ignore_errors=True)
+    LOGGER.debug('bench layouts: %s: %.3fs', path, result.total)
+    return result
+
+
+def inflate_miz(
+        source: typing.Union[str, Path],
+        destination: typing.Union[str, Path],
+        units: int,
+) -> Path:
+    """
+    Writes a larger copy of a MIZ file, adding copies of its first group until it holds at least "units" units
+
+    Args:
+        source: MIZ file to inflate (must hold at least one group)
+        destination: MIZ file to write
+        units: amount of units to reach
+
+    Returns: destination
+
+    """
+    with Miz(source) as miz:
+        mission = miz.mission
+        template = next(mission.groups)
+        current = len(list(mission.units))
+        copies = max(0, -(-(units - current) // template.group_size()))
+        if copies:
+            origin_x, origin_y = next(template.units).unit_position
+            names = [f'bench-{index}' for index in range(copies)]
+            positions = [(origin_x + 100.0 * (index % 100), origin_y + 100.0 * (index // 100))
+                         for index in range(copies)]
+            country = mission.get_country_by_id(template.country_id)
+            country.add_groups_from_template(template, positions, names)
+        return Path(miz.zip(destination))
+
+
+def run_benchmarks(
+        miz_files: typing.Iterable[typing.Union[str, Path]],
+        output: typing.Union[str, Path] = None,
+        repeat: int = 3,
+        memory: bool = True,
+) -> typing.List[BenchResult]:
+    """
+    Benchmarks many MIZ files, and optionally saves the results as JSON
+
+    Args:
+        miz_files: MIZ files to benchmark
+        output: JSON file to write
+        repeat: amount of runs per file (see bench_miz)
+        memory: measure the peak memory of each stage
+
+    Returns: list of BenchResult
+
+    """
+    results = [bench_miz(miz_file, repeat, memory) for miz_file in miz_files]
+    if output is not None:
+        save_results(results, output)
+    return results
+
+
+def save_results(results: typing.Iterable[BenchResult], output: typing.Union[str, Path]):
+    """
+    Writes benchmark results as JSON, along with the versions of Python and emiz
+
+    Args:
+        results: list of BenchResult
+        output: JSON file to write
+    """
+    document = {
+        'datetime': datetime.utcnow().isoformat(),
+        'emiz': emiz.__version__,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'machine': platform.machine(),
+        'results': [asdict(result) for result in results],
+    }
+    Path(output).write_text(json.dumps(document, indent=2))
@@ -0,0 +1,335 @@
+# coding=utf-8
+"""
+Searchable index of a library of MIZ files
+
+The index is an SQLite database; scanning a folder only reads the MIZ files that were added or changed (according to
+their size and modification time) since the last scan.
+"""
+import collections
+import io
+import multiprocessing
+import os
+import sqlite3
+import typing
+from dataclasses import dataclass, field
+from pathlib import Path
+from zipfile import ZipFile
+
+import elib
+
+from emiz.mission import Mission
+from emiz.miz import ENCODING
+from emiz.miz_archive import file_sha256
+from emiz.sltp import SLTP, peek
+
+LOGGER = elib.custom_logging.get_logger('EMIZ')
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS missions (
+    id INTEGER PRIMARY KEY,
+    path TEXT NOT NULL UNIQUE,
+    size INTEGER NOT NULL,
+    mtime REAL NOT NULL,
+    hash TEXT NOT NULL,
+    theatre TEXT,
+    date TEXT,
+    start_time INTEGER,
+    sortie_name TEXT,
+    client_slots INTEGER NOT NULL DEFAULT 0,
+    error TEXT NOT NULL DEFAULT ''
+);
+CREATE TABLE IF NOT EXISTS countries (
+    mission_id INTEGER NOT NULL REFERENCES missions(id) ON DELETE CASCADE,
+    coalition TEXT NOT NULL,
+    country TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS unit_types (
+    mission_id INTEGER NOT NULL REFERENCES missions(id) ON DELETE CASCADE,
+    unit_type TEXT NOT NULL,
+    category TEXT NOT NULL,
+    count INTEGER NOT NULL,
+    client_count INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS resources (
+    mission_id INTEGER NOT NULL REFERENCES missions(id) ON DELETE CASCADE,
+    name TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS missions_theatre ON missions(theatre);
+CREATE INDEX IF NOT EXISTS countries_mission ON countries(mission_id);
+CREATE INDEX IF NOT EXISTS unit_types_mission ON unit_types(mission_id);
+CREATE INDEX IF NOT EXISTS unit_types_type ON unit_types(unit_type);
+CREATE INDEX IF NOT EXISTS resources_mission ON resources(mission_id);
+"""
+
+
+@dataclass
+class CatalogEntry:  # pylint: disable=too-many-instance-attributes
+    """
+    A MIZ file, as indexed in the catalog
+    """
+    path: str
+    size: int
+    mtime: float
+    hash: str
+    theatre: typing.Optional[str] = None
+    date: typing.Optional[str] = None
+    start_time: typing.Optional[int] = None
+    sortie_name: typing.Optional[str] = None
+    client_slots: int = 0
+    error: str = ''
+    countries: typing.Dict[str, typing.List[str]] = field(default_factory=dict)
+    # unit type -> (category, count, client count)
+    unit_types: typing.Dict[str, typing.Tuple[str, int, int]] = field(default_factory=dict)
+    resources: typing.List[str] = field(default_factory=list)
+
+
+@dataclass
+class ScanResult:
+    """
+    Outcome of MissionCatalog.scan
+    """
+    added: int = 0
+    updated: int = 0
+    removed: int = 0
+    unchanged: int = 0
+    errors: int = 0
+
+
+def _read_table(zip_file: ZipFile, member: str) -> dict:
+    with zip_file.open(member) as stream:
+        table, _ = SLTP().decode(io.TextIOWrapper(stream, encoding=ENCODING).read())
+    return table
+
+
+def _read_sortie_name(zip_file: ZipFile, sortie: str) -> str:
+    if not sortie.startswith('DictKey_'):
+        return sortie
+    with zip_file.open('l10n/DEFAULT/dictionary') as stream:
+        return peek(io.TextIOWrapper(stream, encoding=ENCODING), (sortie,)).get(sortie, '')
+
+
+def _read_entry(file_path: str) -> CatalogEntry:
+    """
+    Reads a MIZ file; runs in the worker processes of MissionCatalog.scan
+    """
+    stat = os.stat(file_path)
+    entry = CatalogEntry(path=file_path, size=stat.st_size, mtime=stat.st_mtime, hash=file_sha256(file_path))
+    try:
+        with ZipFile(file_path) as zip_file:
+            mission = Mission(_read_table(zip_file, 'mission'), {})
+            entry.resources = sorted(_read_table(zip_file, 'l10n/DEFAULT/mapResource').values())
+            entry.sortie_name = _read_sortie_name(zip_file, mission.d.get('sortie', ''))
+    except Exception as error:  # pylint: disable=broad-except
+        LOGGER.error('error while reading MIZ file "%s": %s', file_path, error)
+        entry.error = f'{error.__class__.__name__}: {error}'
+        return entry
+
+    entry.theatre = mission.d.get('theatre')
+    date = mission.d.get('date')
+    if date:
+        entry.date = f'{date["Year"]:04}-{date["Month"]:02}-{date["Day"]:02}'
+    entry.start_time = mission.d.get('start_time')
+    for coalition in (mission.blue_coa, mission.red_coa):
+        entry.countries[coalition.coa_color] = [country.country_name for country in coalition.countries]
+
+    counts: typing.Counter[typing.Tuple[str, str]] = collections.Counter()
+    client_counts: typing.Counter[typing.Tuple[str, str]] = collections.Counter()
+    for unit in mission.units:
+        key = unit.unit_type, unit.group_category
+        counts[key] += 1
+        if unit.skill == 'Client':
+            client_counts[key] += 1
+    for (unit_type, category), count in counts.items():
+        entry.unit_types[unit_type] = category, count, client_counts[(unit_type, category)]
+    entry.client_slots = sum(client_counts.values())
+    return entry
+
+
+class MissionCatalog:
+    """
+    SQLite index of MIZ files
+
+    Can be used as a context manager, closing the database on exit.
+    """
+
+    def __init__(self, database: typing.Union[str, Path] = ':memory:') -> None:
+        """
+        Args:
+            database: path to the SQLite database file (created if needed)
+        """
+        self.database = str(database)
+        self._connection = sqlite3.connect(self.database)
+        self._connection.execute('PRAGMA foreign_keys = ON')
+        self._connection.executescript(_SCHEMA)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def close(self):
+        """
+        Closes the database
+        """
+        self._connection.close()
+
+    def scan(self, folder: typing.Union[str, Path], jobs: int = None) -> ScanResult:
+        """
+        Indexes all MIZ files in a directory tree
+
+        Files whose size and modification time did not change since the last scan are not read again, and files
+        that disappeared from the folder are removed from the catalog.
+
+        Args:
+            folder: root of the directory tree
+            jobs: amount of worker processes used to read the MIZ files (defaults to the amount of CPUs)
+
+        Returns: ScanResult
+
+        """
+        folder = elib.path.ensure_dir(folder).absolute()
+        result = ScanResult()
+
+        known: typing.Dict[str, typing.Tuple[int, int, float]] = {}
+        prefix = os.path.join(str(folder), '')
+        for mission_id, path, size, mtime in self._connection.execute(
+                'SELECT id, path, size, mtime FROM missions WHERE substr(path, 1, ?) = ?', (len(prefix), prefix)
+        ):
+            known[path] = mission_id, size, mtime
+
+        to_read = []
+        for root, _, items in os.walk(str(folder)):
+            for item in items:
+                if not item.lower().endswith('.miz'):
+                    continue
+                path = os.path.join(root, item)
+                stat = os.stat(path)
+                if path in known:
+                    _, size, mtime = known.pop(path)
+                    if size == stat.st_size and mtime == stat.st_mtime:
+                        result.unchanged += 1
+                        continue
+                    result.updated += 1
+                else:
+                    result.added += 1
+                to_read.append(path)
+
+        LOGGER.info('catalog: %s new or changed MIZ file(s) in %s', len(to_read), folder)
+        with self._connection:
+            for mission_id, _, _ in known.values():
+                self._connection.execute('DELETE FROM missions WHERE id = ?', (mission_id,))
+            result.removed = len(known)
+
+            for entry in self._read_entries(to_read, jobs):
+                if entry.error:
+                    result.errors += 1
+                self._store(entry)
+
+        return result
+
+    @staticmethod
+    def _read_entries(paths: typing.List[str], jobs: typing.Optional[int]) -> typing.Iterator[CatalogEntry]:
+        jobs = min(jobs or os.cpu_count() or 1, len(paths))
+        if jobs <= 1:
+            yield from map(_read_entry, paths)
+            return
+        with multiprocessing.Pool(jobs) as pool:
+            yield from pool.imap_unordered(_read_entry, paths)
+
+    def _store(self, entry: CatalogEntry):
+        self._connection.execute('DELETE FROM missions WHERE path = ?', (entry.path,))
+        cursor = self._connection.execute(
+            'INSERT INTO missions (path, size, mtime, hash, theatre, date, start_time, sortie_name, client_slots, '
+            'error) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+            (entry.path, entry.size, entry.mtime, entry.hash, entry.theatre, entry.date, entry.start_time,
+             entry.sortie_name, entry.client_slots, entry.error)
+        )
+        mission_id = cursor.lastrowid
+        self._connection.executemany(
+            'INSERT INTO countries (mission_id, coalition, country) VALUES (?, ?, ?)',
+            [(mission_id, coalition, country)
+             for coalition, countries in entry.countries.items()
+             for country in countries]
+        )
+        self._connection.executemany(
+            'INSERT INTO unit_types (mission_id, unit_type, category, count, client_count) VALUES (?, ?, ?, ?, ?)',
+            [(mission_id, unit_type, category, count, client_count)
+             for unit_type, (category, count, client_count) in entry.unit_types.items()]
+        )
+        self._connection.executemany(
+            'INSERT INTO resources (mission_id, name) VALUES (?, ?)',
+            [(mission_id, name) for name in entry.resources]
+        )
+
+    def search(
+            self,
+            theatre: str = None,
+            unit_type: str = None,
+            client_unit_type: str = None,
+            country: str = None,
+    ) -> typing.List[CatalogEntry]:
+        """
+        Finds indexed MIZ files; all the given criteria must match
+
+        Args:
+            theatre: theatre of the mission (for example "Caucasus")
+            unit_type: mission contains at least one unit of this type
+            client_unit_type: mission contains at least one client slot of this type
+            country: mission contains this country, in any coalition
+
+        Returns: list of CatalogEntry, sorted by path
+
+        """
+        clauses = ["error = ''"]
+        params: typing.List[typing.Any] = []
+        if theatre is not None:
+            clauses.append('theatre = ?')
+            params.append(theatre)
+        if unit_type is not None:
+            clauses.append('id IN (SELECT mission_id FROM unit_types WHERE unit_type = ?)')
+            params.append(unit_type)
+        if client_unit_type is not None:
+            clauses.append('id IN (SELECT mission_id FROM unit_types WHERE unit_type = ? AND client_count > 0)')
+            params.append(client_unit_type)
+        if country is not None:
+            clauses.append('id IN (SELECT mission_id FROM countries WHERE country = ?)')
+            params.append(country)
+        rows = self._connection.execute(
+            f'SELECT id FROM missions WHERE {" AND ".join(clauses)} ORDER BY path', params
+        ).fetchall()
+        return [self._load(mission_id) for mission_id, in rows]
+
+    def get(self, path: typing.Union[str, Path]) -> typing.Optional[CatalogEntry]:
+        """
+        Args:
+            path: path to a MIZ file
+
+        Returns: catalog entry for this file, or None if it is not indexed
+
+        """
+        row = self._connection.execute(
+            'SELECT id FROM missions WHERE path = ?', (str(Path(path).absolute()),)
+        ).fetchone()
+        if row is None:
+            return None
+        return self._load(row[0])
+
+    def _load(self, mission_id: int) -> CatalogEntry:
+        row = self._connection.execute(
+            'SELECT path, size, mtime, hash, theatre, date, start_time, sortie_name, client_slots, error '
+            'FROM missions WHERE id = ?', (mission_id,)
+        ).fetchone()
+        entry = CatalogEntry(*row)
+        for coalition, country in self._connection.execute(
+                'SELECT coalition, country FROM countries WHERE mission_id = ? ORDER BY rowid', (mission_id,)
+        ):
+            entry.countries.setdefault(coalition, []).append(country)
+        for unit_type, category, count, client_count in self._connection.execute(
+                'SELECT unit_type, category, count, client_count FROM unit_types WHERE mission_id = ?', (mission_id,)
+        ):
+            entry.unit_types[unit_type] = category, count, client_count
+        entry.resources = [name for name, in self._connection.execute(
+            'SELECT name FROM resources WHERE mission_id = ? ORDER BY rowid', (mission_id,)
+        )]
+        return entry
@@ -0,0 +1,399 @@
+# coding=utf-8
+"""
+EMIZ command line interface
+"""
+import functools
+import sys
+import tempfile
+import typing
+from dataclasses import asdict
+from pathlib import Path
+
+import click
+
+from emiz.batch import BatchResult, run_batch
+from emiz.bench import bench_layouts, bench_miz, inflate_miz, save_results
+from emiz.edit_miz import edit_miz
+from emiz.miz import TABLE_MEMBERS, Miz
+from emiz.miz_pack import SUFFIX as PACK_SUFFIX, decompose_to_pack, recompose_from_pack
+from emiz.new_miz import NewMiz
+from emiz.server import serve as serve_
+from emiz.synthetic import MissionSpec, generate_miz
+from emiz.variants import generate_variants
+from emiz.weather.mizfile import get_metar_from_mission
+
+_MIZ_FILES = click.argument('miz_files', nargs=-1, required=True,
+                            type=click.Path(exists=True, file_okay=True, dir_okay=False, readable=True))
+
+
+def _batch_options(func):
+    """
+    Adds the options shared by the commands working on many files: --jobs, --profile, --profile-output, --timings
+    """
+
+    @click.option('-j', '--jobs', type=int, default=None, help='Amount of worker processes [default: CPU count]')
+    @click.option('--profile', 'profile_', is_flag=True, default=False,
+                  help='Run under cProfile and print the most expensive functions')
+    @click.option('--profile-output', type=click.Path(dir_okay=False), default=None,
+                  help='Write the profile to this file (pstats format); implies --profile')
+    @click.option('--timings', is_flag=True, default=False, help='Print the duration of each stage')
+    @functools.wraps(func)
+    def _wrapper(*args, jobs, profile_, profile_output, timings, **kwargs):
+        batch_options = dict(jobs=jobs, profile=profile_ or profile_output is not None, timings=timings)
+        batch = func(*args, batch_options=batch_options, **kwargs)
+        _report(batch, profile_output)
+
+    return _wrapper
+
+
+def _report(batch: BatchResult, profile_output: typing.Optional[str]):
+    """
+    Prints the timings and the profile of a batch (to stderr), and fails if any task failed
+    """
+    timings = batch.timings()
+    if timings:
+        click.echo('timings:', err=True)
+        for stage in timings:
+            click.echo(f'  {stage.name:<16} {stage.count:6}x {stage.seconds:10.3f}s {stage.size:14} bytes', err=True)
+        for task in batch.tasks:
+            click.echo(f'  {task.seconds:8.3f}s {task.item}', err=True)
+    if batch.profile is not None:
+        if profile_output:
+            batch.profile.dump_stats(profile_output)
+        batch.profile.stream = sys.stderr
+        batch.profile.sort_stats('cumulative').print_stats(30)
+    for task in batch.failed:
+        click.echo(f'FAILED  {task.item}: {task.error}', err=True)
+    if batch.failed:
+        raise click.ClickException(f'{len(batch.failed)} of {len(batch.tasks)} file(s) failed')
+
+
+def _edit(miz_file: str, output_folder: typing.Optional[str], metar, time, min_wind: int, max_wind: int) -> str:
+    output = str(Path(output_folder, Path(miz_file).name)) if output_folder else miz_file
+    error = edit_miz(miz_file, output, metar, time, min_wind, max_wind)
+    if error:
+        raise ValueError(error)
+    return output
+
+
+def _metar(miz_file: str, icao: str, time: typing.Optional[str]) -> str:
+    return get_metar_from_mission(miz_file, icao, time)
+
+
+def _decompose(miz_file: str, output_folder: str, incremental: bool, format_: str = 'json') -> str:
+    if format_ == 'pack':
+        Path(output_folder).mkdir(parents=True, exist_ok=True)
+        return str(decompose_to_pack(miz_file, Path(output_folder, f'{Path(miz_file).stem}{PACK_SUFFIX}')))
+    target = Path(output_folder, Path(miz_file).stem)
+    target.mkdir(parents=True, exist_ok=True)
+    NewMiz.decompose(Path(miz_file), target, incremental=incremental)
+    return str(target)
+
+
+def _recompose(source: str, output_folder: str, cache: bool) -> str:
+    target = Path(output_folder, f'{Path(source).stem}.miz')
+    if Path(source).is_file():
+        recompose_from_pack(source, target)
+    else:
+        NewMiz.recompose(Path(source), target, cache=cache)
+    return str(target)
+
+
+def _reorder(miz_file: str, output_folder: str, skip_options_file: bool) -> str:
+    target = Path(output_folder, Path(miz_file).stem)
+    Miz.reorder(miz_file, target, skip_options_file)
+    return str(target)
+
+
+def _peek(miz_file: str) -> dict:
+    summary = asdict(Miz.peek(miz_file))
+    del summary['path']
+    return summary
+
+
+def _bench(miz_file: str, repeat: int, memory: bool, layouts: bool = False):
+    if layouts:
+        return bench_layouts(miz_file, repeat)
+    return bench_miz(miz_file, repeat, memory)
+
+
+@click.group()
+def main():
+    """
+    Etcher's MIZ library
+    """
+
+
+@main.command()
+@click.argument('miz_file', type=click.Path(exists=True, file_okay=True, dir_okay=False, readable=True))
+@click.option('-t', '--time', 'times', multiple=True, help='Time to apply (YYYYMMDDHHMMSS); can be repeated')
+@click.option('-m', '--metar', 'metars', multiple=True, help='METAR string or ICAO to apply; can be repeated')
+@click.option('-o', '--output-folder', type=click.Path(file_okay=False), default='.', show_default=True,
+              help='Folder to write the variants into')
+@click.option('-j', '--jobs', type=int, default=None, help='Amount of worker processes [default: CPU count]')
+@click.option('--min-wind', type=int, default=0, show_default=True, help='Minimum wind')
+@click.option('--max-wind', type=int, default=40, show_default=True, help='Maximum wind')
+# pylint: disable=too-many-arguments
+def variants(miz_file, times, metars, output_folder, jobs, min_wind, max_wind):
+    """
+    Writes one MIZ file per combination of time and METAR
+    """
+    try:
+        results = generate_variants(miz_file, output_folder, times, metars, jobs, min_wind, max_wind)
+    except ValueError as error:
+        raise click.ClickException(str(error))
+
+    failed = False
+    for variant in results:
+        if variant.error:
+            failed = True
+            click.echo(f'FAILED  {variant.output}: {variant.error}', err=True)
+        else:
+            click.echo(f'{variant.duration:6.2f}s {variant.output} '
+                       f'(apply: {variant.apply_duration:.2f}s, zip: {variant.zip_duration:.2f}s)')
+    if failed:
+        raise click.ClickException('some variants could not be generated')
+
+
+@main.command()
+@click.option('--host', default='127.0.0.1', show_default=True, help='Address to listen on')
+@click.option('-p', '--port', type=int, default=8787, show_default=True, help='Port to listen on')
+@click.option('-s', '--socket', 'socket_path', type=click.Path(dir_okay=False), default=None,
+              help='Unix socket to listen on, instead of a TCP port')
+@click.option('-c', '--cache-size', type=int, default=512, show_default=True,
+              help='Maximum (estimated) memory used by the decoded missions, in MB')
+@click.option('-r', '--root', type=click.Path(exists=True, file_okay=False, dir_okay=True), default=None,
+              help='Only read and write MIZ files inside this folder')
+def serve(host, port, socket_path, cache_size, root):
+    """
+    Runs the mission edit daemon (POST /edit, GET /stats)
+    """
+    serve_(host, port, socket_path, cache_size * 1024 * 1024, root)
+
+
+@main.command()
+@_MIZ_FILES
+@click.option('-o', '--output', type=click.Path(dir_okay=False), default=None, help='JSON file to write the results to')
+@click.option('-r', '--repeat', type=int, default=3, show_default=True, help='Amount of runs per file (best is kept)')
+@click.option('-u', '--units', type=int, multiple=True,
+              help='Also benchmark a copy of the first MIZ file inflated to this amount of units; can be repeated')
+@click.option('--no-memory', is_flag=True, default=False, help='Do not measure the peak memory of each stage')
+@click.option('--layouts', is_flag=True, default=False,
+              help='Compare the decomposition layouts (JSON folder and pack file) instead of the pipeline stages')
+@_batch_options
+# pylint: disable=too-many-arguments
+def bench(miz_files, output, repeat, units, no_memory, layouts, batch_options):
+    """
+    Times each stage of the MIZ pipeline (unzip, decode, traverse, encode, zip)
+
+    With --layouts, times the decomposition and recomposition of each file with both layouts instead; the size
+    column then gives the amount of bytes written.
+
+    Files benchmarked in parallel (--jobs) compete for the CPU; keep the default of one job per CPU at most.
+    """
+    with tempfile.TemporaryDirectory() as temp_dir:
+        files = list(miz_files)
+        files.extend(str(inflate_miz(miz_files[0], Path(temp_dir, f'inflated_{count}.miz'), count)) for count in units)
+        batch = run_batch(_bench, files, (repeat, not no_memory, layouts), **batch_options)
+    results = [task.value for task in batch.tasks if not task.error]
+    for result in results:
+        if layouts:
+            click.echo(f'{result.file}: {result.total:.3f}s')
+        else:
+            click.echo(f'{result.file} ({result.groups} groups, {result.units} units): {result.total:.3f}s')
+        for stage in result.stages:
+            amount = stage.size if layouts else stage.peak_memory
+            click.echo(f'  {stage.stage:<20} {stage.seconds:8.3f}s {amount // 1024:10} KiB')
+    if output is not None:
+        save_results(results, output)
+    return batch
+
+
+@main.command()
+@_MIZ_FILES
+@click.option('-m', '--metar', default=None, help='METAR string or ICAO to apply')
+@click.option('-t', '--time', default=None, help='Time to apply (YYYYMMDDHHMMSS)')
+@click.option('-o', '--output-folder', type=click.Path(file_okay=False), default=None,
+              help='Folder to write the edited files into [default: edit the files in place]')
+@click.option('--min-wind', type=int, default=0, show_default=True, help='Minimum wind')
+@click.option('--max-wind', type=int, default=40, show_default=True, help='Maximum wind')
+@_batch_options
+# pylint: disable=too-many-arguments
+def edit(miz_files, metar, time, output_folder, min_wind, max_wind, batch_options):
+    """
+    Sets the weather and/or the time of MIZ files
+    """
+    if not metar and not time:
+        raise click.UsageError('nothing to do: give a METAR (--metar) and/or a time (--time)')
+    if output_folder:
+        Path(output_folder).mkdir(parents=True, exist_ok=True)
+    batch = run_batch(_edit, miz_files, (output_folder, metar, time, min_wind, max_wind), **batch_options)
+    for task in batch.tasks:
+        if not task.error:
+            click.echo(task.value)
+    return batch
+
+
+@main.command('metar-from-miz')
+@_MIZ_FILES
+@click.option('-i', '--icao', default='XXXX', show_default=True, help='ICAO of the METAR')
+@click.option('-t', '--time', default=None, help='Time of the METAR (DDHHMMZ) [default: now]')
+@_batch_options
+def metar_from_miz(miz_files, icao, time, batch_options):
+    """
+    Builds a METAR string out of the weather of MIZ files
+    """
+    batch = run_batch(_metar, miz_files, (icao, time), **batch_options)
+    for task in batch.tasks:
+        if not task.error:
+            click.echo(task.value if len(batch.tasks) == 1 else f'{task.item}: {task.value}')
+    return batch
+
+
+@main.command()
+@_MIZ_FILES
+@click.option('-o', '--output-folder', type=click.Path(file_okay=False), default='.', show_default=True,
+              help='Folder to decompose into (each MIZ file gets a sub-folder named after it)')
+@click.option('-i', '--incremental', is_flag=True, default=False,
+              help='Update existing folders in place, only writing the files that changed')
+@click.option('-f', '--format', 'format_', type=click.Choice(['json', 'pack']), default='json', show_default=True,
+              help='Layout: a folder of JSON files, or a single pack file (requires msgpack)')
+@_batch_options
+def decompose(miz_files, output_folder, incremental, format_, batch_options):
+    """
+    Decomposes MIZ files into folders of JSON files, or into pack files (--format pack)
+    """
+    if format_ == 'pack' and incremental:
+        raise click.UsageError('--incremental only applies to the JSON layout')
+    batch = run_batch(_decompose, miz_files, (output_folder, incremental, format_), **batch_options)
+    for task in batch.tasks:
+        if not task.error:
+            click.echo(task.value)
+    return batch
+
+
+@main.command()
+@click.argument('sources', nargs=-1, required=True,
+                type=click.Path(exists=True, file_okay=True, dir_okay=True, readable=True))
+@click.option('-o', '--output-folder', type=click.Path(file_okay=False), default='.', show_default=True,
+              help='Folder to write the MIZ files into (each one is named after its source)')
+@click.option('-c', '--cache', is_flag=True, default=False,
+              help='Keep the parsed JSON files in a cache (in the cache folder of the user), and only parse the files '
+                   'that changed')
+@_batch_options
+def recompose(sources, output_folder, cache, batch_options):
+    """
+    Recomposes MIZ files out of folders or pack files created by "decompose"
+    """
+    Path(output_folder).mkdir(parents=True, exist_ok=True)
+    batch = run_batch(_recompose, sources, (output_folder, cache), **batch_options)
+    for task in batch.tasks:
+        if not task.error:
+            click.echo(task.value)
+    return batch
+
+
+@main.command()
+@click.argument('source_folder', type=click.Path(exists=True, file_okay=False, dir_okay=True, readable=True))
+@click.argument('target_file', type=click.Path(dir_okay=False))
+@click.option('-i', '--interval', type=float, default=0.3, show_default=True,
+              help='Seconds between two checks of the folder')
+@click.option('-d', '--debounce', type=float, default=0.2, show_default=True,
+              help='Seconds without any file being modified before the folder is recomposed')
+def watch(source_folder, target_file, interval, debounce):
+    """
+    Recomposes a folder created by "decompose" into a MIZ file every time something changes in it (until Ctrl+C)
+    """
+
+    def _report(result):
+        click.echo(f'{result.target}: {result.seconds:.3f}s ({result.parsed} parsed, {result.reused} re-used)')
+
+    NewMiz.watch(Path(source_folder), Path(target_file), interval, debounce, on_recompose=_report)
+
+
+@main.command()
+@_MIZ_FILES
+@click.option('-o', '--output-folder', type=click.Path(file_okay=False), default='.', show_default=True,
+              help='Folder to re-order into (each MIZ file gets a sub-folder named after it)')
+@click.option('--skip-options-file', is_flag=True, default=False, help='Do not re-order the "options" file')
+@_batch_options
+def reorder(miz_files, output_folder, skip_options_file, batch_options):
+    """
+    Re-orders MIZ files into folders, so that they can be diffed and version-controlled
+    """
+    batch = run_batch(_reorder, miz_files, (output_folder, skip_options_file), **batch_options)
+    for task in batch.tasks:
+        if not task.error:
+            click.echo(task.value)
+    return batch
+
+
+@main.command()
+@_MIZ_FILES
+@_batch_options
+def peek(miz_files, batch_options):
+    """
+    Shows the theatre, date, time and name of MIZ files, without decoding them
+    """
+    batch = run_batch(_peek, miz_files, (), **batch_options)
+    for task in batch.tasks:
+        if not task.error:
+            summary = task.value
+            click.echo(f'{task.item}: {summary["theatre"]} {summary["year"]:04}-{summary["month"]:02}-'
+                       f'{summary["day"]:02} {summary["mission_start_time"]}s "{summary["sortie_name"]}" '
+                       f'(version {summary["version"]})')
+    return batch
+
+
+@main.command()
+@click.argument('destination', type=click.Path(dir_okay=False))
+@click.option('-u', '--units', type=int, default=None,
+              help='Amount of units to reach (overrides --groups) [default: coalitions * countries * groups * units]')
+@click.option('--seed', type=int, default=0, show_default=True, help='Seed of the random generator')
+@click.option('--coalitions', type=int, default=2, show_default=True, help='Amount of coalitions (blue, red)')
+@click.option('--countries', type=int, default=1, show_default=True, help='Amount of countries per coalition')
+@click.option('--groups', type=int, default=10, show_default=True, help='Amount of groups per country')
+@click.option('--units-per-group', type=int, default=4, show_default=True, help='Amount of units per group')
+@click.option('--route-points', type=int, default=3, show_default=True, help='Amount of waypoints per group')
+@click.option('--statics', type=int, default=0, show_default=True, help='Amount of statics per country')
+@click.option('--triggers', type=int, default=0, show_default=True, help='Amount of triggers')
+@click.option('--dictionary-entries', type=int, default=0, show_default=True,
+              help='Amount of additional (unreferenced) dictionary entries')
+@click.option('--resources', type=int, default=0, show_default=True, help='Amount of resource files')
+@click.option('--resource-size', type=int, default=4096, show_default=True, help='Size of each resource file, in bytes')
+# pylint: disable=too-many-arguments
+def generate(destination, units, **kwargs):
+    """
+    Writes a synthetic MIZ file of controlled size
+    """
+    spec = MissionSpec.for_units(units, **kwargs) if units is not None else MissionSpec(**kwargs)
+    try:
+        generate_miz(destination, spec)
+    except ValueError as error:
+        raise click.ClickException(str(error))
+    click.echo(f'{destination}: {spec.units} units')
+
+
+@main.command()
+@click.argument('miz_file', type=click.Path(exists=True, file_okay=True, dir_okay=False, readable=True))
+@click.option('-t', '--table', type=click.Choice(list(TABLE_MEMBERS)), default='mission', show_default=True,
+              help='Lua table to decode')
+@click.option('-n', '--top', type=int, default=10, show_default=True, help='Amount of sections and tables to show')
+def profile(miz_file, table, top):
+    """
+    Decodes a lua table of a MIZ file and shows its heaviest sections
+    """
+    stats = Miz.profile(miz_file, table, top)
+    click.echo(f'{table}: {stats.size} characters decoded in {stats.seconds:.3f}s')
+    click.echo(f'  tables: {stats.tables} (max depth: {stats.max_depth})')
+    click.echo(f'  strings: {stats.strings} ({stats.string_chars} characters)')
+    click.echo('heaviest sections:')
+    for section in stats.sections[:top]:
+        click.echo(f'  {section.seconds:8.3f}s {section.size:12} chars {section.entries:8} entries  {section.path}')
+    click.echo('largest tables:')
+    for table_stats in stats.largest_tables:
+        click.echo(f'  {table_stats.size:12} chars {table_stats.entries:8} entries  {table_stats.path}')
+
+
+if __name__ == '__main__':
+    main()  # pylint: disable=no-value-for-parameter
@@ -0,0 +1,153 @@
+# coding=utf-8
+"""
+Removes the dead weight that edited missions accumulate
+
+- dictionary ("l10n/DEFAULT/dictionary") entries that are not referenced by the mission anymore
+- map resource ("l10n/DEFAULT/mapResource") entries that are not referenced by the mission anymore
+- resource files that are not referenced by the map resource
+- resource files whose content is identical to another resource file (the map resource is re-pointed to the one
+  that is kept)
+
+A key is kept as long as it is referenced by the mission, by a dictionary entry, by one of the other lua tables of
+the archive ("options", "warehouses") or by a lua script among the resources (scripts can read the dictionary with
+"env.getValueDictByKey"). Other resources (images, sounds, ...) are not searched for keys.
+"""
+import re
+import typing
+from dataclasses import dataclass
+from pathlib import Path
+
+import elib
+
+from emiz.miz import ENCODING, Miz
+from emiz.miz_archive import file_sha256
+from emiz.sltp import SLTP
+
+LOGGER = elib.custom_logging.get_logger('EMIZ')
+
+_KEY = re.compile(r'\b(?:DictKey|ResKey)_\w+')
+_LUA_MEMBERS = ('options', 'warehouses')
+
+
+@dataclass
+class CompactReport:
+    """
+    Outcome of compact_miz
+    """
+    removed_keys: int = 0
+    removed_resource_keys: int = 0
+    removed_resources: int = 0
+    merged_resources: int = 0
+    bytes_saved: int = 0
+
+
+def referenced_keys(table) -> typing.Set[str]:
+    """
+    Collects the dictionary and resource keys referenced anywhere in a lua table
+
+    Args:
+        table: lua table (for example the mission dictionary)
+
+    Returns: set of keys
+
+    """
+    keys: typing.Set[str] = set()
+    stack = [table]
+    while stack:
+        value = stack.pop()
+        if isinstance(value, dict):
+            stack.extend(dict.values(value))
+        elif isinstance(value, list):
+            stack.extend(value)
+        elif isinstance(value, str) and 'Key_' in value:
+            keys.update(_KEY.findall(value))
+    return keys
+
+
+def _keys_in_file(file: Path) -> typing.Set[str]:
+    if not file.is_file():
+        return set()
+    return set(_KEY.findall(file.read_bytes().decode(ENCODING, errors='replace')))
+
+
+def _all_referenced_keys(miz: Miz) -> typing.Set[str]:
+    keys = referenced_keys(miz.mission.d)
+    keys.update(referenced_keys(list(miz.l10n.values())))
+    for member in _LUA_MEMBERS:
+        # clones read the members they did not write from the temp dir of their source
+        for folder in (miz.temp_dir, miz._base_dir):  # pylint: disable=protected-access
+            if folder is not None and folder.joinpath(member).is_file():
+                keys.update(_keys_in_file(folder.joinpath(member)))
+                break
+    for resource_name in miz.resources:
+        if resource_name.lower().endswith('.lua'):
+            keys.update(_keys_in_file(miz.resource_path(resource_name)))
+    return keys
+
+
+def _encoded_size(table: dict, qualifier: str) -> int:
+    return len(SLTP().encode(table, qualifier).encode(ENCODING))
+
+
+def _remove_resource(miz: Miz, resource_name: str) -> int:
+    path = miz.resource_path(resource_name)
+    size = path.stat().st_size if path.exists() else 0
+    miz.remove_resource(resource_name)
+    return size
+
+
+# pylint: disable=protected-access
+def compact_miz(miz: Miz) -> CompactReport:
+    """
+    Prunes the dictionary, map resource and resource files of a decoded Miz
+
+    Keys are looked for in the mission, the dictionary, the other lua tables and the lua scripts of the Miz (see the
+    module docstring). The changes are written the next time the Miz is zipped.
+
+    Args:
+        miz: decoded Miz
+
+    Returns: CompactReport
+
+    """
+    report = CompactReport()
+    keys = _all_referenced_keys(miz)
+
+    for table, qualifier, attribute in (
+            (miz.l10n, miz._l10n_qual, 'removed_keys'),
+            (miz.map_res, miz._map_res_qual, 'removed_resource_keys'),
+    ):
+        unused = [key for key in table if key not in keys]
+        if not unused:
+            continue
+        size = _encoded_size(table, qualifier)
+        for key in unused:
+            del table[key]
+        report.bytes_saved += size - _encoded_size(table, qualifier)
+        setattr(report, attribute, len(unused))
+
+    referenced_resources = set(miz.map_res.values())
+    for resource_name in sorted(miz.resources - referenced_resources):
+        LOGGER.debug('removing unused resource: %s', resource_name)
+        report.bytes_saved += _remove_resource(miz, resource_name)
+        report.removed_resources += 1
+
+    kept: typing.Dict[str, str] = {}
+    renamed: typing.Dict[str, str] = {}
+    for resource_name in sorted(referenced_resources & miz.resources):
+        digest = file_sha256(miz.resource_path(resource_name))
+        if digest in kept:
+            LOGGER.debug('resource %s is identical to %s, removing it', resource_name, kept[digest])
+            renamed[resource_name] = kept[digest]
+            report.bytes_saved += _remove_resource(miz, resource_name)
+            report.merged_resources += 1
+        else:
+            kept[digest] = resource_name
+    for key, resource_name in miz.map_res.items():
+        if resource_name in renamed:
+            miz.map_res[key] = renamed[resource_name]
+
+    LOGGER.info('compaction: %s dictionary key(s), %s resource key(s), %s unused and %s duplicate resource(s) '
+                'removed; %s bytes saved', report.removed_keys, report.removed_resource_keys,
+                report.removed_resources, report.merged_resources, report.bytes_saved)
+    return report
@@ -9,6 +9,7 @@ import elib
 from metar.Metar import Metar
 
 import emiz.weather
+from emiz.metrics import timed
 from emiz.mission_time import MissionTime
 from emiz.miz import Miz
 
@@ -16,6 +17,7 @@ LOGGER = elib.custom_logging.get_logger('EMIZ')
 
 
 # pylint: disable=too-many-arguments,too-many-branches,too-many-return-statements
+@timed('edit_miz')
 def edit_miz(  # noqa: C901
         infile: str,
         outfile: str = None,
@@ -63,7 +65,7 @@ def edit_miz(  # noqa: C901
     if not mission_weather and not mission_time:
         return 'nothing to do!'
 
-    with Miz(infile) as miz:
+    with Miz(infile, track_changes=True) as miz:
         if mission_weather:
             LOGGER.debug('applying MissionWeather')
             if not mission_weather.apply_to_miz(miz):
@@ -78,3 +80,40 @@ def edit_miz(  # noqa: C901
             return ''
         except OSError:
             return f'permission error: cannot edit "{outfile}"; maybe it is in use ?'
+
+
+def apply_weather_and_time(
+        miz: Miz,
+        metar: typing.Union[str, Metar] = None,
+        time: str = None,
+        min_wind: int = 0,
+        max_wind: int = 40
+):
+    """
+    Sets the weather and/or the date and time of a decoded Miz
+
+    Args:
+        miz: decoded Miz to edit
+        metar: metar string, ICAO or object to apply
+        time: time string to apply (YYYYMMDDHHMMSS)
+        min_wind: minimum wind
+        max_wind: maximum wind
+
+    Raises ValueError if the METAR or the time string cannot be applied.
+
+    """
+    if metar:
+        error, metar = emiz.weather.custom_metar.CustomMetar.get_metar(metar)
+        if error:
+            raise ValueError(error)
+        LOGGER.debug('applying MissionWeather')
+        mission_weather = emiz.weather.mission_weather.MissionWeather(metar, min_wind=min_wind, max_wind=max_wind)
+        if not mission_weather.apply_to_miz(miz):
+            raise ValueError('error while applying METAR to mission')
+    if time:
+        LOGGER.debug('applying MissionTime')
+        try:
+            mission_time = MissionTime.from_string(time)
+        except ValueError:
+            raise ValueError(f'badly formatted time string: {time}')
+        mission_time.apply_to_miz(miz)
@@ -0,0 +1,405 @@
+# coding=utf-8
+"""
+Merges the content of several missions into one
+
+Groups, statics, trigger zones and triggers of the source missions are copied into the target mission. Before being
+copied, every source table goes through a translation step (a single walk) that remaps, using tables computed
+upfront:
+
+- group, unit and zone ids that are already used by the target mission (ids that do not collide are kept as-is, so
+  that references to them in trigger code remain valid)
+- group and unit names that are already used by the target mission (DCS requires them to be unique); they get a
+  "_<count>" suffix
+- dictionary and resource keys ("DictKey_..." and "ResKey_...") that are already used by the target mission
+- trigger indexes ("mission.trig.actions[12]") in trigger code
+
+Resources are copied along with the keys referencing them; identical files (same SHA-256) are only stored once.
+
+Countries that the target mission has in another coalition are skipped (a country cannot be on both sides).
+"""
+import re
+import typing
+from dataclasses import dataclass, field
+from pathlib import Path
+
+import elib
+
+from emiz.miz import Miz
+from emiz.miz_archive import file_sha256
+
+LOGGER = elib.custom_logging.get_logger('EMIZ')
+
+_KEY = re.compile(r'\b(?:DictKey|ResKey)_\w+')
+_TRIG_INDEX = re.compile(r'(mission\.trig\.\w+)\[(\d+)\]')
+
+_GROUP_CATEGORIES = ('helicopter', 'plane', 'ship', 'vehicle', 'static')
+
+# key in a table -> kind of id it holds
+_GROUP_ID_FIELDS = {'groupId': 'group', 'unitId': 'unit', 'linkUnit': 'unit', 'helipadId': 'unit'}
+_ZONE_ID_FIELDS = {'zoneId': 'zone'}
+_TRIGRULE_ID_FIELDS = {'group': 'group', 'unit': 'unit', 'zone': 'zone'}
+
+
+@dataclass
+class MergeReport:  # pylint: disable=too-many-instance-attributes
+    """
+    Outcome of merge_miz
+    """
+    groups: int = 0
+    units: int = 0
+    statics: int = 0
+    zones: int = 0
+    triggers: int = 0
+    remapped_ids: int = 0
+    remapped_keys: int = 0
+    renamed: int = 0
+    resources_copied: int = 0
+    resources_deduplicated: int = 0
+    skipped_countries: typing.List[str] = field(default_factory=list)
+
+
+def _values(table) -> typing.Iterable:
+    if isinstance(table, dict):
+        return table.values()
+    return table
+
+
+def _next_index(table: dict) -> int:
+    return max(dict.keys(table), default=0) + 1
+
+
+class _Translator:
+    """
+    Copies lua tables, applying the translation tables of a source mission
+    """
+
+    def __init__(
+            self,
+            ids: typing.Dict[str, typing.Dict[int, int]],
+            names: typing.Dict[str, typing.Dict[int, str]],
+            keys: typing.Dict[str, str],
+            trig_offset: int,
+    ) -> None:
+        self.ids = ids
+        self.names = names
+        self.keys = keys
+        self.trig_offset = trig_offset
+        # keys (translated) referenced by the copied tables
+        self.used_keys: typing.Set[str] = set()
+        # new text of the keys (translated) holding a name that was changed
+        self.texts: typing.Dict[str, str] = {}
+
+    def _key(self, match) -> str:
+        key = self.keys.get(match.group(), match.group())
+        self.used_keys.add(key)
+        return key
+
+    def _trig_index(self, match) -> str:
+        return f'{match.group(1)}[{int(match.group(2)) + self.trig_offset}]'
+
+    def string(self, value: str) -> str:
+        """
+        Translates keys and trigger indexes in a string
+        """
+        if 'Key_' in value:
+            value = _KEY.sub(self._key, value)
+        if self.trig_offset and 'mission.trig.' in value:
+            value = _TRIG_INDEX.sub(self._trig_index, value)
+        return value
+
+    def table(self, value, id_fields: typing.Dict[str, str]):
+        """
+        Deep copy of a table, with translated ids (for the keys in "id_fields"), keys and trigger indexes
+        """
+        if isinstance(value, dict):
+            result = {}
+            for key, item in value.items():
+                kind = id_fields.get(key) if isinstance(key, str) else None
+                if kind is not None and isinstance(item, int) and not isinstance(item, bool):
+                    result[key] = self.ids[kind].get(item, item)
+                else:
+                    result[key] = self.table(item, id_fields)
+            return result
+        if isinstance(value, list):
+            return [self.table(item, id_fields) for item in value]
+        if isinstance(value, str):
+            return self.string(value)
+        return value
+
+    def _rename(self, table: dict, name: typing.Optional[str]):
+        if name is None:
+            return
+        if _KEY.fullmatch(table['name']):
+            self.texts[table['name']] = name
+        else:
+            table['name'] = name
+
+    def group(self, group: dict) -> dict:
+        """
+        Copy of a group (see "table"), with the names of the group and its units translated
+        """
+        result = self.table(group, _GROUP_ID_FIELDS)
+        self._rename(result, self.names['group'].get(group['groupId']))
+        for source_unit, unit in zip(_values(group.get('units', {})), _values(result.get('units', {}))):
+            self._rename(unit, self.names['unit'].get(source_unit['unitId']))
+        return result
+
+
+class _Merger:
+    """
+    Keeps track of the ids, keys and resources used by the target mission while sources are merged into it
+    """
+
+    def __init__(self, target: Miz) -> None:
+        self.target = target
+        self.report = MergeReport()
+        mission_dict = target.mission.d
+        self.taken: typing.Dict[str, typing.Set[int]] = {'group': set(), 'unit': set(), 'zone': set()}
+        self.names: typing.Dict[str, typing.Set[str]] = {'group': set(), 'unit': set()}
+        for group in self._groups(mission_dict):
+            self.taken['group'].add(group['groupId'])
+            self.names['group'].add(target.l10n.get(group['name'], group['name']))
+            for unit in _values(group.get('units', {})):
+                self.taken['unit'].add(unit['unitId'])
+                self.names['unit'].add(target.l10n.get(unit['name'], unit['name']))
+        for zone in self._zones(mission_dict):
+            self.taken['zone'].add(zone['zoneId'])
+        self.next_id = {kind: max(ids, default=0) + 1 for kind, ids in self.taken.items()}
+        self.max_dict_id = mission_dict.get('maxDictId', 0)
+        self.taken_keys = set(target.l10n) | set(target.map_res)
+        self.resource_names = set(target.map_res.values()) | set(target.resources)
+        self._resource_hashes: typing.Optional[typing.Dict[str, str]] = None
+
+    @staticmethod
+    def _countries(mission_dict: dict) -> typing.Iterator[typing.Tuple[str, dict]]:
+        for color, coalition in mission_dict['coalition'].items():
+            for country in _values(coalition.get('country', {})):
+                yield color, country
+
+    @staticmethod
+    def _groups(mission_dict: dict) -> typing.Iterator[dict]:
+        for _, country in _Merger._countries(mission_dict):
+            for category in _GROUP_CATEGORIES:
+                if category in country:
+                    yield from _values(country[category].get('group', {}))
+
+    @staticmethod
+    def _zones(mission_dict: dict) -> typing.Iterable[dict]:
+        return _values(mission_dict.get('triggers', {}).get('zones', {}))
+
+    def _id_table(self, kind: str, ids: typing.Iterable[int]) -> typing.Dict[int, int]:
+        table = {}
+        taken = self.taken[kind]
+        for id_ in ids:
+            if id_ in taken:
+                table[id_] = self.next_id[kind]
+                id_ = self.next_id[kind]
+            taken.add(id_)
+            self.next_id[kind] = max(self.next_id[kind], id_ + 1)
+        return table
+
+    def _name_table(self, kind: str, names: typing.Iterable[typing.Tuple[int, str]]) -> typing.Dict[int, str]:
+        table = {}
+        taken = self.names[kind]
+        for id_, name in names:
+            if name in taken:
+                count = 2
+                while f'{name}_{count}' in taken:
+                    count += 1
+                LOGGER.debug('%s name already used: "%s", renamed to "%s_%s"', kind, name, name, count)
+                table[id_] = name = f'{name}_{count}'
+            taken.add(name)
+        return table
+
+    def _key_table(self, source: Miz) -> typing.Dict[str, str]:
+        table = {}
+        self.max_dict_id = max(self.max_dict_id, source.mission.d.get('maxDictId', 0))
+        for key in list(source.l10n) + list(source.map_res):
+            if key in self.taken_keys:
+                self.max_dict_id += 1
+                table[key] = f'{key.rsplit("_", 1)[0]}_{self.max_dict_id}'
+                key = table[key]
+            self.taken_keys.add(key)
+        return table
+
+    def _translator(self, source: Miz, trig_offset: int) -> _Translator:
+        source_dict = source.mission.d
+        groups = list(self._groups(source_dict))
+        ids = {
+            'group': self._id_table('group', (group['groupId'] for group in groups)),
+            'unit': self._id_table('unit', (unit['unitId'] for group in groups
+                                            for unit in _values(group.get('units', {})))),
+            'zone': self._id_table('zone', (zone['zoneId'] for zone in self._zones(source_dict))),
+        }
+        names = {
+            'group': self._name_table('group', ((group['groupId'], source.l10n.get(group['name'], group['name']))
+                                                for group in groups)),
+            'unit': self._name_table('unit', ((unit['unitId'], source.l10n.get(unit['name'], unit['name']))
+                                              for group in groups for unit in _values(group.get('units', {})))),
+        }
+        keys = self._key_table(source)
+        self.report.remapped_ids += sum(len(table) for table in ids.values())
+        self.report.renamed += sum(len(table) for table in names.values())
+        self.report.remapped_keys += len(keys)
+        return _Translator(ids, names, keys, trig_offset)
+
+    def _target_country(
+            self,
+            target_dict: dict,
+            color: str,
+            source_country: dict,
+            colors: typing.Dict[int, str],
+    ) -> typing.Optional[dict]:
+        coalition = target_dict['coalition']
+        if color not in coalition:
+            LOGGER.warning('coalition "%s" does not exist in the target mission, skipping %s', color,
+                           source_country['name'])
+            return None
+        if colors.get(source_country['id'], color) != color:
+            LOGGER.warning('%s is in coalition "%s" in the target mission, skipping its groups from coalition "%s"',
+                           source_country['name'], colors[source_country['id']], color)
+            self.report.skipped_countries.append(source_country['name'])
+            return None
+        countries = coalition[color]['country']
+        for index, country in dict.items(countries):
+            if country['id'] == source_country['id']:
+                return countries[index]
+        country = {key: value for key, value in source_country.items() if key not in _GROUP_CATEGORIES}
+        countries[_next_index(countries)] = country
+        # the country may be listed (without units) in another coalition; it is moved to this one
+        for coalition_color, coalition_ids in target_dict.get('coalitions', {}).items():
+            ids = list(_values(coalition_ids))
+            if coalition_color == color and source_country['id'] not in ids:
+                ids.append(source_country['id'])
+            elif coalition_color != color and source_country['id'] in ids:
+                ids.remove(source_country['id'])
+            else:
+                continue
+            target_dict['coalitions'][coalition_color] = {index: id_ for index, id_ in enumerate(ids, start=1)}
+        return countries[_next_index(countries) - 1]
+
+    def _merge_groups(self, target_dict: dict, source: Miz, translator: _Translator):
+        colors = {country['id']: color for color, country in self._countries(target_dict)}
+        for color, source_country in self._countries(source.mission.d):
+            country = self._target_country(target_dict, color, source_country, colors)
+            if country is None:
+                continue
+            for category in _GROUP_CATEGORIES:
+                if category not in source_country:
+                    continue
+                if category not in country:
+                    country[category] = {'group': {}}
+                groups = country[category]['group']
+                index = _next_index(groups)
+                for group in _values(source_country[category].get('group', {})):
+                    groups[index] = translator.group(group)
+                    index += 1
+                    if category == 'static':
+                        self.report.statics += 1
+                    else:
+                        self.report.groups += 1
+                        self.report.units += len(group.get('units', {}))
+
+    def _merge_triggers(self, target_dict: dict, source: Miz, translator: _Translator):
+        source_dict = source.mission.d
+        zones = list(self._zones(source_dict))
+        if zones:
+            target_zones = target_dict.setdefault('triggers', {}).setdefault('zones', {})
+            index = _next_index(target_zones)
+            for zone in zones:
+                target_zones[index] = translator.table(zone, _ZONE_ID_FIELDS)
+                index += 1
+            self.report.zones += len(zones)
+
+        rules = source_dict.get('trigrules', {})
+        if not rules:
+            return
+        target_rules = target_dict.setdefault('trigrules', {})
+        for index, rule in dict.items(rules):
+            target_rules[index + translator.trig_offset] = translator.table(rule, _TRIGRULE_ID_FIELDS)
+        self.report.triggers += len(rules)
+
+        target_trig = target_dict.setdefault('trig', {})
+        for name, table in source_dict.get('trig', {}).items():
+            if name not in target_trig:
+                target_trig[name] = {}
+            target_table = target_trig[name]
+            for index, value in dict.items(table):
+                target_table[index + translator.trig_offset] = translator.table(value, {})
+
+    def _resource_hashes_of_target(self) -> typing.Dict[str, str]:
+        if self._resource_hashes is None:
+            self._resource_hashes = {}
+            for name in sorted(set(self.target.map_res.values())):
+                path = self.target.resource_path(name)
+                if path.exists():
+                    self._resource_hashes.setdefault(file_sha256(path), name)
+        return self._resource_hashes
+
+    def _merge_resource(self, source: Miz, key: str, name: str):
+        path = source.resource_path(name)
+        if not path.exists():
+            LOGGER.warning('resource file not found, it will be missing from the merged mission: %s', name)
+            self.target.map_res[key] = name
+            return
+        hashes = self._resource_hashes_of_target()
+        digest = file_sha256(path)
+        if digest in hashes:
+            self.target.map_res[key] = hashes[digest]
+            self.report.resources_deduplicated += 1
+            return
+        new_name = name
+        count = 1
+        while new_name in self.resource_names:
+            new_name = f'{Path(name).stem}_{count}{Path(name).suffix}'
+            count += 1
+        self.target.add_resource(path, new_name)
+        self.resource_names.add(new_name)
+        hashes[digest] = new_name
+        self.target.map_res[key] = new_name
+        self.report.resources_copied += 1
+
+    def merge(self, source: Miz):
+        """
+        Merges a source mission into the target mission
+        """
+        LOGGER.debug('merging %s into %s', source.miz_path, self.target.miz_path)
+        mission = self.target.mission
+        trig_offset = max(dict.keys(mission.d.get('trigrules', {})), default=0)
+        translator = self._translator(source, trig_offset)
+        with mission.editing():
+            target_dict = mission.d
+            self._merge_groups(target_dict, source, translator)
+            self._merge_triggers(target_dict, source, translator)
+            target_dict['maxDictId'] = self.max_dict_id
+
+        reverse_keys = {new: old for old, new in translator.keys.items()}
+        for key in sorted(translator.used_keys):
+            source_key = reverse_keys.get(key, key)
+            if source_key in source.l10n:
+                self.target.l10n[key] = translator.texts.get(key, source.l10n[source_key])
+            elif source_key in source.map_res:
+                self._merge_resource(source, key, source.map_res[source_key])
+
+
+def merge_miz(target: Miz, sources: typing.Iterable[Miz]) -> MergeReport:
+    """
+    Merges groups, statics, trigger zones, triggers and resources of several missions into a target mission
+
+    All MIZ objects must be decoded (opened as contexts); only the target is modified. The other parts of the target
+    mission (weather, date, description, ...) are left untouched.
+
+    Args:
+        target: mission to merge into
+        sources: missions to merge, in order
+
+    Returns: MergeReport
+
+    """
+    merger = _Merger(target)
+    for source in sources:
+        merger.merge(source)
+    report = merger.report
+    if report.renamed:
+        LOGGER.info('%s group and unit name(s) were already used, and have been renamed', report.renamed)
+    return report
@@ -0,0 +1,375 @@
+# coding=utf-8
+"""
+Instrumentation of the MIZ pipeline
+
+The slow steps of emiz (Miz.unzip, Miz.decode, SLTP.decode, SLTP.encode, Miz.zip, MissionWeather.apply_to_miz,
+edit_miz, ...) report named spans with their duration, the amount of bytes they processed and the size of the
+tables they handled. Spans are sent to the subscribers registered with "subscribe":
+
+    exporter = PrometheusExporter()
+    with subscribed(exporter):
+        edit_miz('some.miz', metar='UGTB 240830Z 31017KT CAVOK 11/02 Q1012')
+    print(exporter.render())
+
+When nothing is subscribed, opening a span only costs a function call and a test, so the instrumentation can stay
+in place in production code.
+
+Spans opened while another one is open in the same thread get its name as "parent". Span names:
+
+- miz.unzip: extraction of the MIZ file (bytes: size of the MIZ file, items: amount of members)
+- miz.decode: decoding of the lua tables of a MIZ file (items: amount of tables)
+- miz.encode: encoding of the modified lua tables of a MIZ file (items: amount of tables)
+- miz.zip: writing of a MIZ file, miz.encode included (bytes: size of the MIZ file, items: amount of members)
+- sltp.decode / sltp.encode: decoding / encoding of a single lua table (bytes: size of the lua text, items: amount
+  of top-level entries of the table, attribute "table": name of the table)
+- weather.apply: application of a MissionWeather to a mission
+- time.apply: application of a MissionTime to a mission
+- edit_miz: a whole call to edit_miz
+"""
+import contextlib
+import functools
+import json
+import threading
+import time as time_
+import typing
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+
+import elib
+
+LOGGER = elib.custom_logging.get_logger('EMIZ')
+
+SpanCallback = typing.Callable[['Span'], None]
+
+# replaced as a whole (never mutated) so that it can be read without locking
+_SUBSCRIBERS: typing.Tuple[SpanCallback, ...] = ()
+_SUBSCRIBERS_LOCK = threading.Lock()
+# spans currently open in each thread
+_OPEN_SPANS = threading.local()
+
+
+@dataclass
+class Span:
+    """
+    A timed step of the pipeline
+    """
+    name: str
+    seconds: float = 0.0
+    # amount of bytes processed
+    size: int = 0
+    # size of the table(s) processed
+    items: int = 0
+    attributes: typing.Dict[str, typing.Any] = field(default_factory=dict)
+    # wall clock time at which the step started (seconds since the epoch)
+    start: float = 0.0
+    # name of the span that was open when this one started, in the same thread
+    parent: str = ''
+
+
+class _SpanContext:
+    """
+    Times a span and sends it to the subscribers on exit
+    """
+
+    __slots__ = ('span', '_start')
+
+    def __init__(self, name: str, attributes: dict) -> None:
+        self.span = Span(name, attributes=attributes)
+        self._start = 0.0
+
+    def __enter__(self) -> Span:
+        stack = _open_spans()
+        if stack:
+            self.span.parent = stack[-1].name
+        stack.append(self.span)
+        self.span.start = time_.time()
+        self._start = time_.perf_counter()
+        return self.span
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.span.seconds = time_.perf_counter() - self._start
+        _open_spans().pop()
+        if exc_type is not None:
+            self.span.attributes['error'] = exc_type.__name__
+        _emit(self.span)
+        return False
+
+
+class _NullSpan:
+    """
+    Stands for a span when nothing is subscribed; writes to it are discarded
+    """
+
+    __slots__ = ()
+
+    name = ''
+    seconds = 0.0
+    start = 0.0
+    parent = ''
+
+    def __enter__(self) -> '_NullSpan':
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        return False
+
+    def __setattr__(self, name, value):
+        pass
+
+    @property
+    def size(self) -> int:
+        """
+        Returns: 0
+        """
+        return 0
+
+    @property
+    def items(self) -> int:
+        """
+        Returns: 0
+        """
+        return 0
+
+    @property
+    def attributes(self) -> dict:
+        """
+        Returns: a new, throw-away dict
+        """
+        return {}
+
+
+_NULL_SPAN = _NullSpan()
+
+
+def _open_spans() -> typing.List[Span]:
+    try:
+        return _OPEN_SPANS.stack
+    except AttributeError:
+        _OPEN_SPANS.stack = []
+        return _OPEN_SPANS.stack
+
+
+def span(name: str, **attributes) -> typing.ContextManager:
+    """
+    Opens a span; to be used as a context manager that gives the span, so that "size", "items" and "attributes" can
+    be filled in (see also "timed"):
+
+        with span('miz.zip') as current:
+            ...
+            current.size = destination.stat().st_size
+
+    Args:
+        name: name of the span
+        **attributes: additional attributes of the span
+
+    Returns: context manager
+    """
+    if not _SUBSCRIBERS:
+        return _NULL_SPAN
+    return _SpanContext(name, attributes)
+
+
+def timed(name: str, **attributes):
+    """
+    Decorator opening a span around each call of a function; the function can fill the span in through
+    "current_span"
+
+    Args:
+        name: name of the span
+        **attributes: additional attributes of the span
+    """
+
+    def _decorator(func):
+        @functools.wraps(func)
+        def _wrapper(*args, **kwargs):
+            if not _SUBSCRIBERS:
+                return func(*args, **kwargs)
+            with _SpanContext(name, dict(attributes)):
+                return func(*args, **kwargs)
+
+        return _wrapper
+
+    return _decorator
+
+
+def current_span() -> typing.Union[Span, _NullSpan]:
+    """
+    Returns: innermost span open in this thread (writes to it are discarded if nothing is subscribed)
+    """
+    if not _SUBSCRIBERS:
+        return _NULL_SPAN
+    stack = _open_spans()
+    return stack[-1] if stack else _NULL_SPAN
+
+
+def enabled() -> bool:
+    """
+    Returns: True if spans are currently recorded (at least one subscriber)
+    """
+    return bool(_SUBSCRIBERS)
+
+
+def _emit(span_: Span):
+    for callback in _SUBSCRIBERS:
+        try:
+            callback(span_)
+        except Exception:  # pylint: disable=broad-except
+            LOGGER.exception('error in span subscriber: %s', callback)
+
+
+def subscribe(callback: SpanCallback):
+    """
+    Registers a callback that receives every span once it is closed
+
+    Callbacks are called from the thread that ran the step; they must be thread safe. Exceptions raised by a
+    callback are logged and otherwise ignored.
+
+    Args:
+        callback: callable taking a Span
+    """
+    global _SUBSCRIBERS  # pylint: disable=global-statement
+    with _SUBSCRIBERS_LOCK:
+        _SUBSCRIBERS = _SUBSCRIBERS + (callback,)
+
+
+def unsubscribe(callback: SpanCallback):
+    """
+    Removes a callback registered with "subscribe"
+
+    Args:
+        callback: callback to remove
+    """
+    global _SUBSCRIBERS  # pylint: disable=global-statement
+    with _SUBSCRIBERS_LOCK:
+        _SUBSCRIBERS = tuple(subscriber for subscriber in _SUBSCRIBERS if subscriber is not callback)
+
+
+@contextlib.contextmanager
+def subscribed(callback: SpanCallback):
+    """
+    Registers a callback for the duration of a "with" block
+
+    Args:
+        callback: callable taking a Span
+    """
+    subscribe(callback)
+    try:
+        yield callback
+    finally:
+        unsubscribe(callback)
+
+
+class SpanRecorder:
+    """
+    Subscriber keeping all the spans in memory
+    """
+
+    def __init__(self) -> None:
+        self.spans: typing.List[Span] = []
+        self._lock = threading.Lock()
+
+    def __call__(self, span_: Span):
+        with self._lock:
+            self.spans.append(span_)
+
+    def by_name(self, name: str) -> typing.List[Span]:
+        """
+        Args:
+            name: name of the spans
+
+        Returns: recorded spans with that name
+        """
+        with self._lock:
+            return [span_ for span_ in self.spans if span_.name == name]
+
+
+class JsonLinesExporter:
+    """
+    Subscriber writing every span as a line of JSON
+    """
+
+    def __init__(self, target: typing.Union[str, Path, typing.TextIO]) -> None:
+        """
+        Args:
+            target: file (appended to) or text stream to write to
+        """
+        if isinstance(target, (str, Path)):
+            self._stream = open(str(target), mode='a', encoding='utf8')
+            self._own_stream = True
+        else:
+            self._stream = target
+            self._own_stream = False
+        self._lock = threading.Lock()
+
+    def __call__(self, span_: Span):
+        line = json.dumps(asdict(span_), default=str)
+        with self._lock:
+            self._stream.write(line + '\n')
+            self._stream.flush()
+
+    def close(self):
+        """
+        Closes the file (streams given to the constructor are left open)
+        """
+        if self._own_stream:
+            self._stream.close()
+
+
+def _escape_label(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+class PrometheusExporter:
+    """
+    Subscriber aggregating the spans into counters, rendered in the Prometheus text format
+
+    Spans are aggregated by name and attributes (the attributes become labels).
+    """
+
+    _METRICS = (
+        ('emiz_span_count_total', 'Amount of spans', 'count'),
+        ('emiz_span_seconds_total', 'Total duration of the spans, in seconds', 'seconds'),
+        ('emiz_span_bytes_total', 'Total amount of bytes processed by the spans', 'size'),
+        ('emiz_span_items_total', 'Total size of the tables processed by the spans', 'items'),
+    )
+
+    def __init__(self) -> None:
+        self._series: typing.Dict[typing.Tuple[str, typing.Tuple[typing.Tuple[str, str], ...]], dict] = {}
+        self._lock = threading.Lock()
+
+    def __call__(self, span_: Span):
+        labels = tuple(sorted((str(key), str(value)) for key, value in span_.attributes.items()))
+        with self._lock:
+            series = self._series.setdefault(
+                (span_.name, labels), {'count': 0, 'seconds': 0.0, 'size': 0, 'items': 0}
+            )
+            series['count'] += 1
+            series['seconds'] += span_.seconds
+            series['size'] += span_.size
+            series['items'] += span_.items
+
+    def render(self) -> str:
+        """
+        Returns: the counters, in the Prometheus text exposition format
+        """
+        with self._lock:
+            series = sorted(self._series.items())
+            lines = []
+            for metric, help_text, value_name in self._METRICS:
+                lines.append(f'# HELP {metric} {help_text}')
+                lines.append(f'# TYPE {metric} counter')
+                for (name, labels), values in series:
+                    label_text = ','.join(
+                        f'{key}="{_escape_label(value)}"' for key, value in (('span', name),) + labels
+                    )
+                    lines.append(f'{metric}{{{label_text}}} {values[value_name]}')
+        return '\n'.join(lines) + '\n'
+
+    def write(self, path: typing.Union[str, Path]):
+        """
+        Writes the counters to a file (for example for the textfile collector of the node exporter)
+
+        Args:
+            path: file to write
+        """
+        Path(path).write_text(self.render(), encoding='utf8')
@@ -5,13 +5,14 @@ Manages mission objects
 # pylint: skip-file
 # FIXME: pylint the shit out of this
 import calendar
+import contextlib
 import typing
 from itertools import chain
 from time import gmtime, strftime
 
 import elib
 
-from emiz.validator import VALID_BOOL, VALID_FLOAT, VALID_INT, VALID_POSITIVE_INT, VALID_STR, Validator
+from emiz.validator import VALID_BOOL, VALID_FLOAT, VALID_INT, VALID_POSITIVE_INT, VALID_STR, Validator, validation
 
 EPOCH_DELTA = 1306886400
 
@@ -21,6 +22,106 @@ validator_group_or_unit_name = Validator(_type=str, _regex=r'[a-zA-Z0-9\_\-\#]+'
                                          exc=ValueError, logger=LOGGER)
 
 
+class _Changes:
+    """
+    Keeps track of the modifications made to a mission table
+
+    A single instance is shared by all the objects built on top of the same mission dictionary
+    """
+
+    def __init__(self) -> None:
+        self.generation = 0
+        # > 0 while a setter is running; copy-on-write tables only copy their sub-tables during that time
+        self.editing = 0
+
+
+def _own_table(value, changes: _Changes):
+    if isinstance(value, (_CowDict, _CowList)) and value._changes is changes:
+        return None
+    if isinstance(value, dict):
+        return _CowDict(value, changes)
+    if isinstance(value, list):
+        return _CowList(value, changes)
+    return None
+
+
+class _CowDict(dict):
+    """
+    Dictionary sharing its sub-tables with another one until they are edited
+
+    Sub-tables are copied (shallowly) the first time they are accessed by a setter, so only the path to the edited
+    value is ever duplicated.
+    """
+    __slots__ = ('_changes',)
+
+    def __init__(self, source: dict, changes: _Changes) -> None:
+        super().__init__(source)
+        self._changes = changes
+
+    def __getitem__(self, key):
+        value = super().__getitem__(key)
+        if self._changes.editing:
+            owned = _own_table(value, self._changes)
+            if owned is not None:
+                super().__setitem__(key, owned)
+                return owned
+        return value
+
+    def setdefault(self, key, default=None):
+        # dict.setdefault would bypass __getitem__, and return a shared sub-table
+        if key not in self:
+            super().__setitem__(key, default)
+        return self[key]
+
+
+class _CowList(list):
+    """
+    List counterpart of _CowDict
+    """
+    __slots__ = ('_changes',)
+
+    def __init__(self, source: list, changes: _Changes) -> None:
+        super().__init__(source)
+        self._changes = changes
+
+    def __getitem__(self, index):
+        value = super().__getitem__(index)
+        if self._changes.editing and isinstance(index, int):
+            owned = _own_table(value, self._changes)
+            if owned is not None:
+                super().__setitem__(index, owned)
+                return owned
+        return value
+
+
+def _copy_table(value):
+    """
+    Deep copy of a lua table, made of plain dictionaries and lists
+    """
+    if isinstance(value, dict):
+        return {key: _copy_table(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_copy_table(item) for item in value]
+    return value
+
+
+def _values(table) -> typing.Iterable:
+    if isinstance(table, dict):
+        return table.values()
+    return table
+
+
+def _raw_groups(mission_dict: dict) -> typing.Iterator[dict]:
+    """
+    Iterates over the tables of all groups (statics included) of a mission, without creating Group objects
+    """
+    for coalition in _values(mission_dict['coalition']):
+        for country in _values(coalition.get('country', {})):
+            for category in ('helicopter', 'plane', 'ship', 'vehicle', 'static'):
+                if category in country:
+                    yield from _values(country[category].get('group', {}))
+
+
 class BaseMissionObject:
     """
     Serves as base mission (dictionary) object
@@ -35,6 +136,10 @@ class BaseMissionObject:
         if not isinstance(l10n, dict):
             raise TypeError('l10n should be an dict, got: {}'.format(type(l10n)))
 
+        if isinstance(mission_dict, _CowDict):
+            self._changes = mission_dict._changes
+        else:
+            self._changes = _Changes()
         self.d = mission_dict
         self.l10n = l10n
 
@@ -46,6 +151,84 @@ class BaseMissionObject:
         self._countries_by_name: typing.Dict[str, 'Country'] = {}
         self._countries_by_id: typing.Dict[int, 'Country'] = {}
 
+    def __setattr__(self, name, value):
+        if name == 'd' or isinstance(getattr(type(self), name, None), property):
+            # same as "editing()", without the cost of a context manager on every single assignment
+            changes = self._changes
+            changes.editing += 1
+            try:
+                super().__setattr__(name, value)
+            finally:
+                changes.editing -= 1
+                changes.generation += 1
+        else:
+            super().__setattr__(name, value)
+
+    @contextlib.contextmanager
+    def editing(self):
+        """
+        Context manager wrapping any modification of the mission table
+
+        Marks the table as modified, and lets the tables of a fork copy the sub-tables about to be written to.
+        Setters do the same on their own; it only needs to be used when editing "d" directly, or to group many edits.
+        """
+        changes = self._changes
+        changes.editing += 1
+        try:
+            yield
+        finally:
+            changes.editing -= 1
+            changes.generation += 1
+
+    @contextlib.contextmanager
+    def bulk_edit(self, validate: str = 'deferred'):
+        """
+        Context manager for many modifications of the mission table in a row
+
+        Wraps the modifications in a single "editing()" block, and changes how setters validate their values in the
+        current thread (see emiz.validator.validation):
+
+        - "immediate": every value is validated when it is set
+        - "deferred": all values are validated when the context exits, and a single exception lists all the errors
+          (the invalid values have been written to the mission table by then)
+        - "off": values are not validated
+
+        Args:
+            validate: validation mode
+        """
+        with self.editing(), validation(validate):
+            yield self
+
+    def _child(self, cls, *args):
+        """
+        Creates a mission object sharing this object's tables and change tracking
+
+        Args:
+            cls: class of the mission object to create
+            *args: additional arguments for the class constructor
+
+        Returns: mission object
+        """
+        child = cls(self.d, self.l10n, *args)
+        child._changes = self._changes
+        return child
+
+    @property
+    def generation(self) -> int:
+        """
+        Returns: amount of modifications made to the mission table through its objects
+        """
+        return self._changes.generation
+
+    def touch(self):
+        """
+        Marks the mission table as modified
+
+        Setters do this automatically; it needs to be called manually after editing "d" in place (unless the edit was
+        wrapped in "editing()"), or the mission table will not be re-encoded when the MIZ file is zipped.
+        """
+        self._changes.generation += 1
+
     def get_country_by_name(self, country_name: str) -> typing.Optional['Country']:
         """
         Gets a country from its name
@@ -368,6 +551,9 @@ class BaseMissionObject:
 class Mission(BaseMissionObject):
     """
     Represents a Mission object
+
+    Missions are not locked: distinct missions (and forks of a mission that is not being edited) can be edited
+    concurrently in different threads, but a single mission must only be used by one thread at a time.
     """
     validator_start_time = Validator(
         _type=int,
@@ -413,14 +599,29 @@ class Mission(BaseMissionObject):
 
     def __init__(self, mission_dict, l10n):
         super().__init__(mission_dict, l10n)
-        self.weather = Weather(self.d, l10n)
-        self._blue_coa = Coalition(self.d, l10n, 'blue')
-        self._red_coa = Coalition(self.d, l10n, 'red')
-        self.ground_control = GroundControl(self.d, l10n)
+        self.weather = self._child(Weather)
+        self._blue_coa = self._child(Coalition, 'blue')
+        self._red_coa = self._child(Coalition, 'red')
+        self.ground_control = self._child(GroundControl)
 
     def __repr__(self):
         return 'Mission({})'.format(self.d)
 
+    def fork(self) -> 'Mission':
+        """
+        Creates a copy-on-write copy of this mission
+
+        The fork shares all its tables with this mission; setters of the fork only copy the tables on the path to the
+        value they write, so forking is cheap no matter the size of the mission. This mission must not be edited
+        while its forks are in use.
+
+        Editing "d" of the fork directly (instead of using setters) must be done inside "fork.editing()", or the
+        edit will leak into this mission.
+
+        Returns: Mission
+        """
+        return Mission(_CowDict(self.d, _Changes()), dict(self.l10n))
+
     @property
     def blue_coa(self) -> 'Coalition':
         """
@@ -515,7 +716,7 @@ class Coalition(BaseMissionObject):
         """
         for k in self._section_country:
             if k not in self._countries.keys():
-                country = Country(self.d, self.l10n, self.coa_color, k)
+                country = self._child(Country, self.coa_color, k)
                 self._countries[k] = country
                 self._countries_by_id[country.country_id] = country
                 self._countries_by_name[country.country_name] = country
@@ -1217,9 +1418,9 @@ class Country(Coalition):
             if group_category in self._section_this_country.keys():
                 for group_index in self._section_this_country[group_category]['group']:
                     if group_index not in self.__groups[group_category]:
-                        self.__groups[group_category][group_index] = Group(self.d, self.l10n, self.coa_color,
-                                                                           self.country_index, group_category,
-                                                                           group_index)
+                        self.__groups[group_category][group_index] = self._child(Group, self.coa_color,
+                                                                                 self.country_index, group_category,
+                                                                                 group_index)
                     yield self.__groups[group_category][group_index]
 
     @property
@@ -1230,8 +1431,8 @@ class Country(Coalition):
         if 'static' in self._section_this_country.keys():
             for static_index in self._section_this_country['static']['group']:
                 if static_index not in self.__static:
-                    self.__static[static_index] = Static(self.d, self.l10n, self.coa_color,
-                                                         self.country_index, static_index)
+                    self.__static[static_index] = self._child(Static, self.coa_color,
+                                                              self.country_index, static_index)
                 yield self.__static[static_index]
 
     def get_groups_from_category(self, category) -> typing.Iterator['Group']:
@@ -1261,6 +1462,106 @@ class Country(Coalition):
 
         return None
 
+    # noinspection PyProtectedMember
+    def add_groups_from_template(
+            self,
+            template: 'Group',
+            positions: typing.Sequence[typing.Tuple[float, float]],
+            names: typing.Sequence[str],
+    ) -> typing.List['Group']:
+        """
+        Inserts many copies of a group into this country
+
+        Each copy is moved to its position (units and waypoints keep their offset to the group), and gets its name
+        and new group and unit ids. Units are named after their group: "name-1", "name-2", ...
+
+        Ids are allocated after the highest group and unit ids of the mission, names are stored in the dictionary
+        the same way the template stores them (DictKey entries or plain names), and all the new tables are inserted
+        in a single edit.
+
+        Args:
+            template: group to copy (from any country of this mission)
+            positions: position (x, y) of each new group
+            names: name of each new group
+
+        Returns: list of the new groups
+        """
+        if len(positions) != len(names):
+            raise ValueError(f'got {len(positions)} positions for {len(names)} names')
+        for name in names:
+            validator_group_or_unit_name.validate(name, 'group name')
+        if len(set(names)) != len(names):
+            raise ValueError('group names must be unique')
+
+        template_dict = template._section_group
+        category = template.group_category
+        use_dict_keys = template_dict['name'] in self.l10n
+
+        max_group_id = 0
+        max_unit_id = 0
+        taken_names = set()
+        for group in _raw_groups(self.d):
+            max_group_id = max(max_group_id, group['groupId'])
+            taken_names.add(self.l10n.get(group['name'], group['name']))
+            for unit in _values(group.get('units', {})):
+                max_unit_id = max(max_unit_id, unit['unitId'])
+                taken_names.add(self.l10n.get(unit['name'], unit['name']))
+        duplicates = taken_names.intersection(names)
+        if duplicates:
+            raise ValueError(f'group names already in use: {", ".join(sorted(duplicates))}')
+
+        dict_id = self.d.get('maxDictId', 0)
+        new_l10n: typing.Dict[str, str] = {}
+
+        def _name_entry(kind: str, value: str) -> str:
+            nonlocal dict_id
+            if not use_dict_keys:
+                return value
+            dict_id += 1
+            key = f'DictKey_{kind}_{dict_id}'
+            new_l10n[key] = value
+            return key
+
+        template_x, template_y = template_dict['x'], template_dict['y']
+        unit_indexes = sorted(template_dict['units'])
+        new_groups = []
+        for (pos_x, pos_y), name in zip(positions, names):
+            delta_x, delta_y = pos_x - template_x, pos_y - template_y
+            group = _copy_table(template_dict)
+            max_group_id += 1
+            group['groupId'] = max_group_id
+            group['name'] = _name_entry('GroupName', name)
+            group['x'], group['y'] = pos_x, pos_y
+            for unit_number, unit_index in enumerate(unit_indexes, start=1):
+                unit = group['units'][unit_index]
+                max_unit_id += 1
+                unit['unitId'] = max_unit_id
+                unit['name'] = _name_entry('UnitName', f'{name}-{unit_number}')
+                unit['x'] += delta_x
+                unit['y'] += delta_y
+            for point in _values(group.get('route', {}).get('points', {})):
+                point['x'] += delta_x
+                point['y'] += delta_y
+                if point.get('name') in self.l10n:
+                    point['name'] = _name_entry('WptName', self.l10n[point['name']])
+            new_groups.append(group)
+
+        with self.editing():
+            country = self._section_this_country
+            if category not in country:
+                country[category] = {'group': {}}
+            groups = country[category]['group']
+            first_index = max(groups, default=0) + 1
+            for group_index, group in enumerate(new_groups, start=first_index):
+                groups[group_index] = group
+            if use_dict_keys:
+                self.d['maxDictId'] = dict_id
+                self.l10n.update(new_l10n)
+
+        LOGGER.debug('added %s groups from template %s to %s', len(new_groups), template.group_name, self.country_name)
+        return [self._child(Group, self.coa_color, self.country_index, category, group_index)
+                for group_index in range(first_index, first_index + len(new_groups))]
+
 
 class Static(Country):
     """
@@ -1493,10 +1794,10 @@ class Group(Country):
         for unit_index in self._section_group['units']:
             if unit_index not in self.__units.keys():
                 _category = self.units_class_enum[self.group_category]  # type: ignore
-                self.__units[unit_index] = _category(self.d, self.l10n, self.coa_color,
-                                                     self.country_index,
-                                                     self.group_category,
-                                                     self.group_index, unit_index)
+                self.__units[unit_index] = self._child(_category, self.coa_color,
+                                                       self.country_index,
+                                                       self.group_category,
+                                                       self.group_index, unit_index)
             yield self.__units[unit_index]
 
     @property
@@ -1522,10 +1823,10 @@ class Group(Country):
         if unit_index in self._section_group['units'].keys():
             if unit_index not in self.__units.keys():
                 _category = self.units_class_enum[self.group_category]  # type: ignore
-                self.__units[unit_index] = _category(self.d, self.l10n, self.coa_color,
-                                                     self.country_index,
-                                                     self.group_category,
-                                                     self.group_index, unit_index)
+                self.__units[unit_index] = self._child(_category, self.coa_color,
+                                                       self.country_index,
+                                                       self.group_category,
+                                                       self.group_index, unit_index)
             return self.__units[unit_index]
         return None
 
@@ -1934,7 +2235,8 @@ class FlyingUnit(BaseUnit):
             if 1 <= channel <= self.channels_qty:
                 # noinspection PyTypeChecker
                 if self.min <= frequency <= self.max:
-                    self._section_channels[channel] = float(frequency)
+                    with self.parent_unit.editing():
+                        self._section_channels[channel] = float(frequency)
                 else:
                     raise ValueError(
                         'frequency {} for channel {} for radio {} in aircraft {}'.format(frequency, channel,
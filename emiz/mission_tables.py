@@ -0,0 +1,188 @@
+# coding=utf-8
+"""
+Flattens the Mission object model into normalized tables
+
+Every table has a "mission_hash" column, so that the rows of many missions can be stored side by side. The tables
+are built in a single walk over the mission; exporters (see emiz.sqlite_export) only have to write the rows.
+"""
+import typing
+
+from emiz.mission import BaseUnit, FlyingUnit, Mission
+
+# table name -> ((column name, SQL type), ...)
+TABLES: typing.Dict[str, typing.Tuple[typing.Tuple[str, str], ...]] = {
+    'missions': (
+        ('mission_hash', 'TEXT'),
+        ('theatre', 'TEXT'),
+        ('sortie_name', 'TEXT'),
+        ('year', 'INTEGER'),
+        ('month', 'INTEGER'),
+        ('day', 'INTEGER'),
+        ('start_time', 'INTEGER'),
+        ('version', 'INTEGER'),
+    ),
+    'coalitions': (
+        ('mission_hash', 'TEXT'),
+        ('coalition', 'TEXT'),
+        ('coalition_name', 'TEXT'),
+        ('bullseye_x', 'REAL'),
+        ('bullseye_y', 'REAL'),
+    ),
+    'countries': (
+        ('mission_hash', 'TEXT'),
+        ('coalition', 'TEXT'),
+        ('country_id', 'INTEGER'),
+        ('country_name', 'TEXT'),
+    ),
+    'groups': (
+        ('mission_hash', 'TEXT'),
+        ('coalition', 'TEXT'),
+        ('country_id', 'INTEGER'),
+        ('category', 'TEXT'),
+        ('group_id', 'INTEGER'),
+        ('group_name', 'TEXT'),
+        ('hidden', 'INTEGER'),
+        ('start_time', 'INTEGER'),
+    ),
+    'units': (
+        ('mission_hash', 'TEXT'),
+        ('group_id', 'INTEGER'),
+        ('unit_id', 'INTEGER'),
+        ('unit_name', 'TEXT'),
+        ('unit_type', 'TEXT'),
+        ('skill', 'TEXT'),
+        ('x', 'REAL'),
+        ('y', 'REAL'),
+        ('heading', 'REAL'),
+        ('speed', 'REAL'),
+    ),
+    'statics': (
+        ('mission_hash', 'TEXT'),
+        ('coalition', 'TEXT'),
+        ('country_id', 'INTEGER'),
+        ('static_id', 'INTEGER'),
+        ('static_name', 'TEXT'),
+        ('category', 'TEXT'),
+        ('x', 'REAL'),
+        ('y', 'REAL'),
+    ),
+    'radio_presets': (
+        ('mission_hash', 'TEXT'),
+        ('unit_id', 'INTEGER'),
+        ('radio_number', 'INTEGER'),
+        ('radio_name', 'TEXT'),
+        ('channel', 'INTEGER'),
+        ('frequency', 'REAL'),
+    ),
+    'weather': (
+        ('mission_hash', 'TEXT'),
+        ('season', 'INTEGER'),
+        ('temperature', 'INTEGER'),
+        ('qnh', 'INTEGER'),
+        ('visibility', 'INTEGER'),
+        ('precipitations', 'INTEGER'),
+        ('cloud_base', 'INTEGER'),
+        ('cloud_thickness', 'INTEGER'),
+        ('cloud_density', 'INTEGER'),
+        ('fog_enabled', 'INTEGER'),
+        ('fog_visibility', 'INTEGER'),
+        ('fog_thickness', 'INTEGER'),
+        ('turbulence', 'INTEGER'),
+        ('wind_ground_speed', 'INTEGER'),
+        ('wind_ground_dir', 'INTEGER'),
+        ('wind_2000_speed', 'INTEGER'),
+        ('wind_2000_dir', 'INTEGER'),
+        ('wind_8000_speed', 'INTEGER'),
+        ('wind_8000_dir', 'INTEGER'),
+    ),
+}
+
+_WEATHER_ATTRIBUTES = (
+    'season_code', 'temperature', 'qnh', 'visibility', 'precipitations', 'cloud_base', 'cloud_thickness',
+    'cloud_density', 'fog_enabled', 'fog_visibility', 'fog_thickness', 'turbulence_at_ground_level',
+    'wind_at_ground_level_speed', 'wind_at_ground_level_dir', 'wind_at2000_speed', 'wind_at2000_dir',
+    'wind_at8000_speed', 'wind_at8000_dir',
+)
+
+
+def _optional(obj, attribute: str):
+    """
+    Reads a property that older (or newer) missions may not have
+    """
+    try:
+        return getattr(obj, attribute)
+    except (KeyError, TypeError):
+        return None
+
+
+def _localized(l10n: dict, key):
+    # names are either keys of the dictionary, or the name itself in recent missions
+    return l10n.get(key, key)
+
+
+def _unit_row(mission_hash: str, group_id: int, unit: BaseUnit, l10n: dict) -> tuple:
+    section = unit._section_unit  # pylint: disable=protected-access
+    return (
+        mission_hash, group_id, unit.unit_id, _localized(l10n, section.get('name')), unit.unit_type,
+        section.get('skill'), section.get('x'), section.get('y'), section.get('heading'), section.get('speed'),
+    )
+
+
+def _radio_rows(mission_hash: str, unit: BaseUnit) -> typing.Iterator[tuple]:
+    if not isinstance(unit, FlyingUnit) or not unit.has_radio_presets:
+        return
+    if 'Radio' not in unit._section_unit:  # pylint: disable=protected-access
+        return
+    for radio in unit.radio_presets:
+        for channel, frequency in radio.channels:
+            yield mission_hash, unit.unit_id, radio.radio_num, radio.radio_name, channel, frequency
+
+
+def mission_tables(mission: Mission, mission_hash: str) -> typing.Dict[str, typing.List[tuple]]:
+    """
+    Flattens a mission into rows, following the columns described in TABLES
+
+    Args:
+        mission: mission to flatten
+        mission_hash: identifier of the mission, written in every row
+
+    Returns: dictionary of table name -> list of rows
+
+    """
+    tables: typing.Dict[str, typing.List[tuple]] = {name: [] for name in TABLES}
+    l10n = mission.l10n
+    date = mission.d.get('date', {})
+    tables['missions'].append((
+        mission_hash, mission.d.get('theatre'), _localized(l10n, mission.d.get('sortie')), date.get('Year'),
+        date.get('Month'), date.get('Day'), mission.d.get('start_time'), mission.d.get('version'),
+    ))
+    tables['weather'].append(
+        (mission_hash,) + tuple(_optional(mission.weather, attribute) for attribute in _WEATHER_ATTRIBUTES)
+    )
+
+    for coalition in mission.coalitions:
+        tables['coalitions'].append((
+            mission_hash, coalition.coa_color, _optional(coalition, 'coalition_name'),
+            _optional(coalition, 'bullseye_x'), _optional(coalition, 'bullseye_y'),
+        ))
+        for country in coalition.countries:
+            tables['countries'].append((mission_hash, coalition.coa_color, country.country_id, country.country_name))
+            for group in country.groups:
+                section = group._section_group  # pylint: disable=protected-access
+                tables['groups'].append((
+                    mission_hash, coalition.coa_color, country.country_id, group.group_category, group.group_id,
+                    _localized(l10n, section.get('name')), section.get('hidden'), section.get('start_time'),
+                ))
+                for unit in group.units:
+                    tables['units'].append(_unit_row(mission_hash, group.group_id, unit, l10n))
+                    tables['radio_presets'].extend(_radio_rows(mission_hash, unit))
+            for static in country.statics:
+                section = static._section_static  # pylint: disable=protected-access
+                first_unit = section['units'][1]
+                tables['statics'].append((
+                    mission_hash, coalition.coa_color, country.country_id, static.static_id,
+                    _localized(l10n, section.get('name')), first_unit.get('category'), first_unit.get('x'),
+                    first_unit.get('y'),
+                ))
+
+    return tables
@@ -7,6 +7,8 @@ import re
 
 import elib
 
+from emiz.metrics import timed
+
 LOGGER = elib.custom_logging.get_logger('EMIZ')
 
 RE_INPUT_STRING = re.compile(r'^'
@@ -30,6 +32,7 @@ class MissionTime:
         self.time = datetime.time(hour=moment.hour, minute=moment.minute, second=moment.second)
         self.datetime = datetime.datetime.combine(self.date, self.time)
 
+    @timed('time.apply')
     def apply_to_miz(self, miz):
         """
         Applies this datetime to a Miz object (it will be mutated in place)
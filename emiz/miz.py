@@ -2,29 +2,101 @@
 """
 Manages MIZ files
 """
+import copy
+import io
 import os
 import shutil
 import tempfile
 import typing
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
 from filecmp import dircmp
 from pathlib import Path
-from zipfile import BadZipFile, ZipFile
+from zipfile import BadZipFile, ZipFile, ZipInfo
 
 import elib
 
 from emiz.dummy_miz import dummy_miz
+from emiz.metrics import current_span, timed
 from emiz.mission import Mission
-from emiz.sltp import SLTP
+from emiz.miz_archive import compress_member, is_same_content, read_raw_member, write_raw_member
+from emiz.sltp import SLTP, DecodeStats, peek
 
 LOGGER = elib.custom_logging.get_logger('EMIZ')
 
 ENCODING = 'iso8859_15'
 
+_PEEK_MISSION_KEYS = ('date', 'sortie', 'start_time', 'theatre', 'version')
+
+# name of a lua table -> member of the MIZ file
+TABLE_MEMBERS = {
+    'mission': 'mission',
+    'dictionary': 'l10n/DEFAULT/dictionary',
+    'mapResource': 'l10n/DEFAULT/mapResource',
+    'warehouses': 'warehouses',
+}
+
+
+def decode_table_file(file_path: typing.Union[str, Path]) -> typing.Tuple[dict, str]:
+    """
+    Decodes a lua table file (mission, dictionary, mapResource, ...)
+
+    Args:
+        file_path: file to decode
+
+    Returns: tuple of decoded table, qualifier
+
+    """
+    with open(str(file_path), encoding=ENCODING) as stream:
+        return SLTP().decode(stream.read())
+
+
+def encode_table(table: dict, qualifier: str) -> str:
+    """
+    Encodes a lua table
+
+    Args:
+        table: table to encode
+        qualifier: qualifier of the table (as returned by decode_table_file)
+
+    Returns: lua text
+
+    """
+    return SLTP().encode(table, qualifier)
+
+
+@dataclass
+class MizSummary:  # pylint: disable=too-many-instance-attributes
+    """
+    Mission metadata, as returned by Miz.peek
+    """
+    path: Path
+    theatre: str
+    day: int
+    month: int
+    year: int
+    mission_start_time: int
+    sortie_name: str
+    version: int
+
 
 # pylint: disable=too-many-instance-attributes
 class Miz:
     """
     Manage MIZ files
+
+    Thread safety: different Miz objects (including clones of the same Miz) can be decoded, edited and zipped
+    concurrently in different threads; each one has its own temp dir and its own mission tables, and validators hold
+    no per-call state. A single Miz (or Mission) must not be used by several threads at once without external
+    locking. Concurrent zips must not write to the same destination (beware of the default destination, which is
+    derived from the source MIZ file).
+
+    Change tracking: by default, the mission table is re-encoded every time the MIZ file is zipped. With
+    "track_changes", it is only re-encoded if it was modified through the setters of the mission objects (see
+    Mission.generation); edits made to "mission.d" directly are then lost unless they are wrapped in
+    "mission.editing()" or followed by "mission.touch()". The l10n and mapResource tables are compared with their
+    decoded content, and only re-encoded if they changed, in both modes.
     """
 
     def __init__(
@@ -32,7 +104,8 @@ class Miz:
             path_to_miz_file: typing.Union[str, Path],
             temp_dir: typing.Union[str, Path] = None,
             keep_temp_dir: bool = False,
-            overwrite: bool = False
+            overwrite: bool = False,
+            track_changes: bool = False,
     ) -> None:
 
         self.miz_path = elib.path.ensure_file(path_to_miz_file)
@@ -47,8 +120,12 @@ class Miz:
 
         self.overwrite = overwrite
 
+        self.track_changes = track_changes
+
         self.temp_dir = Path(tempfile.mkdtemp('EMFT_'))
         LOGGER.debug('temporary directory: %s', self.temp_dir)
+        # clones read the members they do not re-encode from the temp dir of the Miz they were cloned from
+        self._base_dir: typing.Optional[Path] = None
 
         self.zip_content: typing.Optional[typing.List[str]] = None
         self._mission = None
@@ -58,11 +135,19 @@ class Miz:
         self._map_res = None
         self._map_res_qual = None
         self._resources: set = set()
+        # resources removed from this Miz, that may still exist in the base dir
+        self._removed_resources: typing.Set[str] = set()
+
+        # state of the tables as they were last decoded or encoded; used to skip encoding unchanged tables
+        self._l10n_snapshot: typing.Optional[dict] = None
+        self._map_res_snapshot: typing.Optional[dict] = None
+        self._mission_generation: typing.Optional[int] = None
 
     def __enter__(self):
         LOGGER.debug('instantiating new Mission object as a context')
-        self.unzip(self.overwrite)
-        self.decode()
+        if self._mission is None:
+            self.unzip(self.overwrite)
+            self.decode()
         return self
 
     def __exit__(self, exc_type, exc_val, _):
@@ -146,6 +231,79 @@ class Miz:
         """
         return self._resources
 
+    def resource_path(self, resource_name: str) -> Path:
+        """
+        Args:
+            resource_name: file name of a resource (as found in the values of "map_res")
+
+        Returns: path to the resource file
+
+        """
+        path = self.temp_dir.joinpath('l10n', 'DEFAULT', resource_name)
+        if not path.exists() and self._base_dir is not None:
+            return self._base_dir.joinpath('l10n', 'DEFAULT', resource_name)
+        return path
+
+    def add_resource(self, source_file: typing.Union[str, Path], resource_name: str):
+        """
+        Copies a file into the resources of this mission
+
+        The file still has to be referenced in "map_res" to be used by the mission.
+
+        Args:
+            source_file: file to copy
+            resource_name: file name of the resource in the MIZ file
+
+        """
+        target = self.temp_dir.joinpath('l10n', 'DEFAULT', resource_name)
+        target.parent.mkdir(parents=True, exist_ok=True)
+        shutil.copyfile(str(source_file), str(target))
+        self._resources.add(resource_name)
+        self._removed_resources.discard(resource_name)
+
+    def remove_resource(self, resource_name: str):
+        """
+        Removes a file from the resources of this mission
+
+        Entries of "map_res" that reference the file are left untouched.
+
+        Args:
+            resource_name: file name of the resource in the MIZ file
+
+        """
+        path = self.temp_dir.joinpath('l10n', 'DEFAULT', resource_name)
+        if path.exists():
+            path.unlink()
+        self._resources.discard(resource_name)
+        self._removed_resources.add(resource_name)
+
+    def clone(self) -> 'Miz':
+        """
+        Creates a copy of this (decoded) Miz that can be edited and zipped independently
+
+        The mission of the clone is a copy-on-write fork of this one (see Mission.fork), and the clone reads the
+        archive members it does not re-encode from the temp dir of this Miz. The clone must therefore be zipped
+        before this Miz is closed, and this Miz must not be edited while its clones are in use.
+
+        Returns: Miz
+        """
+        clone = copy.copy(self)
+        clone.temp_dir = Path(tempfile.mkdtemp('EMFT_'))
+        LOGGER.debug('temporary directory for clone: %s', clone.temp_dir)
+        clone._base_dir = self._base_dir or self.temp_dir
+        clone.zip_content = list(self.zip_content or [])
+        clone._resources = set(self._resources)
+        clone._removed_resources = set(self._removed_resources)
+        clone._mission = self.mission.fork()
+        clone._l10n = clone._mission.l10n
+        clone._map_res = dict(self.map_res)
+        if self.mission.generation != self._mission_generation:
+            # the mission of this Miz has not been encoded yet, neither has the mission of the clone
+            clone._mission_generation = None
+        else:
+            clone._mission_generation = clone._mission.generation
+        return clone
+
     @staticmethod
     def reorder(
             miz_file_path: typing.Union[str, Path],
@@ -209,7 +367,7 @@ class Miz:
                     mirror_dir(Path(sub.left), Path(sub.right))
 
             # pylint: disable=protected-access
-            miz_._encode()
+            miz_._encode(force=True)
 
             if skip_options_file:
                 ignore = ['options']
@@ -218,6 +376,7 @@ class Miz:
 
             mirror_dir(Path(miz_.temp_dir), target_dir_path)
 
+    @timed('miz.decode')
     def decode(self):
         """Decodes the mission files into dictionaries"""
 
@@ -227,17 +386,34 @@ class Miz:
             self.unzip(overwrite=False)
 
         LOGGER.debug('reading map resource file')
-        with open(self.map_res_file, encoding=ENCODING) as stream:
-            self._map_res, self._map_res_qual = SLTP().decode(stream.read())
+        map_res = decode_table_file(self.map_res_file)
 
         LOGGER.debug('reading l10n file')
-        with open(self.dictionary_file, encoding=ENCODING) as stream:
-            self._l10n, self._l10n_qual = SLTP().decode(stream.read())
+        l10n = decode_table_file(self.dictionary_file)
 
         LOGGER.debug('reading mission file')
-        with open(self.mission_file, encoding=ENCODING) as stream:
-            mission_data, self._mission_qual = SLTP().decode(stream.read())
-            self._mission = Mission(mission_data, self._l10n)
+        mission = decode_table_file(self.mission_file)
+
+        self._load_tables(map_res, l10n, mission)
+        current_span().items = 3
+
+        LOGGER.debug('decoding done')
+
+    def _load_tables(
+            self,
+            map_res: typing.Tuple[dict, str],
+            l10n: typing.Tuple[dict, str],
+            mission: typing.Tuple[dict, str],
+    ):
+        """
+        Sets the decoded tables (as returned by decode_table_file) and gathers the resources
+        """
+        self._map_res, self._map_res_qual = map_res
+        self._l10n, self._l10n_qual = l10n
+        mission_data, self._mission_qual = mission
+        self._mission = Mission(mission_data, self._l10n)
+
+        self._take_snapshot()
 
         LOGGER.debug('gathering resources')
         for file in Path(self.temp_dir, 'l10n', 'DEFAULT').iterdir():
@@ -246,23 +422,73 @@ class Miz:
             LOGGER.debug('found resource: %s', file.name)
             self._resources.add(file.name)
 
-        LOGGER.debug('decoding done')
+    def _take_snapshot(self):
+        self._map_res_snapshot = dict(self.map_res)
+        self._l10n_snapshot = dict(self.l10n)
+        self._mission_generation = self.mission.generation
 
-    def _encode(self):
+    @staticmethod
+    def _write_table(file_path: Path, table: dict, qualifier: str):
+        Miz._write_text(file_path, encode_table(table, qualifier))
 
-        LOGGER.debug('encoding lua tables')
+    @staticmethod
+    def _write_text(file_path: Path, text: str):
+        file_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(file_path, mode='w', encoding=ENCODING) as stream:
+            stream.write(text)
+
+    def _tables_to_encode(self, force: bool = False) -> typing.List[typing.Tuple[Path, dict, str]]:
+        """
+        Lists the lua tables that have changed since they were decoded or encoded
+
+        Args:
+            force: list all tables, even the unchanged ones
+
+        Returns: list of (file to write, table, qualifier)
+
+        """
+        tables = []
+
+        if force or self.map_res != self._map_res_snapshot:
+            LOGGER.debug('encoding map resource')
+            tables.append((self.map_res_file, self._map_res, self._map_res_qual))
+        else:
+            LOGGER.debug('map resource unchanged, skipping')
 
-        LOGGER.debug('encoding map resource')
-        with open(self.map_res_file, mode='w', encoding=ENCODING) as stream:
-            stream.write(SLTP().encode(self._map_res, self._map_res_qual))
+        if force or self.l10n != self._l10n_snapshot:
+            LOGGER.debug('encoding l10n dictionary')
+            tables.append((self.dictionary_file, self.l10n, self._l10n_qual))
+        else:
+            LOGGER.debug('l10n dictionary unchanged, skipping')
+
+        if force or not self.track_changes or self.mission.generation != self._mission_generation:
+            LOGGER.debug('encoding mission dictionary')
+            tables.append((self.mission_file, self.mission.d, self._mission_qual))
+        else:
+            LOGGER.debug('mission dictionary unchanged, skipping')
+
+        return tables
+
+    @timed('miz.encode')
+    def _encode(self, force: bool = False):
+        """
+        Writes the lua tables back to the temp dir
+
+        Tables that have not changed since they were decoded are skipped, so their original bytes are kept.
+
+        Args:
+            force: encode all tables, even the unchanged ones
 
-        LOGGER.debug('encoding l10n dictionary')
-        with open(self.dictionary_file, mode='w', encoding=ENCODING) as stream:
-            stream.write(SLTP().encode(self.l10n, self._l10n_qual))
+        """
+
+        LOGGER.debug('encoding lua tables')
 
-        LOGGER.debug('encoding mission dictionary')
-        with open(self.mission_file, mode='w', encoding=ENCODING) as stream:
-            stream.write(SLTP().encode(self.mission.d, self._mission_qual))
+        tables = self._tables_to_encode(force)
+        current_span().items = len(tables)
+        for file_path, table, qualifier in tables:
+            self._write_table(file_path, table, qualifier)
+
+        self._take_snapshot()
 
         LOGGER.debug('encoding done')
 
@@ -288,6 +514,119 @@ class Miz:
     def _remove_temp_dir(self):
         shutil.rmtree(str(self.temp_dir))
 
+    @staticmethod
+    def peek(path_to_miz_file: typing.Union[str, Path]) -> MizSummary:
+        """
+        Reads a few values out of a MIZ file, without extracting it nor decoding its lua tables
+
+        Only the "mission" member (and the entry of the sortie name in the dictionary) is streamed out of the archive,
+        and only until all the top-level values have been found.
+
+        Args:
+            path_to_miz_file: MIZ file to read
+
+        Returns: MizSummary
+
+        """
+        miz_path = elib.path.ensure_file(path_to_miz_file)
+        LOGGER.debug('peeking into: %s', miz_path)
+        try:
+            with ZipFile(str(miz_path)) as zip_file:
+                values = Miz._peek_member(zip_file, 'mission', _PEEK_MISSION_KEYS)
+                sortie_name = values.get('sortie', '')
+                if sortie_name.startswith('DictKey_'):
+                    sortie_name = Miz._peek_member(zip_file, 'l10n/DEFAULT/dictionary', (sortie_name,)).get(
+                        sortie_name, ''
+                    )
+        except BadZipFile:
+            raise BadZipFile(str(miz_path))
+
+        date = values.get('date', {})
+        return MizSummary(
+            path=miz_path,
+            theatre=values.get('theatre', ''),
+            day=date.get('Day', 0),
+            month=date.get('Month', 0),
+            year=date.get('Year', 0),
+            mission_start_time=values.get('start_time', 0),
+            sortie_name=sortie_name,
+            version=values.get('version', 0),
+        )
+
+    @staticmethod
+    def profile(path_to_miz_file: typing.Union[str, Path], table: str = 'mission', top: int = 10) -> DecodeStats:
+        """
+        Decodes a lua table straight out of a MIZ file, collecting statistics on the way (see SLTP.decode)
+
+        Args:
+            path_to_miz_file: MIZ file to read
+            table: name of the table (see TABLE_MEMBERS)
+            top: amount of largest tables to report
+
+        Returns: DecodeStats
+
+        """
+        if table not in TABLE_MEMBERS:
+            raise ValueError(f'unknown table: {table}')
+        miz_path = elib.path.ensure_file(path_to_miz_file)
+        LOGGER.debug('profiling %s of: %s', table, miz_path)
+        try:
+            with ZipFile(str(miz_path)) as zip_file:
+                with zip_file.open(TABLE_MEMBERS[table]) as stream:
+                    text = io.TextIOWrapper(stream, encoding=ENCODING).read()
+        except BadZipFile:
+            raise BadZipFile(str(miz_path))
+        except KeyError:
+            LOGGER.error('missing file in miz: %s', TABLE_MEMBERS[table])
+            raise FileNotFoundError(TABLE_MEMBERS[table])
+        _, _, stats = SLTP().decode(text, stats=True, top=top)
+        return stats
+
+    @staticmethod
+    def read_mission(path_to_miz_file: typing.Union[str, Path]) -> Mission:
+        """
+        Decodes the mission and its dictionary straight out of a MIZ file, without extracting it
+
+        The returned Mission is meant for reading; use a Miz context to edit and save a mission.
+
+        Args:
+            path_to_miz_file: MIZ file to read
+
+        Returns: Mission
+
+        """
+        miz_path = elib.path.ensure_file(path_to_miz_file)
+        LOGGER.debug('reading mission from: %s', miz_path)
+        try:
+            with ZipFile(str(miz_path)) as zip_file:
+                mission_dict = Miz._read_member_table(zip_file, 'mission')
+                l10n = Miz._read_member_table(zip_file, 'l10n/DEFAULT/dictionary')
+        except BadZipFile:
+            raise BadZipFile(str(miz_path))
+        return Mission(mission_dict, l10n)
+
+    @staticmethod
+    def _read_member_table(zip_file: ZipFile, member: str) -> dict:
+        try:
+            info = zip_file.getinfo(member)
+        except KeyError:
+            LOGGER.error('missing file in miz: %s', member)
+            raise FileNotFoundError(member)
+        with zip_file.open(info) as stream:
+            table, _ = SLTP().decode(io.TextIOWrapper(stream, encoding=ENCODING).read())
+        return table
+
+    @staticmethod
+    def _peek_member(zip_file: ZipFile, member: str, keys: typing.Iterable[str]) -> dict:
+        try:
+            info = zip_file.getinfo(member)
+        except KeyError:
+            LOGGER.error('missing file in miz: %s', member)
+            raise FileNotFoundError(member)
+        with zip_file.open(info) as stream:
+            return peek(io.TextIOWrapper(stream, encoding=ENCODING), keys)
+
+    @timed('miz.unzip')
     def unzip(self, overwrite: bool = False):
         """
         Flattens a MIZ file into the temp dir
@@ -309,6 +648,7 @@ class Miz:
                 LOGGER.debug('reading infolist')
 
                 self.zip_content = [f.filename for f in zip_file.infolist()]
+                current_span().items = len(self.zip_content)
 
                 self._extract_files_from_zip(zip_file)
 
@@ -329,14 +669,31 @@ class Miz:
 
         self._check_extracted_content()
 
+        current_span().size = self.miz_path.stat().st_size
         LOGGER.debug('all files have been found, miz successfully unzipped')
 
-    def zip(self, destination: typing.Union[str, Path] = None, encode: bool = True) -> str:
+    # pylint: disable=too-many-locals
+    @timed('miz.zip')
+    def zip(
+            self,
+            destination: typing.Union[str, Path] = None,
+            encode: bool = True,
+            compression_level: int = None,
+            jobs: int = None,
+    ) -> str:
         """
         Write mission, dictionary etc. to a MIZ file
 
+        Only the lua tables that were modified are re-encoded (see "Change tracking" for the mission table), and members
+        whose content is identical to the source MIZ file are copied over without being re-compressed. The other
+        members are compressed concurrently, then written in order.
+
         Args:
             destination: target MIZ file (if none, defaults to source MIZ + "_EMIZ"
+            encode: encode the modified lua tables before zipping
+            compression_level: zlib compression level, from 0 (no compression) to 9 (best compression); if given,
+                all members are re-compressed at that level
+            jobs: amount of threads used to compress the members (defaults to the amount of CPUs)
 
         Returns: destination file
 
@@ -344,21 +701,89 @@ class Miz:
         if encode:
             self._encode()
 
-        if destination is None:
-            destination_path = self.miz_path.parent.joinpath(f'{self.miz_path.stem}_EMIZ.miz')
-        else:
-            destination_path = elib.path.ensure_file(destination, must_exist=False)
+        destination_path = self._destination(destination)
 
         LOGGER.debug('zipping mission to: %s', destination_path)
 
+        members = self._gather_members()
+        if compression_level is None:
+            # read before writing anything, since the destination may very well be the source MIZ file
+            unchanged_members = self._read_unchanged_members(members)
+            compression_level = zlib.Z_DEFAULT_COMPRESSION
+        else:
+            unchanged_members = {}
+
+        to_compress = [(item_abs_path, arc_name, compression_level)
+                       for arc_name, item_abs_path in members
+                       if arc_name not in unchanged_members]
+        jobs = min(jobs or os.cpu_count() or 1, len(to_compress)) or 1
+        LOGGER.debug('compressing %s members using %s thread(s)', len(to_compress), jobs)
+        if jobs == 1:
+            compressed = [compress_member(*args) for args in to_compress]
+        else:
+            with ThreadPoolExecutor(jobs) as executor:
+                compressed = list(executor.map(lambda args: compress_member(*args), to_compress))
+        compressed_members = {info.filename: (info, raw_data) for info, raw_data in compressed}
+
         destination_path.write_bytes(dummy_miz)
 
         with ZipFile(str(destination_path), mode='w', compression=8) as zip_file:
 
-            for root, _, items in os.walk(self.temp_dir.absolute()):
+            for arc_name, _ in members:
+                if arc_name in unchanged_members:
+                    LOGGER.debug('re-using compressed member: %s', arc_name)
+                    write_raw_member(zip_file, *unchanged_members[arc_name])
+                else:
+                    write_raw_member(zip_file, *compressed_members[arc_name])
+
+        current_span().items = len(members)
+        current_span().size = destination_path.stat().st_size
+        return str(destination_path)
+
+    def _destination(self, destination: typing.Union[str, Path] = None) -> Path:
+        if destination is None:
+            return self.miz_path.parent.joinpath(f'{self.miz_path.stem}_EMIZ.miz')
+        return elib.path.ensure_file(destination, must_exist=False)
+
+    def _gather_members(self) -> typing.List[typing.Tuple[str, Path]]:
+        members: typing.Dict[str, Path] = {}
+        for folder in (self._base_dir, self.temp_dir):
+            if folder is None:
+                continue
+            for root, _, items in os.walk(folder.absolute()):
                 for item in items:
                     item_abs_path = Path(root, item).absolute()
-                    item_rel_path = Path(item_abs_path).relative_to(self.temp_dir)
-                    zip_file.write(item_abs_path, arcname=item_rel_path)
+                    item_rel_path = Path(item_abs_path).relative_to(folder.absolute())
+                    members[item_rel_path.as_posix()] = item_abs_path
+        for resource_name in self._removed_resources:
+            members.pop(f'l10n/DEFAULT/{resource_name}', None)
+        return list(members.items())
 
-        return str(destination_path)
+    def _read_unchanged_members(
+            self,
+            members: typing.List[typing.Tuple[str, Path]]
+    ) -> typing.Dict[str, typing.Tuple[ZipInfo, bytes]]:
+        """
+        Reads the compressed data of the source archive members whose content did not change
+
+        Args:
+            members: members about to be written
+
+        Returns: dictionary of archive name -> (member information, compressed data)
+
+        """
+        unchanged_members: typing.Dict[str, typing.Tuple[ZipInfo, bytes]] = {}
+        try:
+            source = ZipFile(str(self.miz_path))
+        except (OSError, BadZipFile):
+            LOGGER.debug('source MIZ file is not available, all members will be compressed')
+            return unchanged_members
+        with source:
+            for arc_name, item_abs_path in members:
+                try:
+                    info = source.getinfo(arc_name)
+                except KeyError:
+                    continue
+                if is_same_content(info, item_abs_path):
+                    unchanged_members[arc_name] = info, read_raw_member(source, info)
+        return unchanged_members
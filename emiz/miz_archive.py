@@ -0,0 +1,196 @@
+# coding=utf-8
+"""
+Low level access to MIZ archive members
+
+Allows copying members from one archive to another without decompressing and re-compressing them, and compressing
+members outside of the ZipFile object (zlib releases the GIL, so members can be compressed concurrently)
+
+Appending compressed data to a ZipFile relies on private attributes of zipfile.ZipFile; when they are not available
+(see "can_write_raw"), members are decompressed and written with ZipFile.writestr instead.
+"""
+import copy
+import hashlib
+import os
+import struct
+import typing
+import zlib
+from pathlib import Path
+from zipfile import (
+    ZIP_DEFLATED, ZIP_STORED, BadZipFile, ZipFile, ZipInfo, sizeFileHeader, stringFileHeader, structFileHeader,
+)
+
+# indexes in the local file header (see zipfile.structFileHeader)
+_FH_SIGNATURE = 0
+_FH_FILENAME_LENGTH = 10
+_FH_EXTRA_FIELD_LENGTH = 11
+
+_FLAG_ENCRYPTED = 0x01
+_FLAG_DATA_DESCRIPTOR = 0x08
+
+_CHUNK_SIZE = 1024 * 1024
+
+# compression types that can be decompressed without zipfile, should a member need to be written with writestr
+_RAW_COMPRESS_TYPES = (ZIP_STORED, ZIP_DEFLATED)
+# private attributes of ZipFile used by write_raw_member
+_RAW_WRITE_ATTRIBUTES = ('_lock', '_seekable', '_writecheck', '_didModify', 'start_dir')
+
+
+def file_crc32(file_path: typing.Union[str, Path]) -> int:
+    """
+    Computes the CRC32 of a file the same way the ZIP format does
+
+    Args:
+        file_path: file to read
+
+    Returns: CRC32 as an unsigned integer
+
+    """
+    crc = 0
+    with open(str(file_path), 'rb') as stream:
+        for chunk in iter(lambda: stream.read(_CHUNK_SIZE), b''):
+            crc = zlib.crc32(chunk, crc)
+    return crc & 0xffffffff
+
+
+def file_sha256(file_path: typing.Union[str, Path]) -> str:
+    """
+    Computes the SHA-256 of a file
+
+    Args:
+        file_path: file to read
+
+    Returns: hexadecimal digest
+
+    """
+    sha = hashlib.sha256()
+    with open(str(file_path), 'rb') as stream:
+        for chunk in iter(lambda: stream.read(_CHUNK_SIZE), b''):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
+def is_same_content(info: ZipInfo, file_path: typing.Union[str, Path]) -> bool:
+    """
+    Checks whether a file on disk still holds the content of an archive member
+
+    Args:
+        info: archive member
+        file_path: file on disk
+
+    Returns: True if the member can be copied as-is instead of the file
+
+    """
+    if info.flag_bits & _FLAG_ENCRYPTED or info.compress_type not in _RAW_COMPRESS_TYPES:
+        return False
+    if os.path.getsize(str(file_path)) != info.file_size:
+        return False
+    return file_crc32(file_path) == info.CRC
+
+
+def compress_member(
+        file_path: typing.Union[str, Path],
+        arc_name: str,
+        compression_level: int = zlib.Z_DEFAULT_COMPRESSION,
+) -> typing.Tuple[ZipInfo, bytes]:
+    """
+    Deflates a file into memory, ready to be appended to an archive with write_raw_member
+
+    Args:
+        file_path: file to compress
+        arc_name: name of the member in the archive
+        compression_level: zlib compression level (0-9, -1 for the zlib default)
+
+    Returns: tuple of member information, compressed data
+
+    """
+    info = ZipInfo.from_file(str(file_path), arc_name)
+    info.compress_type = ZIP_DEFLATED
+    compressor = zlib.compressobj(compression_level, zlib.DEFLATED, -zlib.MAX_WBITS)
+    crc = 0
+    file_size = 0
+    chunks = []
+    with open(str(file_path), 'rb') as stream:
+        for chunk in iter(lambda: stream.read(_CHUNK_SIZE), b''):
+            crc = zlib.crc32(chunk, crc)
+            file_size += len(chunk)
+            chunks.append(compressor.compress(chunk))
+    chunks.append(compressor.flush())
+    raw_data = b''.join(chunks)
+    info.CRC = crc & 0xffffffff
+    info.file_size = file_size
+    info.compress_size = len(raw_data)
+    return info, raw_data
+
+
+def read_raw_member(zip_file: ZipFile, info: ZipInfo) -> bytes:
+    """
+    Reads the compressed data of an archive member
+
+    Args:
+        zip_file: archive opened for reading
+        info: member to read
+
+    Returns: compressed bytes, exactly as stored in the archive
+
+    """
+    stream = zip_file.fp
+    stream.seek(info.header_offset)
+    header = struct.unpack(structFileHeader, stream.read(sizeFileHeader))
+    if header[_FH_SIGNATURE] != stringFileHeader:
+        raise BadZipFile(f'bad magic number for file header: {info.filename}')
+    stream.seek(header[_FH_FILENAME_LENGTH] + header[_FH_EXTRA_FIELD_LENGTH], os.SEEK_CUR)
+    return stream.read(info.compress_size)
+
+
+def can_write_raw(zip_file: ZipFile) -> bool:
+    """
+    Checks whether compressed data can be appended to an archive as-is
+
+    Args:
+        zip_file: archive opened for writing
+
+    Returns: True if the private attributes of ZipFile used by write_raw_member are there
+
+    """
+    return all(hasattr(zip_file, name) for name in _RAW_WRITE_ATTRIBUTES)
+
+
+def _decompress(info: ZipInfo, raw_data: bytes) -> bytes:
+    if info.compress_type == ZIP_STORED:
+        return raw_data
+    if info.compress_type == ZIP_DEFLATED:
+        return zlib.decompress(raw_data, -zlib.MAX_WBITS)
+    raise NotImplementedError(f'unsupported compression type: {info.compress_type}')
+
+
+# pylint: disable=protected-access
+def write_raw_member(zip_file: ZipFile, info: ZipInfo, raw_data: bytes):
+    """
+    Appends already compressed data to an archive
+
+    This mirrors what ZipFile.write does, minus the compression step. If "can_write_raw" is False for this version
+    of zipfile, the data is decompressed and written (compressed again) with ZipFile.writestr instead.
+
+    Args:
+        zip_file: archive opened for writing
+        info: member information (CRC, sizes and compression type must match "raw_data")
+        raw_data: compressed bytes
+
+    """
+    info = copy.copy(info)
+    if not can_write_raw(zip_file):
+        zip_file.writestr(info, _decompress(info, raw_data))
+        return
+    # CRC and sizes are known beforehand, so they go in the local header instead of a data descriptor
+    info.flag_bits &= ~_FLAG_DATA_DESCRIPTOR
+    with zip_file._lock:
+        if zip_file._seekable:
+            zip_file.fp.seek(zip_file.start_dir)
+        info.header_offset = zip_file.fp.tell()
+        zip_file._writecheck(info)
+        zip_file._didModify = True
+        zip_file.fp.write(info.FileHeader())
+        zip_file.fp.write(raw_data)
+        zip_file.filelist.append(info)
+        zip_file.NameToInfo[info.filename] = info
+        zip_file.start_dir = zip_file.fp.tell()
@@ -0,0 +1,294 @@
+# coding=utf-8
+"""
+Single-file alternative to the JSON decomposition of a MIZ file (see emiz.new_miz)
+
+A pack holds the mission table and all the other members of a MIZ file in one msgpack-based file:
+
+    b'EMIZPACK' | format version (1 byte) | offset of the table of contents (8 bytes, little endian) | blocks | TOC
+
+The mission table is split into blocks: every table whose packed size reaches "block_size" is written in a block of
+its own, and replaced in its parent by a placeholder (msgpack extension type 1). The table of contents lists the
+path (sequence of keys) of every block, so that any subtree can be read without unpacking the rest of the mission:
+
+    with MizPack('mission.emizpack') as pack:
+        blue = pack.read('coalition', 'blue')
+
+Keys keep their type (lua array indexes stay integers) and their order, so no equivalent of "__order__.json" or of
+NewMiz._sorted is needed: unpacking gives back the exact mission table.
+
+Requires the optional "msgpack" dependency (pip install emiz[msgpack]).
+"""
+import struct
+import typing
+from pathlib import Path
+
+import elib
+
+from emiz.dummy_miz import dummy_miz
+from emiz.miz import ENCODING, Miz, encode_table
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover
+    msgpack = None
+
+LOGGER = elib.custom_logging.get_logger('EMIZ')
+
+MAGIC = b'EMIZPACK'
+FORMAT_VERSION = 1
+SUFFIX = '.emizpack'
+# tables packing to at least that many bytes get a block of their own
+BLOCK_SIZE = 16 * 1024
+
+_HEADER = struct.Struct('<BQ')
+_PLACEHOLDER_CODE = 1
+
+
+class _Placeholder:
+    """
+    Stands for a table stored in a block of its own
+    """
+
+    __slots__ = ()
+
+
+_PLACEHOLDER = _Placeholder()
+
+
+def _check_msgpack():
+    if msgpack is None:
+        raise ImportError('the pack format requires msgpack; install it with: pip install emiz[msgpack]')
+
+
+def _map_header(size: int) -> bytes:
+    if size < 16:
+        return bytes((0x80 | size,))
+    if size < 0x10000:
+        return b'\xde' + struct.pack('>H', size)
+    return b'\xdf' + struct.pack('>I', size)
+
+
+class _PackWriter:
+    """
+    Writes the blocks of a pack to a stream, and keeps track of their position
+    """
+
+    def __init__(self, stream: typing.BinaryIO, block_size: int) -> None:
+        self.stream = stream
+        self.block_size = block_size
+        self.tables: typing.List[list] = []
+        self.assets: typing.List[list] = []
+        self._packer = msgpack.Packer(use_bin_type=True)
+        self._placeholder = self._packer.pack(msgpack.ExtType(_PLACEHOLDER_CODE, b''))
+
+    def _write_block(self, data: bytes) -> typing.Tuple[int, int]:
+        offset = self.stream.tell()
+        self.stream.write(data)
+        return offset, len(data)
+
+    def pack_table(self, table: dict, path: list) -> bytes:
+        """
+        Packs a table, writing the tables it holds (and itself) in blocks of their own if they are large enough
+
+        The map header is written by hand, so that packed sub-tables can be joined as they are instead of being
+        packed again at every level.
+
+        Args:
+            table: table to pack
+            path: keys leading to the table (empty for the mission itself, which always gets a block)
+
+        Returns: packed table, or placeholder if the table was written in a block
+        """
+        parts = [_map_header(len(table))]
+        for key, value in table.items():
+            parts.append(self._packer.pack(key))
+            if isinstance(value, dict):
+                parts.append(self.pack_table(value, path + [key]))
+            else:
+                parts.append(self._packer.pack(value))
+        data = b''.join(parts)
+        if len(data) < self.block_size and path:
+            return data
+        self.tables.append([path, *self._write_block(data)])
+        return self._placeholder
+
+    def add_asset(self, name: str, content: bytes):
+        """
+        Args:
+            name: name of the MIZ member
+            content: content of the member
+        """
+        self.assets.append([name, *self._write_block(content)])
+
+
+def decompose_to_pack(
+        miz_file: typing.Union[str, Path],
+        pack_file: typing.Union[str, Path],
+        block_size: int = BLOCK_SIZE,
+) -> Path:
+    """
+    Writes a MIZ file as a pack
+
+    Args:
+        miz_file: MIZ file to decompose
+        pack_file: pack to write (overwritten if it exists)
+        block_size: tables packing to at least that many bytes get a block of their own
+
+    Returns: pack file
+    """
+    _check_msgpack()
+    pack_path = Path(pack_file).absolute()
+    temp_path = pack_path.with_name(f'{pack_path.name}.tmp')
+    with Miz(miz_file) as miz:
+        with temp_path.open('wb') as stream:
+            stream.write(MAGIC + _HEADER.pack(FORMAT_VERSION, 0))
+            writer = _PackWriter(stream, block_size)
+            writer.pack_table(miz.mission.d, [])
+            for member in sorted(miz.temp_dir.rglob('*')):
+                name = member.relative_to(miz.temp_dir).as_posix()
+                if member.is_file() and name != 'mission':
+                    writer.add_asset(name, member.read_bytes())
+            toc_offset = stream.tell()
+            stream.write(msgpack.packb({
+                'version': miz.mission.d['version'],
+                'qualifier': miz._mission_qual,  # pylint: disable=protected-access
+                'tables': writer.tables,
+                'assets': writer.assets,
+            }, use_bin_type=True))
+            stream.seek(len(MAGIC))
+            stream.write(_HEADER.pack(FORMAT_VERSION, toc_offset))
+    temp_path.replace(pack_path)
+    LOGGER.debug('packed %s table(s) and %s asset(s) into: %s', len(writer.tables), len(writer.assets), pack_path)
+    return pack_path
+
+
+class MizPack:
+    """
+    Reads a pack written by "decompose_to_pack"
+    """
+
+    def __init__(self, pack_file: typing.Union[str, Path]) -> None:
+        _check_msgpack()
+        self.path = elib.path.ensure_file(pack_file)
+        self._stream = self.path.open('rb')
+        try:
+            self._read_toc()
+        except Exception:
+            self._stream.close()
+            raise
+
+    def _read_toc(self):
+        magic = self._stream.read(len(MAGIC))
+        if magic != MAGIC:
+            raise ValueError(f'not a MIZ pack: {self.path}')
+        format_version, toc_offset = _HEADER.unpack(self._stream.read(_HEADER.size))
+        if format_version != FORMAT_VERSION:
+            raise ValueError(f'unsupported MIZ pack format: {format_version} (expected {FORMAT_VERSION})')
+        self._stream.seek(toc_offset)
+        toc = msgpack.unpackb(self._stream.read(), raw=False, strict_map_key=False)
+        self.version = toc['version']
+        self.qualifier: str = toc['qualifier']
+        self._tables = {tuple(path): (offset, length) for path, offset, length in toc['tables']}
+        self._assets = {name: (offset, length) for name, offset, length in toc['assets']}
+        # paths of the tables holding (at any depth) a table stored in a block of its own
+        self._block_parents = {path[:index] for path in self._tables for index in range(len(path))}
+
+    def __enter__(self) -> 'MizPack':
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def close(self):
+        """
+        Closes the pack file
+        """
+        self._stream.close()
+
+    def _read_bytes(self, offset: int, length: int) -> bytes:
+        self._stream.seek(offset)
+        return self._stream.read(length)
+
+    @staticmethod
+    def _ext_hook(code: int, data: bytes):
+        if code == _PLACEHOLDER_CODE:
+            return _PLACEHOLDER
+        return msgpack.ExtType(code, data)
+
+    def _load(self, path: tuple) -> dict:
+        table = msgpack.unpackb(
+            self._read_bytes(*self._tables[path]), raw=False, strict_map_key=False, ext_hook=self._ext_hook
+        )
+        self._resolve(table, path)
+        return table
+
+    def _resolve(self, table: dict, path: tuple):
+        for key, value in table.items():
+            if value is _PLACEHOLDER:
+                table[key] = self._load(path + (key,))
+            elif isinstance(value, dict) and path + (key,) in self._block_parents:
+                self._resolve(value, path + (key,))
+
+    @property
+    def blocks(self) -> typing.List[tuple]:
+        """
+        Returns: paths of the tables stored in blocks of their own
+        """
+        return list(self._tables)
+
+    def read(self, *path) -> typing.Any:
+        """
+        Reads a subtree of the mission, only unpacking the blocks it needs
+
+        Args:
+            *path: keys leading to the subtree (none for the whole mission)
+
+        Returns: subtree
+        """
+        for index in range(len(path), -1, -1):
+            if path[:index] in self._tables:
+                value = self._load(path[:index])
+                for key in path[index:]:
+                    value = value[key]
+                return value
+        raise KeyError(path)  # pragma: no cover (the mission itself is always a block)
+
+    @property
+    def assets(self) -> typing.List[str]:
+        """
+        Returns: names of the members of the MIZ file, besides the mission
+        """
+        return list(self._assets)
+
+    def asset(self, name: str) -> bytes:
+        """
+        Args:
+            name: name of the MIZ member
+
+        Returns: content of the member
+        """
+        return self._read_bytes(*self._assets[name])
+
+
+def recompose_from_pack(pack_file: typing.Union[str, Path], target_file: typing.Union[str, Path]) -> Path:
+    """
+    Writes a MIZ file out of a pack
+
+    Args:
+        pack_file: pack written by "decompose_to_pack"
+        target_file: target MIZ file (created if it does not exist)
+
+    Returns: target file
+    """
+    target_path = Path(target_file)
+    if not target_path.exists():
+        target_path.write_bytes(dummy_miz)
+    with MizPack(pack_file) as pack, Miz(target_path) as miz:
+        for name in pack.assets:
+            member = Path(miz.temp_dir, name)
+            member.parent.mkdir(parents=True, exist_ok=True)
+            member.write_bytes(pack.asset(name))
+        text = encode_table(pack.read(), pack.qualifier)
+        miz.mission_file.write_text(text, encoding=ENCODING)
+        miz.zip(target_path, encode=False)
+    return target_path
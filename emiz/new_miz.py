@@ -2,16 +2,26 @@
 """
 Add JSON composition to Miz object
 """
+import filecmp
+import functools
+import hashlib
+import os
+import pickle
 import shutil
+import threading
+import time as time_
 import typing
 import ujson
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
 from pathlib import Path
 
 import elib
 import pathvalidate
 from natsort import natsorted
 
-from emiz.miz import ENCODING, Miz
+from emiz.dummy_miz import dummy_miz
+from emiz.miz import ENCODING, Miz, encode_table
 from emiz.sltp import SLTP
 
 NAME_FIELDS = ['callsignStr', 'name']
@@ -19,6 +29,12 @@ NAME_FIELDS = ['callsignStr', 'name']
 LOGGER = elib.custom_logging.get_logger('EMIZ')
 
 
+@functools.lru_cache(maxsize=4096)
+def _sanitize_filename(name: str) -> str:
+    # the same keys ("units", "route", "points", ...) come up thousands of times in a mission
+    return pathvalidate.sanitize_filename(name)
+
+
 def wrong_version(obj_name, obj_version, expected_version):
     """
     Triggers when version differs
@@ -31,6 +47,382 @@ def wrong_version(obj_name, obj_version, expected_version):
     print(f'WARNING: {obj_name} version is {obj_version}; expected version: {expected_version}')
 
 
+def _prune(root: Path, files: typing.Set[Path], folders: typing.Set[Path]) -> int:
+    """
+    Removes everything under root that is neither one of the files nor one of the folders (nor a parent of them)
+
+    Returns: amount of files and folders removed
+    """
+    removed = 0
+    for path in list(root.iterdir()):
+        if path.is_dir() and path in folders:
+            removed += _prune(path, files, folders)
+        elif path.is_file() and path in files:
+            continue
+        else:
+            LOGGER.debug('removing stale: %s', path)
+            if path.is_dir():
+                shutil.rmtree(str(path))
+            else:
+                path.unlink()
+            removed += 1
+    return removed
+
+
+def _with_parents(paths: typing.Iterable[Path], root: Path) -> typing.Set[Path]:
+    output = set()
+    for path in paths:
+        while path != root and path not in output:
+            output.add(path)
+            path = path.parent
+    return output
+
+
+def _write_if_changed(file: Path, content: bytes) -> bool:
+    """
+    Writes a file unless it already holds that exact content (compared by size first, then byte for byte)
+
+    Returns: True if the file was written
+    """
+    try:
+        if file.stat().st_size == len(content) and file.read_bytes() == content:
+            return False
+    except FileNotFoundError:
+        pass
+    file.write_bytes(content)
+    return True
+
+
+def _latest_change(*signatures: typing.Dict[str, str]) -> float:
+    """
+    Returns: most recent modification time among the files of the signatures (see _RecomposeCache.scan), in seconds
+    since the epoch
+    """
+    # folders are signed with a hash; files with "<mtime in ns>:<size>"
+    return max(
+        (int(signature.split(':', 1)[0]) for folder in signatures for signature in folder.values() if ':' in signature),
+        default=0,
+    ) / 1e9
+
+
+def _unzip_target(target_file: Path) -> typing.Tuple[Miz, str]:
+    """
+    Extracts the target of a recomposition (created if it does not exist), without decoding its tables
+
+    Returns: extracted Miz, and the qualifier of its mission table (its first line)
+    """
+    if not target_file.exists():
+        target_file.write_bytes(dummy_miz)
+    miz = Miz(target_file)
+    miz.unzip()
+    with miz.mission_file.open(encoding=ENCODING) as stream:
+        return miz, stream.readline().rstrip('\n')
+
+
+class _DecompositionPlan:
+    """
+    File tree of a decomposed mission, built in memory before anything is written
+
+    Files are listed in the order of the walk over the mission (depth first), so that consecutive files belong to
+    the same subtree; they are written in batches of consecutive files, each batch being serialized and written by
+    a worker thread. Independent subtrees (each coalition, the triggers, the weather, ...) end up in different
+    batches and are processed concurrently.
+
+    In incremental mode, files that already hold the right content are left alone, and files and folders that are
+    not part of the plan are removed.
+    """
+
+    batch_size = 64
+
+    def __init__(self, root: Path) -> None:
+        self.root = root
+        self.folders: typing.List[Path] = []
+        self.files: typing.List[typing.Tuple[Path, dict]] = []
+
+    def add_folder(self, folder: Path):
+        """
+        Args:
+            folder: folder to create
+        """
+        self.folders.append(folder)
+
+    def add_file(self, file: Path, output: dict):
+        """
+        Args:
+            file: JSON file to write
+            output: content of the file
+        """
+        self.files.append((file, output))
+
+    @staticmethod
+    def _write_batch(batch: typing.List[typing.Tuple[Path, dict]], incremental: bool) -> int:
+        written = 0
+        for file, output in batch:
+            content = NewMiz._serialize(output)
+            if incremental:
+                written += _write_if_changed(file, content)
+            else:
+                file.write_bytes(content)
+                written += 1
+        return written
+
+    def write(self, jobs: int = None, incremental: bool = False) -> int:
+        """
+        Creates the folders, then writes the files
+
+        Args:
+            jobs: amount of worker threads (1 writes everything from the calling thread)
+            incremental: only write the files whose content changed, and remove stale files and folders
+
+        Returns: amount of files written
+        """
+        if incremental and self.root.exists():
+            files = {file for file, _ in self.files}
+            removed = _prune(self.root, files, _with_parents(self.folders, self.root) | _with_parents(
+                (file.parent for file in files), self.root
+            ))
+            LOGGER.debug('removed %s stale file(s) and folder(s)', removed)
+        for folder in self.folders:
+            folder.mkdir(parents=True, exist_ok=True)
+        batches = [self.files[index:index + self.batch_size] for index in range(0, len(self.files), self.batch_size)]
+        LOGGER.debug('writing %s file(s) in %s batch(es)', len(self.files), len(batches))
+        if jobs == 1:
+            written = sum(self._write_batch(batch, incremental) for batch in batches)
+        else:
+            with ThreadPoolExecutor(jobs) as executor:
+                # consuming the results re-raises the first error, if any
+                written = sum(executor.map(self._write_batch, batches, [incremental] * len(batches)))
+        LOGGER.debug('wrote %s file(s) out of %s', written, len(self.files))
+        return written
+
+
+class _RecomposeCache:
+    """
+    Tables parsed out of the JSON files of a decomposed mission, kept from one recomposition to the next
+
+    Entries are keyed by the path of the file or folder (relative to the mission folder) and are valid as long as
+    its signature is unchanged: modification time and size for a file, signatures of all its content for a folder.
+    Unchanged subtrees are therefore reused as a whole, and only the files that were edited are parsed again.
+
+    The cache is a pickle file. It is kept in the cache folder of the user (see "cache_file_for"), never in the
+    decomposed folder, which is meant to be shared and committed: a pickle file can run code when it is loaded, so it
+    must only ever be read by the user who wrote it.
+    """
+
+    # bumped whenever the layout of the cache changes
+    format_version = 1
+
+    def __init__(
+            self,
+            mission_folder: Path,
+            cache_file: Path,
+            version,
+            signatures: typing.Dict[str, str] = None,
+    ) -> None:
+        self.mission_folder = mission_folder
+        self.cache_file = cache_file
+        self.version = version
+        self.hits = 0
+        self.misses = 0
+        self._signatures = self.scan(mission_folder) if signatures is None else signatures
+        self._entries: typing.Dict[str, typing.Tuple[str, dict]] = self._load()
+
+    @staticmethod
+    def cache_file_for(src: Path) -> Path:
+        """
+        Args:
+            src: decomposed folder
+
+        Returns: cache file of the folder, in the cache folder of the user ($XDG_CACHE_HOME or ~/.cache on Linux and
+            macOS, %LOCALAPPDATA% on Windows)
+        """
+        if os.name == 'nt':
+            base = os.environ.get('LOCALAPPDATA') or str(Path.home().joinpath('AppData', 'Local'))
+        else:
+            base = os.environ.get('XDG_CACHE_HOME') or str(Path.home().joinpath('.cache'))
+        digest = hashlib.sha1(os.path.realpath(str(src)).encode(ENCODING)).hexdigest()
+        return Path(base, 'emiz', 'recompose', f'{digest}.pickle')
+
+    @staticmethod
+    def scan(folder: Path) -> typing.Dict[str, str]:
+        """
+        Args:
+            folder: folder to scan
+
+        Returns: signature of every file and folder, keyed by path relative to the folder ("." for the folder)
+        """
+        signatures: typing.Dict[str, str] = {}
+
+        def _scan_folder(path: str, key: str) -> str:
+            prefix = '' if key == '.' else key + os.sep
+            content = []
+            with os.scandir(path) as entries:
+                for entry in entries:
+                    if entry.is_dir():
+                        signature = _scan_folder(entry.path, prefix + entry.name)
+                    else:
+                        stat = entry.stat()
+                        signature = f'{stat.st_mtime_ns}:{stat.st_size}'
+                        signatures[prefix + entry.name] = signature
+                    content.append((entry.name, signature))
+            signatures[key] = hashlib.sha1(repr(sorted(content)).encode()).hexdigest()
+            return signatures[key]
+
+        if folder.is_dir():
+            _scan_folder(str(folder), '.')
+        return signatures
+
+    def rescan(self, signatures: typing.Dict[str, str] = None):
+        """
+        Takes the changes made to the mission folder since the cache was created into account
+
+        Args:
+            signatures: result of "scan" for the mission folder, if already available
+        """
+        self._signatures = self.scan(self.mission_folder) if signatures is None else signatures
+        self._entries = {key: entry for key, entry in self._entries.items() if key in self._signatures}
+        self.hits = self.misses = 0
+
+    @staticmethod
+    def _key(path: str, root: str) -> str:
+        # paths are all below the (absolute) mission folder; much cheaper than os.path.relpath
+        return path[len(root) + 1:] or '.'
+
+    def _load(self) -> typing.Dict[str, typing.Tuple[str, dict]]:
+        if not self.cache_file.exists():
+            return {}
+        try:
+            with self.cache_file.open('rb') as stream:
+                data = pickle.load(stream)
+            if data['format'] == self.format_version and data['version'] == self.version \
+                    and data['folder'] == str(self.mission_folder):
+                return data['entries']
+            LOGGER.debug('discarding outdated recompose cache: %s', self.cache_file)
+        except Exception:  # pylint: disable=broad-except
+            LOGGER.exception('discarding unreadable recompose cache: %s', self.cache_file)
+        return {}
+
+    def get(self, path: Path, build: typing.Callable[[], dict]) -> dict:
+        """
+        Args:
+            path: JSON file or folder
+            build: parses the file or folder, if the cache holds no valid entry for it
+
+        Returns: table
+        """
+        key = self._key(str(path), str(self.mission_folder))
+        signature = self._signatures.get(key)
+        entry = self._entries.get(key)
+        if signature is not None and entry is not None and entry[0] == signature:
+            self.hits += 1
+            return entry[1]
+        self.misses += 1
+        value = build()
+        if signature is not None:
+            self._entries[key] = (signature, value)
+        return value
+
+    def save(self):
+        """
+        Writes the entries of the files and folders that still exist
+        """
+        entries = {key: entry for key, entry in self._entries.items() if key in self._signatures}
+        data = {'format': self.format_version, 'version': self.version, 'folder': str(self.mission_folder),
+                'entries': entries}
+        # the cache folder is private to the user
+        self.cache_file.parent.mkdir(mode=0o700, parents=True, exist_ok=True)
+        temp_file = self.cache_file.with_name(f'{self.cache_file.name}.tmp')
+        with temp_file.open('wb') as stream:
+            pickle.dump(data, stream, protocol=pickle.HIGHEST_PROTOCOL)
+        temp_file.replace(self.cache_file)
+
+
+@dataclass
+class Recomposition:
+    """
+    Outcome of a recomposition made by NewMiz.watch
+    """
+    target: str
+    seconds: float
+    # JSON files and folders parsed, and reused from the previous recomposition
+    parsed: int = 0
+    reused: int = 0
+    mission_changed: bool = False
+    assets_changed: bool = False
+
+
+class _LiveRecomposition:
+    """
+    State kept by NewMiz.watch from one recomposition to the next: the parsed JSON files, the encoded lua text of
+    unchanged tables and the extracted target MIZ file, whose unchanged members are re-used when zipping
+    """
+
+    def __init__(self, src: Path, target_file: Path) -> None:
+        self.src = src
+        self.mission_folder, self.assets_folder = NewMiz._get_subfolders(src)
+        self.target_file = Path(target_file).absolute()
+        self._cache: typing.Optional[_RecomposeCache] = None
+        self._memo: dict = {}
+        self._miz: typing.Optional[Miz] = None
+        self._qualifier = ''
+        self._built: typing.Tuple[typing.Optional[str], typing.Optional[str]] = (None, None)
+
+    def scan(self) -> typing.Tuple[typing.Dict[str, str], typing.Dict[str, str]]:
+        """
+        Returns: signatures of the mission folder and of the assets folder
+        """
+        return _RecomposeCache.scan(self.mission_folder), _RecomposeCache.scan(self.assets_folder)
+
+    def _open_target(self):
+        self._miz, self._qualifier = _unzip_target(self.target_file)
+
+    def build(self, mission_signatures: typing.Dict[str, str], assets_signatures: typing.Dict[str, str]):
+        """
+        Recomposes the target MIZ file, re-doing only what changed since the last recomposition
+
+        Returns: Recomposition
+        """
+        start = time_.perf_counter()
+        if self._miz is None:
+            self._open_target()
+        result = Recomposition(str(self.target_file), 0.0)
+        mission_signature, assets_signature = mission_signatures.get('.'), assets_signatures.get('.')
+
+        if assets_signature != self._built[1]:
+            result.assets_changed = True
+            NewMiz._sync_assets(self.assets_folder, self._miz.temp_dir)
+
+        if mission_signature != self._built[0] or result.assets_changed:
+            result.mission_changed = mission_signature != self._built[0]
+            # pylint: disable=c-extension-no-member
+            base_info = ujson.loads(Path(self.mission_folder, 'base_info.json').read_text(encoding=ENCODING))
+            version = base_info['__version__']
+            if self._cache is None or self._cache.version != version:
+                cache_file = _RecomposeCache.cache_file_for(self.src)
+                self._cache = _RecomposeCache(self.mission_folder, cache_file, version, mission_signatures)
+            else:
+                self._cache.rescan(mission_signatures)
+            mission_dict = NewMiz._recreate_dict_from_folder(self.mission_folder, version, self._cache)
+            result.parsed, result.reused = self._cache.misses, self._cache.hits
+            text = SLTP().encode(mission_dict, self._qualifier, memo=self._memo)
+            # pylint: disable=protected-access
+            self._miz._write_text(self._miz.mission_file, text)
+
+        self._miz.zip(self.target_file, encode=False)
+        self._built = mission_signature, assets_signature
+        result.seconds = time_.perf_counter() - start
+        return result
+
+    def close(self):
+        """
+        Saves the parse cache and removes the extracted MIZ file
+        """
+        if self._cache is not None:
+            self._cache.save()
+        if self._miz is not None:
+            self._miz._remove_temp_dir()  # pylint: disable=protected-access
+
+
 class NewMiz(Miz):
     """
     Add JSON composition to Miz object
@@ -77,12 +469,18 @@ class NewMiz(Miz):
         return dict_key
 
     @staticmethod
-    def _write_output_to_file(file: Path, output: dict):
+    def _serialize(output: dict) -> bytes:
         # pylint: disable=c-extension-no-member
-        file.write_text(ujson.dumps(output, indent=2, ensure_ascii=False), encoding=ENCODING)
+        text = ujson.dumps(output, indent=2, ensure_ascii=False)
+        # same bytes as Path.write_text would write on this platform
+        return text.replace('\n', os.linesep).encode(ENCODING)
 
     @staticmethod
-    def _decompose_list_dict(dict_: dict, output_folder: Path, version, miz: Miz):
+    def _write_output_to_file(file: Path, output: dict):
+        file.write_bytes(NewMiz._serialize(output))
+
+    @staticmethod
+    def _decompose_list_dict(dict_: dict, output_folder: Path, version, miz: Miz, plan: _DecompositionPlan):
         count = 1
         order: typing.Dict[str, int] = {}
         for key in dict_:
@@ -98,21 +496,22 @@ class NewMiz(Miz):
             name = NewMiz._translate(name, miz)
             if not name:
                 name = str(NewMiz._translate(key, miz))
-            name = pathvalidate.sanitize_filename(name)
+            name = _sanitize_filename(name)
             sub_count = 1
             while name in order:
                 name = f'{name} #{sub_count:03d}'
             order[name] = count
             count += 1
             subfolder = Path(output_folder, name)
-            NewMiz._decompose_dict(sub_dict, f'__{NewMiz._translate(name, miz)}', subfolder, version, miz)
+            NewMiz._decompose_dict(sub_dict, f'__{NewMiz._translate(name, miz)}', subfolder, version, miz, plan)
         order = {k: order[k] for k in natsorted(order.keys())}
-        NewMiz._write_output_to_file(Path(output_folder, '__order__.json'), order)
+        plan.add_file(Path(output_folder, '__order__.json'), order)
 
     @staticmethod
-    def _decompose_dict(dict_: dict, key_name: str, output_folder: Path, version, miz: Miz):
+    def _decompose_dict(  # pylint: disable=too-many-arguments
+            dict_: dict, key_name: str, output_folder: Path, version, miz: Miz, plan: _DecompositionPlan
+    ):
         output = {}
-        output_folder.mkdir(exist_ok=True)
         try:
             first_key = next(iter(dict_))
             first_value = dict_[first_key]
@@ -121,7 +520,8 @@ class NewMiz(Miz):
             first_value = None
         if first_key and dict_ and isinstance(first_key, int) and isinstance(first_value, dict):
             if [name_field for name_field in NAME_FIELDS if name_field in first_value]:
-                NewMiz._decompose_list_dict(dict_, output_folder, version, miz)
+                plan.add_folder(output_folder)
+                NewMiz._decompose_list_dict(dict_, output_folder, version, miz, plan)
                 return
 
         is_single = True
@@ -129,41 +529,59 @@ class NewMiz(Miz):
             value = dict_[key]
             if not key == 'properties' and isinstance(value, dict) and value:
                 is_single = False
-                subfolder_name = pathvalidate.sanitize_filename(str(NewMiz._translate(key, miz)))
+                subfolder_name = _sanitize_filename(str(NewMiz._translate(key, miz)))
                 subfolder = Path(output_folder, subfolder_name)
-                NewMiz._decompose_dict(value, f'__{key}', subfolder, version, miz)
+                NewMiz._decompose_dict(value, f'__{key}', subfolder, version, miz, plan)
             else:
                 # output[key] = NewMiz._translate(dict_[key], miz)
                 output[key] = dict_[key]
+        if not output or not is_single:
+            plan.add_folder(output_folder)
         if output:
             output['__version__'] = version
-            key_name = pathvalidate.sanitize_filename(str(key_name))
+            key_name = _sanitize_filename(str(key_name))
             if not is_single:
                 file = Path(output_folder, f'{key_name}.json')
             else:
-                output_folder.rmdir()
                 file = Path(f'{output_folder}.json')
-            NewMiz._write_output_to_file(file, output)
+            plan.add_file(file, output)
 
     @staticmethod
     def _sorted(dict_: dict) -> dict:
-        for k in dict_:
+        output = {}
+        for key, value in dict_.items():
             try:
-                int_key = int(k)
+                key = int(key)
             except ValueError:
                 pass
-            else:
-                value = dict_[k]
-                del dict_[k]
-                dict_[int_key] = value
-        return {k: dict_[k] for k in natsorted(dict_.keys())}
+            output[key] = value
+        return {k: output[k] for k in natsorted(output.keys())}
+
+    @staticmethod
+    def _sorted_tree(dict_: dict) -> dict:
+        # JSON keys are always strings: nested tables need their integer keys back as well
+        return NewMiz._sorted({
+            key: NewMiz._sorted_tree(value) if isinstance(value, dict) else value for key, value in dict_.items()
+        })
+
+    @staticmethod
+    def _load_folder(folder: Path, version, cache: typing.Optional[_RecomposeCache]) -> dict:
+        if cache is None:
+            return NewMiz._recreate_dict_from_folder(folder, version)
+        return cache.get(folder, functools.partial(NewMiz._recreate_dict_from_folder, folder, version, cache))
 
     @staticmethod
-    def _recreate_dict_from_folder(folder: Path, version) -> dict:
+    def _load_file(file: Path, version, cache: typing.Optional[_RecomposeCache]) -> dict:
+        if cache is None:
+            return NewMiz._recreate_dict_from_file(file, version)
+        return cache.get(file, functools.partial(NewMiz._recreate_dict_from_file, file, version))
+
+    @staticmethod
+    def _recreate_dict_from_folder(folder: Path, version, cache: _RecomposeCache = None) -> dict:
         output = {}
         folder_stem = folder.name.replace('.json', '')
         if Path(folder, '__order__.json').exists():
-            output.update(NewMiz._recreate_dict_from_ordered_folder(folder, version))
+            output.update(NewMiz._recreate_dict_from_ordered_folder(folder, version, cache))
         else:
             for obj in folder.iterdir():
                 obj_stem: typing.Union[str, int] = obj.name.replace('.json', '')
@@ -173,19 +591,19 @@ class NewMiz(Miz):
                     pass
                 if obj.is_file():
                     if obj_stem == 'base_info':
-                        output.update(NewMiz._recreate_dict_from_file(obj.absolute(), version))
+                        output.update(NewMiz._load_file(obj.absolute(), version, cache))
                     else:
                         if obj_stem == f'__{folder_stem}':
-                            output.update(NewMiz._recreate_dict_from_file(obj.absolute(), version)[obj_stem])
+                            output.update(NewMiz._load_file(obj.absolute(), version, cache)[obj_stem])
                         else:
-                            value = NewMiz._recreate_dict_from_file(obj.absolute(), version)
+                            value = NewMiz._load_file(obj.absolute(), version, cache)
                             output[obj_stem] = value[obj_stem]
                 elif obj.is_dir():
-                    output[obj_stem] = NewMiz._recreate_dict_from_folder(obj.absolute(), version)
+                    output[obj_stem] = NewMiz._load_folder(obj.absolute(), version, cache)
         return NewMiz._sorted(output)
 
     @staticmethod
-    def _recreate_dict_from_ordered_folder(folder: Path, version) -> dict:
+    def _recreate_dict_from_ordered_folder(folder: Path, version, cache: _RecomposeCache = None) -> dict:
         output = {}
         order_file = Path(folder, '__order__.json')
         # pylint: disable=c-extension-no-member
@@ -200,11 +618,11 @@ class NewMiz(Miz):
                 if obj_stem == '__order__':
                     continue
                 index = order[obj.name.replace('.json', '')]
-                output[int(index)] = NewMiz._recreate_dict_from_file(obj.absolute(), version)[obj_stem]
+                output[int(index)] = NewMiz._load_file(obj.absolute(), version, cache)[obj_stem]
 
             elif obj.is_dir():
                 index = order[obj.name.replace('.json', '')]
-                output[int(index)] = NewMiz._recreate_dict_from_folder(obj.absolute(), version)
+                output[int(index)] = NewMiz._load_folder(obj.absolute(), version, cache)
         return NewMiz._sorted(output)
 
     @staticmethod
@@ -212,7 +630,7 @@ class NewMiz(Miz):
         output = {}
         content = file.read_text(encoding=ENCODING)
         # pylint: disable=c-extension-no-member
-        dict_ = ujson.loads(content, precise_float=True)
+        dict_ = NewMiz._sorted_tree(ujson.loads(content))
 
         dict_version = dict_.pop('__version__')
         if dict_version != version:
@@ -256,46 +674,104 @@ class NewMiz(Miz):
             path.write_text(parser.encode(data, qual), encoding=ENCODING)
 
     @staticmethod
-    def decompose(miz_file: Path, output_folder: Path):
+    def _sync_assets(source_folder: Path, assets_folder: Path) -> int:
+        """
+        Mirrors the members of a MIZ file (except the mission) into the assets folder, copying only the files that
+        differ (compared by size first, then byte for byte)
+
+        Returns: amount of files copied
+        """
+        files: typing.Dict[Path, Path] = {}
+        folders: typing.Set[Path] = {assets_folder}
+        for root, dir_names, file_names in os.walk(str(source_folder)):
+            # same as shutil.ignore_patterns('mission'), used by the full decomposition
+            dir_names[:] = [dir_name for dir_name in dir_names if dir_name != 'mission']
+            target_root = assets_folder.joinpath(Path(root).relative_to(source_folder))
+            folders.add(target_root)
+            for file_name in file_names:
+                if file_name != 'mission':
+                    files[target_root.joinpath(file_name)] = Path(root, file_name)
+        if assets_folder.exists():
+            _prune(assets_folder, set(files), folders)
+        copied = 0
+        for folder in folders:
+            folder.mkdir(parents=True, exist_ok=True)
+        for target, source in files.items():
+            if not target.exists() or not filecmp.cmp(str(source), str(target), shallow=False):
+                shutil.copyfile(str(source), str(target))
+                copied += 1
+        return copied
+
+    @staticmethod
+    def decompose(miz_file: Path, output_folder: Path, jobs: int = None, incremental: bool = False):
         """
         Decompose this Miz into json
 
+        The whole file tree is planned in memory first, then written by a pool of threads.
+
+        In incremental mode, the existing decomposition is updated in place instead of being wiped: only the files
+        whose content changed are written, and stale files are removed, so that unchanged files keep their
+        modification time.
+
         Args:
             output_folder: folder to output the json structure as a Path
             miz_file: MIZ file path as a Path
+            jobs: amount of threads writing the JSON files (defaults to the ThreadPoolExecutor default; 1 writes
+                them from the calling thread)
+            incremental: update an existing decomposition, writing only the differences
         """
+        # missing names are numbered from scratch, so that decomposing the same file twice gives the same files
+        NewMiz.missing_name_counter = 0
         mission_folder, assets_folder = NewMiz._get_subfolders(output_folder)
-        NewMiz._wipe_folders(mission_folder, assets_folder)
+        if not incremental:
+            NewMiz._wipe_folders(mission_folder, assets_folder)
         LOGGER.info('unzipping mission file')
         with Miz(miz_file) as miz:
             version = miz.mission.d['version']
             LOGGER.debug(f'mission version: "%s"', version)
 
-            LOGGER.info('copying assets to: "%s"', assets_folder)
-            ignore = shutil.ignore_patterns('mission')
-            shutil.copytree(str(miz.temp_dir), str(assets_folder), ignore=ignore)
+            NewMiz._reorder_warehouses(miz.temp_dir)
 
-            NewMiz._reorder_warehouses(assets_folder)
+            LOGGER.info('copying assets to: "%s"', assets_folder)
+            if incremental:
+                copied = NewMiz._sync_assets(miz.temp_dir, assets_folder)
+                LOGGER.info('%s asset(s) changed', copied)
+            else:
+                ignore = shutil.ignore_patterns('mission')
+                shutil.copytree(str(miz.temp_dir), str(assets_folder), ignore=ignore)
 
-            LOGGER.info('decomposing mission table into: "%s" (this will take a while)', mission_folder)
-            NewMiz._decompose_dict(miz.mission.d, 'base_info', mission_folder, version, miz)
+            LOGGER.info('decomposing mission table into: "%s"', mission_folder)
+            plan = _DecompositionPlan(mission_folder)
+            NewMiz._decompose_dict(miz.mission.d, 'base_info', mission_folder, version, miz, plan)
+            written = plan.write(jobs, incremental)
+            LOGGER.info('%s mission file(s) written', written)
 
     @staticmethod
-    def recompose(src: Path, target_file: Path):
+    def recompose(src: Path, target_file: Path, cache: bool = False):
         """
         Recompose a Miz from json object
 
         Args:
             src: folder containing the json structure
-            target_file: target Miz file
+            target_file: target Miz file (created if it does not exist)
+            cache: keep the parsed JSON files in a cache file (in the cache folder of the user, see
+                _RecomposeCache.cache_file_for), so that the next recomposition of the same folder only parses the
+                files that changed since
         """
         mission_folder, assets_folder = NewMiz._get_subfolders(src)
         # pylint: disable=c-extension-no-member
         base_info = ujson.loads(Path(mission_folder, 'base_info.json').read_text(encoding=ENCODING))
         version = base_info['__version__']
-        with Miz(target_file) as miz:
+        recompose_cache = None
+        if cache:
+            recompose_cache = _RecomposeCache(mission_folder, _RecomposeCache.cache_file_for(src), version)
+        # the target is only extracted: its mission table is replaced, and the other tables are taken from the assets
+        miz, qualifier = _unzip_target(Path(target_file))
+        try:
             LOGGER.info('re-composing mission table from folder: "%s"', mission_folder)
-            miz.mission.d = NewMiz._recreate_dict_from_folder(mission_folder, version)
+            mission_dict = NewMiz._recreate_dict_from_folder(mission_folder, version, recompose_cache)
+            if recompose_cache is not None:
+                LOGGER.debug('recompose cache: %s hit(s), %s miss(es)', recompose_cache.hits, recompose_cache.misses)
             for item in assets_folder.iterdir():
                 target = Path(miz.temp_dir, item.name).absolute()
                 if item.is_dir():
@@ -304,10 +780,66 @@ class NewMiz(Miz):
                     shutil.copytree(item.absolute(), target)
                 elif item.is_file():
                     shutil.copy(item.absolute(), target)
+            # pylint: disable=protected-access
+            miz._write_text(miz.mission_file, encode_table(mission_dict, qualifier))
             miz.zip(target_file, encode=False)
+        finally:
+            miz._remove_temp_dir()  # pylint: disable=protected-access
+        if recompose_cache is not None:
+            recompose_cache.save()
 
-        # dict_ = self.
-        # pylint: disable=c-extension-no-member
-        # self.mi
-        # self._encode()
-        # self.zip(target_file)
+    @staticmethod
+    def watch(
+            src: Path,
+            target_file: Path,
+            interval: float = 0.3,
+            debounce: float = 0.2,
+            stop: threading.Event = None,
+            on_recompose: typing.Callable[[Recomposition], None] = None,
+    ):
+        """
+        Recomposes a folder into a MIZ file, then again every time something changes in the folder, until
+        interrupted or until "stop" is set
+
+        Changes are detected by polling the modification time and size of the files. A change is only recomposed
+        once no file has been modified for "debounce" seconds, since editors often write a file in several steps.
+
+        Only the JSON files that changed are parsed again, only the tables that changed are encoded again, and only
+        the archive members that changed are compressed again. The parse cache is saved on exit in the cache folder
+        of the user, where "recompose" finds it (see _RecomposeCache.cache_file_for).
+
+        A failed recomposition (a JSON file saved half-way, for example) is logged; the next change is recomposed as
+        usual.
+
+        Args:
+            src: folder containing the json structure
+            target_file: target Miz file (created if it does not exist, overwritten otherwise)
+            interval: seconds between two polls of the folder
+            debounce: seconds without any file being modified before the folder is recomposed
+            stop: event stopping the watch when set
+            on_recompose: called with a Recomposition after each successful recomposition
+        """
+        stop = stop or threading.Event()
+        live = _LiveRecomposition(Path(src), Path(target_file))
+        built: typing.Optional[tuple] = None
+        LOGGER.info('watching: "%s"', src)
+        try:
+            while not stop.is_set():
+                signatures = live.scan()
+                state = tuple(signature.get('.') for signature in signatures)
+                if state != built and (built is None or time_.time() - _latest_change(*signatures) >= debounce):
+                    try:
+                        result = live.build(*signatures)
+                    except Exception:  # pylint: disable=broad-except
+                        LOGGER.exception('error while re-composing: %s', src)
+                    else:
+                        LOGGER.info('re-composed "%s" in %.3fs (%s parsed, %s re-used)',
+                                    result.target, result.seconds, result.parsed, result.reused)
+                        if on_recompose is not None:
+                            on_recompose(result)
+                    built = state
+                stop.wait(interval)
+        except KeyboardInterrupt:
+            LOGGER.info('stopping')
+        finally:
+            live.close()
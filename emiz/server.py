@@ -0,0 +1,477 @@
+# coding=utf-8
+"""
+Long-running mission edit daemon
+
+Keeps recently used missions decoded in memory (in a LRU cache bounded by an estimate of their size), and edits them
+on request. Requests are JSON documents sent over HTTP, either on localhost or on a Unix socket:
+
+    POST /edit
+    {
+        "miz": "/path/to/source.miz",
+        "output": "/path/to/output.miz",              (optional, defaults to editing the source in place)
+        "metar": "UGTB 240830Z 31017KT CAVOK 11/02 Q1012",   (optional, METAR or ICAO)
+        "time": "20180201225000",                     (optional, YYYYMMDDHHMMSS)
+        "min_wind": 0, "max_wind": 40,                (optional)
+        "groups": {"old group name": "new group name"},  (optional)
+        "radios": [{"unit": "unit name", "radio": 1, "channels": {"1": 251.0}}]  (optional; radio number or name)
+    }
+
+    GET /stats
+
+Requests must have the "application/json" Content-Type, so that web pages cannot send them from a browser without a
+CORS preflight. Source and output files must end with ".miz", and, if the daemon was given a root folder, be inside
+that folder.
+
+Edits of the same MIZ file (as source or output) are serialized; edits of different files run concurrently. Outputs
+are written to a temporary file first, then moved over the output file. The decoded mission of a source file is only
+edited in place when the output is the source file itself; otherwise a copy-on-write clone is edited, so the cache
+always reflects the files on disk. Cached missions are reloaded when their source file changes.
+"""
+import collections
+import contextlib
+import json
+import os
+import shutil
+import socketserver
+import statistics
+import threading
+import time as time_
+import typing
+import uuid
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from pathlib import Path
+
+import elib
+
+from emiz.edit_miz import apply_weather_and_time
+from emiz.mission import FlyingUnit
+from emiz.miz import Miz
+
+LOGGER = elib.custom_logging.get_logger('EMIZ')
+
+# rough ratio between the memory used by decoded lua tables and the size of their text
+_DECODED_SIZE_FACTOR = 10
+_LATENCY_SAMPLES = 1000
+_EDIT_KEYS = {'miz', 'output', 'metar', 'time', 'min_wind', 'max_wind', 'groups', 'radios'}
+
+
+@dataclass
+class _CacheEntry:
+    miz: Miz
+    size: int
+    # size and modification time of the source file, when it was decoded (or last written)
+    stat: typing.Tuple[int, float]
+
+
+def _file_stat(path: str) -> typing.Tuple[int, float]:
+    stat = os.stat(path)
+    return stat.st_size, stat.st_mtime
+
+
+def _estimated_size(miz: Miz) -> int:
+    return _DECODED_SIZE_FACTOR * sum(
+        file_path.stat().st_size for file_path in (miz.mission_file, miz.dictionary_file, miz.map_res_file)
+    )
+
+
+def _close(miz: Miz):
+    miz._remove_temp_dir()  # pylint: disable=protected-access
+
+
+def _zip_atomically(miz: Miz, output: str):
+    """
+    Zips to a temporary file next to the output, then moves it over the output, so that the output is never seen
+    half-written
+    """
+    # not created with tempfile, which would restrict the permissions of the output
+    temp_file = os.path.join(os.path.dirname(output), f'.{os.path.basename(output)}.{uuid.uuid4().hex}.miz')
+    try:
+        miz.zip(temp_file)
+        if os.path.exists(output):
+            shutil.copymode(output, temp_file)
+        os.replace(temp_file, output)
+    except Exception:
+        if os.path.exists(temp_file):
+            os.unlink(temp_file)
+        raise
+
+
+class MissionCache:
+    """
+    LRU cache of decoded MIZ files, bounded by an estimate of their size in memory
+
+    "lock(path)" must be held while using the Miz of a path; entries in use are never evicted.
+    """
+
+    def __init__(self, max_size: int) -> None:
+        """
+        Args:
+            max_size: maximum estimated size of the decoded missions, in bytes
+        """
+        self.max_size = max_size
+        self._entries: typing.MutableMapping[str, _CacheEntry] = collections.OrderedDict()
+        self._locks: typing.Dict[str, threading.Lock] = collections.defaultdict(threading.Lock)
+        self._lock = threading.Lock()
+
+    @property
+    def size(self) -> int:
+        """
+        Returns: estimated size of the cached missions, in bytes
+        """
+        with self._lock:
+            return sum(entry.size for entry in self._entries.values())
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+    def lock(self, path: str) -> threading.Lock:
+        """
+        Args:
+            path: absolute path to a MIZ file
+
+        Returns: lock serializing the use of this MIZ file
+        """
+        with self._lock:
+            return self._locks[path]
+
+    def get(self, path: str) -> typing.Tuple[Miz, bool]:
+        """
+        Gets the decoded Miz of a file, decoding it if needed (the lock of the path must be held)
+
+        Args:
+            path: absolute path to a MIZ file
+
+        Returns: tuple of Miz, True if it was found in the cache
+
+        """
+        stat = _file_stat(path)
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is not None and entry.stat == stat:
+                self._entries.move_to_end(path)
+                return entry.miz, True
+        if entry is not None:
+            LOGGER.debug('cache: %s changed on disk, reloading', path)
+            self.evict(path)
+
+        LOGGER.debug('cache: decoding %s', path)
+        miz = Miz(path, track_changes=True)
+        miz.unzip()
+        miz.decode()
+        with self._lock:
+            self._entries[path] = _CacheEntry(miz, _estimated_size(miz), stat)
+        self._shrink(keep=path)
+        return miz, False
+
+    def refresh(self, path: str):
+        """
+        Records that a cached MIZ file was re-written from its cached Miz (the lock of the path must be held)
+
+        Args:
+            path: absolute path to a MIZ file
+        """
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is not None:
+                entry.stat = _file_stat(path)
+                entry.size = _estimated_size(entry.miz)
+
+    def evict(self, path: str):
+        """
+        Removes a MIZ file from the cache (the lock of the path must be held)
+
+        Args:
+            path: absolute path to a MIZ file
+        """
+        with self._lock:
+            entry = self._entries.pop(path, None)
+        if entry is not None:
+            _close(entry.miz)
+
+    def _shrink(self, keep: str):
+        with self._lock:
+            candidates = [path for path in self._entries if path != keep]
+        for path in candidates:
+            if self.size <= self.max_size:
+                return
+            lock = self.lock(path)
+            if not lock.acquire(blocking=False):
+                # in use
+                continue
+            try:
+                LOGGER.debug('cache: evicting %s', path)
+                self.evict(path)
+            finally:
+                lock.release()
+
+    def clear(self):
+        """
+        Removes all MIZ files from the cache
+        """
+        with self._lock:
+            paths = list(self._entries)
+        for path in paths:
+            with self.lock(path):
+                self.evict(path)
+
+
+def _rename_groups(miz: Miz, groups: typing.Dict[str, str]):
+    for old_name, new_name in groups.items():
+        group = miz.mission.get_group_by_name(old_name)
+        if group is None:
+            raise ValueError(f'group not found: {old_name}')
+        group.group_name = new_name
+
+
+def _set_radios(miz: Miz, radios: typing.List[dict]):
+    for radio in radios:
+        unit = miz.mission.get_unit_by_name(radio['unit'])
+        if not isinstance(unit, FlyingUnit):
+            raise ValueError(f'flying unit not found: {radio["unit"]}')
+        try:
+            if isinstance(radio['radio'], int):
+                presets = unit.get_radio_by_number(radio['radio'])
+            else:
+                presets = unit.get_radio_by_name(radio['radio'])
+        except TypeError:
+            # raised by FlyingUnit when the unit has no radio presets, or not that radio
+            presets = None
+        if presets is None:
+            raise ValueError(f'radio not found on unit {radio["unit"]}: {radio["radio"]}')
+        for channel, frequency in radio['channels'].items():
+            presets.set_frequency(int(channel), float(frequency))
+
+
+class EditService:
+    """
+    Applies edit requests to MIZ files, using a MissionCache, and keeps statistics
+    """
+
+    def __init__(self, cache_size: int = 512 * 1024 * 1024, root: typing.Union[str, Path] = None) -> None:
+        """
+        Args:
+            cache_size: maximum estimated size of the decoded missions kept in memory, in bytes
+            root: if given, only MIZ files inside this folder can be read and written
+        """
+        self.cache = MissionCache(cache_size)
+        self.root = os.path.realpath(str(root)) if root is not None else None
+        self._lock = threading.Lock()
+        self._counters: typing.Counter[str] = collections.Counter()
+        self._latencies: typing.Deque[float] = collections.deque(maxlen=_LATENCY_SAMPLES)
+
+    def edit(self, request: dict) -> dict:
+        """
+        Applies an edit request (see the module documentation)
+
+        Args:
+            request: decoded JSON request
+
+        Returns: dictionary with the output file, whether the mission was found in the cache, and the duration
+
+        """
+        start = time_.perf_counter()
+        try:
+            result = self._edit(request)
+        except Exception:
+            with self._lock:
+                self._counters['errors'] += 1
+            raise
+        finally:
+            duration = time_.perf_counter() - start
+            with self._lock:
+                self._counters['requests'] += 1
+                self._latencies.append(duration)
+        with self._lock:
+            self._counters['cache_hits' if result['cache_hit'] else 'cache_misses'] += 1
+        result['duration'] = duration
+        return result
+
+    def _edit(self, request: dict) -> dict:
+        if not isinstance(request, dict):
+            raise ValueError('request must be a JSON object')
+        unknown = set(request) - _EDIT_KEYS
+        if unknown:
+            raise ValueError(f'unknown request keys: {", ".join(sorted(unknown))}')
+        if 'miz' not in request:
+            raise ValueError('missing "miz" in request')
+        path = str(elib.path.ensure_file(self._check_path(request['miz'])).absolute())
+        output = str(Path(self._check_path(request.get('output') or path)).absolute())
+        in_place = output == path
+
+        # the output may be the source of another request; locks are always taken in the same order
+        with contextlib.ExitStack() as stack:
+            for locked_path in sorted({path, output}):
+                stack.enter_context(self.cache.lock(locked_path))
+            miz, cache_hit = self.cache.get(path)
+            target = miz if in_place else miz.clone()
+            try:
+                if request.get('metar') or request.get('time'):
+                    apply_weather_and_time(target, request.get('metar'), request.get('time'),
+                                           request.get('min_wind', 0), request.get('max_wind', 40))
+                _rename_groups(target, request.get('groups', {}))
+                _set_radios(target, request.get('radios', []))
+                _zip_atomically(target, output)
+            except Exception:
+                if in_place:
+                    # the cached mission may have been partially edited
+                    self.cache.evict(path)
+                raise
+            finally:
+                if not in_place:
+                    _close(target)
+            if in_place:
+                self.cache.refresh(path)
+            else:
+                self.cache.evict(output)
+
+        return {'output': output, 'cache_hit': cache_hit}
+
+    def _check_path(self, path: str) -> str:
+        if Path(path).suffix != '.miz':
+            raise ValueError(f'not a MIZ file: {path}')
+        if self.root is not None:
+            real_path = os.path.realpath(path)
+            if os.path.commonpath([self.root, real_path]) != self.root:
+                raise ValueError(f'outside of the root folder: {path}')
+        return path
+
+    def stats(self) -> dict:
+        """
+        Returns: counters, latency (in seconds, over the last requests) and cache statistics
+        """
+        with self._lock:
+            counters = dict(self._counters)
+            latencies = sorted(self._latencies)
+        lookups = counters.get('cache_hits', 0) + counters.get('cache_misses', 0)
+        stats = {
+            'requests': counters.get('requests', 0),
+            'errors': counters.get('errors', 0),
+            'cache_hits': counters.get('cache_hits', 0),
+            'cache_misses': counters.get('cache_misses', 0),
+            'cache_hit_rate': counters.get('cache_hits', 0) / lookups if lookups else 0.0,
+            'cache_entries': len(self.cache),
+            'cache_size': self.cache.size,
+            'cache_max_size': self.cache.max_size,
+            'latency': {},
+        }
+        if latencies:
+            stats['latency'] = {
+                'mean': statistics.mean(latencies),
+                'p50': latencies[len(latencies) // 2],
+                'p95': latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))],
+                'max': latencies[-1],
+            }
+        return stats
+
+
+class _Handler(BaseHTTPRequestHandler):
+    service: EditService
+
+    def address_string(self):
+        # Unix sockets have no client address
+        return self.client_address[0] if self.client_address else 'unix'
+
+    def log_message(self, format, *args):  # pylint: disable=redefined-builtin
+        LOGGER.debug('serve: %s', format % args)
+
+    def _reply(self, status: int, body: dict):
+        data = json.dumps(body).encode('utf8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):  # pylint: disable=invalid-name
+        """
+        GET /stats
+        """
+        if self.path == '/stats':
+            self._reply(200, self.service.stats())
+        else:
+            self._reply(404, {'error': f'not found: {self.path}'})
+
+    def do_POST(self):  # pylint: disable=invalid-name
+        """
+        POST /edit
+        """
+        if self.path != '/edit':
+            self._reply(404, {'error': f'not found: {self.path}'})
+            return
+        if self.headers.get_content_type() != 'application/json':
+            self._reply(415, {'error': 'Content-Type must be application/json'})
+            return
+        try:
+            request = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))).decode('utf8'))
+            self._reply(200, self.service.edit(request))
+        except (ValueError, TypeError, KeyError, OSError) as error:
+            self._reply(400, {'error': f'{error.__class__.__name__}: {error}'})
+        except Exception as error:  # pylint: disable=broad-except
+            LOGGER.exception('serve: error while processing request')
+            self._reply(500, {'error': f'{error.__class__.__name__}: {error}'})
+
+
+class _TCPServer(socketserver.ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class _UnixServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+def make_server(
+        service: EditService,
+        host: str = '127.0.0.1',
+        port: int = 8787,
+        socket_path: typing.Union[str, Path] = None,
+) -> socketserver.BaseServer:
+    """
+    Creates the HTTP server (call "serve_forever" on it to start it)
+
+    Args:
+        service: service handling the requests
+        host: address to listen on (ignored if "socket_path" is given)
+        port: port to listen on (ignored if "socket_path" is given)
+        socket_path: Unix socket to listen on, instead of a TCP port
+
+    Returns: server
+
+    """
+    handler = type('Handler', (_Handler,), {'service': service})
+    if socket_path is not None:
+        socket_path = str(socket_path)
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+        return _UnixServer(socket_path, handler)
+    return _TCPServer((host, port), handler)
+
+
+def serve(
+        host: str = '127.0.0.1',
+        port: int = 8787,
+        socket_path: typing.Union[str, Path] = None,
+        cache_size: int = 512 * 1024 * 1024,
+        root: typing.Union[str, Path] = None,
+):
+    """
+    Runs the daemon until interrupted
+
+    Args:
+        host: address to listen on (ignored if "socket_path" is given)
+        port: port to listen on (ignored if "socket_path" is given)
+        socket_path: Unix socket to listen on, instead of a TCP port
+        cache_size: maximum estimated size of the decoded missions kept in memory, in bytes
+        root: if given, only MIZ files inside this folder can be read and written
+    """
+    service = EditService(cache_size, root)
+    server = make_server(service, host, port, socket_path)
+    LOGGER.info('serving on %s', socket_path or f'http://{host}:{server.server_address[1]}')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        LOGGER.info('stopping')
+    finally:
+        server.server_close()
+        service.cache.clear()
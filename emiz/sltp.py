@@ -2,11 +2,17 @@
 # pylint: skip-file
 # FIXME: Pylint
 """Simple Lua Python Parser"""
+import heapq
 import re
+import time
+import typing
+from dataclasses import dataclass, field
 
 import elib
 from natsort import natsorted
 
+from emiz.metrics import current_span, timed
+
 LOGGER = elib.custom_logging.get_logger('EMIZ')
 
 # noinspection SpellCheckingInspection
@@ -41,6 +47,97 @@ class SLTPEmptyObjectError(BaseSLTPError):
         super().__init__(*args)
 
 
+@dataclass
+class TableStats:
+    """Size of a table found while decoding
+
+    path: keys leading to the table, joined with "/"
+    size: amount of characters of the table in the decoded text (comments excluded)
+    entries: amount of entries of the table
+    seconds: time spent decoding the table (only measured for the top-level keys)
+    """
+    path: str
+    size: int
+    entries: int
+    seconds: float = 0.0
+
+
+@dataclass
+class DecodeStats:
+    """Counters collected by SLTP.decode(..., stats=True)"""
+    size: int = 0
+    seconds: float = 0.0
+    max_depth: int = 0
+    tables: int = 0
+    strings: int = 0
+    string_chars: int = 0
+    # largest tables, by size, largest first
+    largest_tables: typing.List[TableStats] = field(default_factory=list)
+    # top-level keys of the table, slowest first
+    sections: typing.List[TableStats] = field(default_factory=list)
+
+
+class _StatsCollector:
+    """Collects DecodeStats while SLTP parses a text"""
+
+    def __init__(self, top: int):
+        self.stats = DecodeStats()
+        self.top = top
+        self.path = []
+        self.heap = []
+        self.counter = 0
+
+    def measure(self, parser: 'SLTP', key, parse):
+        """Parses the value of a key, and records it if it is a table
+
+        :param parser: running parser
+        :param key: key of the value being parsed
+        :param parse: parser method to call
+        :return: parsed value
+        """
+        stats = self.stats
+        self.path.append(str(key))
+        start_at = parser.at
+        start_time = time.perf_counter() if parser.depth == 1 else 0.0
+        try:
+            value = parse()
+        finally:
+            self.path.pop()
+        size = parser.at - start_at
+        if isinstance(value, (dict, list)):
+            stats.tables += 1
+            depth = len(self.path) + 2
+            if depth > stats.max_depth:
+                stats.max_depth = depth
+            self.counter += 1
+            item = (size, -self.counter, '/'.join(self.path + [str(key)]), len(value))
+            if len(self.heap) < self.top:
+                heapq.heappush(self.heap, item)
+            elif self.top:
+                heapq.heappushpop(self.heap, item)
+        if parser.depth == 1:
+            entries = len(value) if isinstance(value, (dict, list)) else 0
+            stats.sections.append(TableStats(str(key), size, entries, time.perf_counter() - start_time))
+        return value
+
+    def finish(self, size: int, seconds: float) -> DecodeStats:
+        """Sorts the collected tables
+
+        :param size: size of the decoded text
+        :param seconds: time spent decoding
+        :return: DecodeStats
+        """
+        stats = self.stats
+        stats.size = size
+        stats.seconds = seconds
+        stats.tables += 1
+        stats.max_depth = max(stats.max_depth, 1)
+        stats.largest_tables = [TableStats(path, size, entries)
+                                for size, _, path, entries in sorted(self.heap, reverse=True)]
+        stats.sections.sort(key=lambda section: section.seconds, reverse=True)
+        return stats
+
+
 class SLTP:
     """Simple Lua Python Parser"""
 
@@ -58,13 +155,20 @@ class SLTP:
         self.newline = '\n'
         self.tab = '\t'
         self.tab = '    '
+        self._stats = None
+        # see "encode"
+        self._memo: typing.Optional[dict] = None
+        self._next_memo: typing.Optional[dict] = None
 
-    def decode(self, text):
+    @timed('sltp.decode')
+    def decode(self, text, stats: bool = False, top: int = 10):
         """Decode a Lua string to an dictionary
         :type text: str
         :rtype: dict
         :param text: string to decode
-        :return: dictionary
+        :param stats: collect statistics about the table while decoding (slower)
+        :param top: amount of largest tables to keep in the statistics
+        :return: dictionary, qualifier (and DecodeStats if "stats" is True)
         """
         LOGGER.debug('decoding text to dictionary')
 
@@ -79,6 +183,9 @@ class SLTP:
             raise ValueError('qualifier not found; first line: {}'.format(text.split('\n')[0]))
 
         self.qual = match.group('value')
+        current = current_span()
+        current.attributes['table'] = match.group(2)
+        current.size = len(text)
         text = qual.sub('', text)
 
         reg = re.compile(r' -- .*[^(\\|",)]$', re.M)
@@ -87,17 +194,53 @@ class SLTP:
         self.text = text
         self.at, self.ch, self.depth = 0, '', 0
         self.len = len(text)
+        if not stats:
+            self.next_chr()
+            result = self.value()
+            current.items = len(result) if isinstance(result, dict) else 0
+            return result, self.qual
+
+        self._stats = _StatsCollector(top)
+        start = time.perf_counter()
+        try:
+            self.next_chr()
+            result = self.value()
+        finally:
+            collector, self._stats = self._stats, None
+        current.items = len(result) if isinstance(result, dict) else 0
+        return result, self.qual, collector.finish(self.len, time.perf_counter() - start)
+
+    def decode_value(self, text):
+        """Decode a single Lua value, without qualifier
+        :type text: str
+        :param text: string to decode
+        :return: decoded value
+        """
+        reg = re.compile(r' -- .*[^(\\|",)]$', re.M)
+        self.text = reg.sub('', text)
+        self.at, self.ch, self.depth = 0, '', 0
+        self.len = len(self.text)
         self.next_chr()
-        result = self.value()
-        return result, self.qual
+        return self.value()
 
-    def encode(self, obj, qualifier: str):
+    @timed('sltp.encode')
+    def encode(self, obj, qualifier: str, memo: dict = None):
         """Encodes a dictionary-like object to a Lua string
+
+        "memo" makes repeated encodings of a mostly unchanged table cheaper: tables (dict) that are the very same
+        objects as in the previous call with the same memo are not encoded again. Tables kept from one call to the
+        next must therefore not be modified in between. After the call, the memo only holds the tables of this
+        call.
+
         :param qualifier:
         :param obj: object to encode
+        :param memo: dictionary kept by the caller from one call to the next
         :return: valid Lua string
         """
         LOGGER.debug('encoding dictionary to text')
+        current = current_span()
+        current.attributes['table'] = qualifier.replace('=', '').strip()
+        current.items = len(obj) if obj else 0
         if not obj:
             if qualifier.replace('=', '').rstrip() == 'mapResource':
                 # Accept empty mapResource
@@ -107,7 +250,15 @@ class SLTP:
                 raise SLTPEmptyObjectError(qualifier)
         self.depth = 0
         out = []
-        s = self.__encode(obj)
+        if memo is not None:
+            self._memo, self._next_memo = memo, {}
+        try:
+            s = self.__encode(obj)
+        finally:
+            if memo is not None:
+                memo.clear()
+                memo.update(self._next_memo)
+                self._memo = self._next_memo = None
         lines = s.split(self.newline)
         for line in lines:
             m = self.line_end.match(line)
@@ -115,9 +266,22 @@ class SLTP:
                 out.append('{},{}'.format(m.group('intro'), m.group('comment')))
             else:
                 out.append(line)
-        return '{}{} -- end of {}\n'.format(qualifier, self.newline.join(out), qualifier.replace('=', '').rstrip())
-
-    def __encode(self, obj, dict_name=None):  # noqa C901
+        text = '{}{} -- end of {}\n'.format(qualifier, self.newline.join(out), qualifier.replace('=', '').rstrip())
+        current.size = len(text)
+        return text
+
+    def __encode(self, obj, dict_name=None):
+        if self._memo is None or not isinstance(obj, dict):
+            return self.__encode_value(obj, dict_name)
+        # the memo keeps a reference to the table, so that its id cannot be re-used by another object
+        key = (id(obj), self.depth, dict_name)
+        entry = self._memo.get(key)
+        if entry is None or entry[0] is not obj:
+            entry = (obj, self.__encode_value(obj, dict_name))
+        self._next_memo[key] = entry
+        return entry[1]
+
+    def __encode_value(self, obj, dict_name=None):  # noqa C901
         s = ''
         tab = self.tab
         newline = self.newline
@@ -220,6 +384,9 @@ class SLTP:
                 if self.ch == end:
                     self.next_chr()
                     if start != '[' or self.ch == ']':
+                        if self._stats is not None:
+                            self._stats.stats.strings += 1
+                            self._stats.stats.string_chars += len(s)
                         return s
                 if self.ch == '\\' and start == end:
                     self.next_chr()
@@ -246,7 +413,10 @@ class SLTP:
             while self.ch:
                 self.white()
                 if self.ch == '{':
-                    o[idx] = self.object()
+                    if self._stats is None:
+                        o[idx] = self.object()
+                    else:
+                        o[idx] = self._stats.measure(self, idx + 1, self.object)
                     idx += 1
                     continue
                 elif self.ch == '}':
@@ -277,7 +447,10 @@ class SLTP:
                     if self.ch == '=':
                         self.next_chr()
                         self.white()
-                        o[k] = self.value()
+                        if self._stats is None:
+                            o[k] = self.value()
+                        else:
+                            o[k] = self._stats.measure(self, k, self.value)
                         idx += 1
                         k = ''
                     elif self.ch == ',':
@@ -357,3 +530,63 @@ class SLTP:
             n += self.ch
             self.next_chr()
         return n
+
+
+_PEEK_TOKEN = re.compile(r'"|--|[{}]')
+_PEEK_STRING_END = re.compile(r'(?:[^"\\]|\\.)*"', re.S)
+_PEEK_KEY = re.compile(r'\s*\["(?P<key>[^"]+)"\]\s*=(?P<value>.*)', re.S)
+
+
+def peek(lines: typing.Iterable[str], keys: typing.Iterable[str]) -> dict:
+    """Decode only some top-level keys of a Lua table
+
+    Lines are consumed until all the keys have been found; nested tables that are not looked after are only scanned
+    for braces and strings, never decoded.
+
+    :param lines: lines of Lua text, qualifier included (for example a file object)
+    :param keys: top-level keys to decode
+    :return: dictionary of the keys that were found
+    """
+    wanted = set(keys)
+    result = {}
+    depth = 0
+    in_string = False
+    key = None
+    captured = []
+    for line in lines:
+        if key is None and depth == 1 and not in_string:
+            match = _PEEK_KEY.match(line)
+            if match and match.group('key') in wanted:
+                key = match.group('key')
+                captured = [match.group('value')]
+        elif key is not None:
+            captured.append(line)
+        pos = 0
+        while True:
+            if in_string:
+                match = _PEEK_STRING_END.match(line, pos)
+                if not match:
+                    break
+                in_string = False
+                pos = match.end()
+                continue
+            match = _PEEK_TOKEN.search(line, pos)
+            if not match:
+                break
+            token = match.group()
+            pos = match.end()
+            if token == '"':
+                in_string = True
+            elif token == '--':
+                break
+            elif token == '{':
+                depth += 1
+            else:
+                depth -= 1
+        if key is not None and depth == 1 and not in_string and ''.join(captured).strip():
+            result[key] = SLTP().decode_value(''.join(captured))
+            wanted.discard(key)
+            key = None
+            if not wanted:
+                break
+    return result
@@ -0,0 +1,197 @@
+# coding=utf-8
+"""
+Exports missions to an SQLite database, for ad-hoc analysis
+
+The database holds the tables described in emiz.mission_tables, for any amount of missions; every row is tied to its
+mission by the "mission_hash" column. MIZ files are identified by the SHA-256 of their content, so exporting the same
+file twice is a no-op in incremental mode.
+"""
+import multiprocessing
+import os
+import sqlite3
+import typing
+from dataclasses import dataclass
+from pathlib import Path
+
+import elib
+
+from emiz.mission import Mission
+from emiz.mission_tables import TABLES, mission_tables
+from emiz.miz import Miz
+from emiz.miz_archive import file_sha256
+
+LOGGER = elib.custom_logging.get_logger('EMIZ')
+
+_SOURCES_TABLE = 'sources'
+
+
+@dataclass
+class ExportResult:
+    """
+    Outcome of SQLiteExporter.export_miz_files
+    """
+    exported: int = 0
+    skipped: int = 0
+    errors: int = 0
+
+
+def _read_tables(path: str, mission_hash: str) -> typing.Tuple[str, str, typing.Dict[str, typing.List[tuple]], str]:
+    """
+    Decodes and flattens a MIZ file; runs in the worker processes of SQLiteExporter.export_miz_files
+    """
+    try:
+        return path, mission_hash, mission_tables(Miz.read_mission(path), mission_hash), ''
+    except Exception as error:  # pylint: disable=broad-except
+        LOGGER.error('error while reading MIZ file "%s": %s', path, error)
+        return path, mission_hash, {}, f'{error.__class__.__name__}: {error}'
+
+
+class SQLiteExporter:
+    """
+    Writes missions into an SQLite database
+
+    Can be used as a context manager, closing the database on exit.
+    """
+
+    def __init__(self, database: typing.Union[str, Path] = ':memory:') -> None:
+        """
+        Args:
+            database: path to the SQLite database file (created if needed)
+        """
+        self.database = str(database)
+        self._connection = sqlite3.connect(self.database)
+        self._create_tables()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    @property
+    def connection(self) -> sqlite3.Connection:
+        """
+        Returns: connection to the database, for querying
+        """
+        return self._connection
+
+    def close(self):
+        """
+        Closes the database
+        """
+        self._connection.close()
+
+    def _create_tables(self):
+        with self._connection:
+            for table, columns in TABLES.items():
+                self._connection.execute(
+                    f'CREATE TABLE IF NOT EXISTS {table} ({", ".join(f"{name} {type_}" for name, type_ in columns)})'
+                )
+                self._connection.execute(f'CREATE INDEX IF NOT EXISTS {table}_hash ON {table}(mission_hash)')
+            self._connection.execute(
+                f'CREATE TABLE IF NOT EXISTS {_SOURCES_TABLE} (mission_hash TEXT, path TEXT, error TEXT)'
+            )
+            self._connection.execute(
+                f'CREATE INDEX IF NOT EXISTS {_SOURCES_TABLE}_hash ON {_SOURCES_TABLE}(mission_hash)'
+            )
+
+    def has_mission(self, mission_hash: str) -> bool:
+        """
+        Args:
+            mission_hash: identifier of the mission
+
+        Returns: True if the mission has already been exported
+
+        """
+        return self._connection.execute(
+            f'SELECT 1 FROM {_SOURCES_TABLE} WHERE mission_hash = ? UNION ALL '
+            f'SELECT 1 FROM missions WHERE mission_hash = ? LIMIT 1', (mission_hash, mission_hash)
+        ).fetchone() is not None
+
+    def _delete(self, mission_hash: str):
+        for table in list(TABLES) + [_SOURCES_TABLE]:
+            self._connection.execute(f'DELETE FROM {table} WHERE mission_hash = ?', (mission_hash,))
+
+    def _insert(self, tables: typing.Dict[str, typing.List[tuple]]):
+        for table, rows in tables.items():
+            if rows:
+                placeholders = ', '.join('?' * len(TABLES[table]))
+                self._connection.executemany(f'INSERT INTO {table} VALUES ({placeholders})', rows)
+
+    def export_mission(self, mission: Mission, mission_hash: str, incremental: bool = True) -> bool:
+        """
+        Exports a single mission
+
+        Args:
+            mission: mission to export
+            mission_hash: identifier of the mission
+            incremental: skip the mission if it has already been exported (otherwise, replace it)
+
+        Returns: True if the mission was written
+
+        """
+        with self._connection:
+            if self.has_mission(mission_hash):
+                if incremental:
+                    return False
+                self._delete(mission_hash)
+            self._insert(mission_tables(mission, mission_hash))
+        return True
+
+    def export_miz_files(
+            self,
+            miz_files: typing.Iterable[typing.Union[str, Path]],
+            incremental: bool = True,
+            jobs: int = None,
+    ) -> ExportResult:
+        """
+        Exports many MIZ files, in a single transaction
+
+        MIZ files are decoded and flattened in worker processes; the rows are written as they come.
+
+        Args:
+            miz_files: MIZ files to export
+            incremental: skip the MIZ files that have already been exported (otherwise, replace them)
+            jobs: amount of worker processes (defaults to the amount of CPUs)
+
+        Returns: ExportResult
+
+        """
+        result = ExportResult()
+        tasks = []
+        seen: typing.Set[str] = set()
+        for miz_file in miz_files:
+            path = str(elib.path.ensure_file(miz_file).absolute())
+            mission_hash = file_sha256(path)
+            if mission_hash in seen or (incremental and self.has_mission(mission_hash)):
+                result.skipped += 1
+                continue
+            seen.add(mission_hash)
+            tasks.append((path, mission_hash))
+
+        LOGGER.info('exporting %s MIZ file(s) to %s', len(tasks), self.database)
+        with self._connection:
+            for path, mission_hash, tables, error in self._read_all(tasks, jobs):
+                self._delete(mission_hash)
+                self._connection.execute(
+                    f'INSERT INTO {_SOURCES_TABLE} VALUES (?, ?, ?)', (mission_hash, path, error)
+                )
+                if error:
+                    result.errors += 1
+                    continue
+                self._insert(tables)
+                result.exported += 1
+        return result
+
+    @staticmethod
+    def _read_all(tasks: typing.List[typing.Tuple[str, str]], jobs: typing.Optional[int]):
+        jobs = min(jobs or os.cpu_count() or 1, len(tasks))
+        if jobs <= 1:
+            yield from (_read_tables(*task) for task in tasks)
+            return
+        with multiprocessing.Pool(jobs) as pool:
+            yield from pool.imap_unordered(_star_read_tables, tasks)
+
+
+def _star_read_tables(task):
+    return _read_tables(*task)
@@ -0,0 +1,374 @@
+# coding=utf-8
+"""
+Generates synthetic missions of controlled size, for scale testing and benchmarks
+
+Missions are built on top of the empty mission shipped with emiz (see emiz.dummy_miz), then encoded and zipped by
+Miz, so that they go through the same SLTP encoder as any edited mission.
+
+Everything (unit types, positions, headings, resource content, ...) is drawn from a random generator seeded with
+"MissionSpec.seed": the same spec always produces the same tables.
+
+    generate_miz('big.miz', MissionSpec.for_units(100_000, seed=1))
+"""
+import math
+import random
+import tempfile
+import typing
+from dataclasses import dataclass, replace
+from pathlib import Path
+
+import elib
+
+from emiz.dummy_miz import dummy_miz
+from emiz.miz import Miz
+
+LOGGER = elib.custom_logging.get_logger('EMIZ')
+
+# the Mission object model only knows about those two
+_COALITIONS = ('blue', 'red')
+
+_UNIT_TYPES = {
+    'vehicle': ('M-1 Abrams', 'M-2 Bradley', 'T-72B', 'BTR-80', 'Ural-375', 'ZSU-23-4 Shilka', 'Hummer'),
+    'plane': ('F-15C', 'F-16C_50', 'A-10C', 'Su-27', 'Su-25T', 'MiG-29S', 'KC-135'),
+    'helicopter': ('Ka-50', 'UH-1H', 'Mi-8MT', 'AH-64D', 'SA342M'),
+    'ship': ('PERRY', 'TICONDEROG', 'MOLNIYA', 'ALBATROS', 'ELNYA'),
+}
+_STATIC_TYPES = (('Fortifications', '.Command Center'), ('Warehouses', 'Warehouse'), ('Fortifications', 'Bunker'),
+                 ('Heliports', 'FARP'))
+_CATEGORIES = tuple(_UNIT_TYPES)
+_SKILLS = ('Average', 'Good', 'High', 'Excellent')
+
+# area in which objects are placed (around the center of the Caucasus map of the dummy mission)
+_AREA_X = (-400_000.0, -200_000.0)
+_AREA_Y = (500_000.0, 900_000.0)
+# spread of the units of a group, and distance between waypoints
+_GROUP_SPREAD = 500.0
+_LEG_LENGTH = 20_000.0
+
+
+@dataclass(frozen=True)
+class MissionSpec:  # pylint: disable=too-many-instance-attributes
+    """
+    Size of a synthetic mission
+
+    Groups and statics are created in every country that is used, so that the mission holds
+    coalitions * countries * groups * units_per_group units.
+    """
+    seed: int = 0
+    # amount of coalitions holding groups (1: blue only, 2: blue and red)
+    coalitions: int = 2
+    # amount of countries holding groups, per coalition
+    countries: int = 1
+    # amount of groups, per country
+    groups: int = 10
+    units_per_group: int = 4
+    # amount of waypoints of each group
+    route_points: int = 3
+    # amount of statics, per country
+    statics: int = 0
+    # amount of triggers (a trigger zone and a message, stored in the dictionary, for each of them)
+    triggers: int = 0
+    # amount of additional dictionary entries, not referenced by the mission
+    dictionary_entries: int = 0
+    # amount of resource files (each of them loaded by a "DO SCRIPT FILE" trigger)
+    resources: int = 0
+    # size of each resource file, in bytes
+    resource_size: int = 4096
+
+    @property
+    def units(self) -> int:
+        """
+        Returns: amount of units (statics excluded) of the mission
+        """
+        return self.coalitions * self.countries * self.groups * self.units_per_group
+
+    @classmethod
+    def for_units(cls, units: int, **kwargs) -> 'MissionSpec':
+        """
+        Creates a spec holding at least "units" units, adjusting the amount of groups per country
+
+        Args:
+            units: amount of units to reach
+            **kwargs: other fields of the spec
+
+        Returns: MissionSpec
+        """
+        spec = cls(**kwargs)
+        per_group = spec.coalitions * spec.countries * spec.units_per_group
+        return replace(spec, groups=max(1, -(-units // per_group)))
+
+    def check(self):
+        """
+        Raises ValueError if the spec cannot be generated
+        """
+        if not 1 <= self.coalitions <= len(_COALITIONS):
+            raise ValueError(f'coalitions must be between 1 and {len(_COALITIONS)}: {self.coalitions}')
+        for name in ('countries', 'units_per_group', 'route_points'):
+            if getattr(self, name) < 1:
+                raise ValueError(f'{name} must be at least 1: {getattr(self, name)}')
+        for name in ('groups', 'statics', 'triggers', 'dictionary_entries', 'resources', 'resource_size'):
+            if getattr(self, name) < 0:
+                raise ValueError(f'{name} cannot be negative: {getattr(self, name)}')
+
+
+class _Builder:
+    """
+    Builds the tables of a synthetic mission
+    """
+
+    def __init__(self, spec: MissionSpec, max_dict_id: int) -> None:
+        self.spec = spec
+        self.random = random.Random(spec.seed)
+        self.dict_id = max_dict_id
+        self.l10n: typing.Dict[str, str] = {}
+        self.map_res: typing.Dict[str, str] = {}
+        self.resources: typing.Dict[str, bytes] = {}
+        self.group_id = 0
+        self.unit_id = 0
+
+    def key(self, kind: str, value: str, prefix: str = 'DictKey') -> str:
+        """
+        Allocates a new dictionary (or map resource) key
+
+        Args:
+            kind: kind of key ("GroupName", "UnitName", ...)
+            value: value of the key
+            prefix: "DictKey" for the dictionary, "ResKey" for the map resource
+
+        Returns: the new key
+        """
+        self.dict_id += 1
+        key = f'{prefix}_{kind}_{self.dict_id}'
+        if prefix == 'ResKey':
+            self.map_res[key] = value
+        else:
+            self.l10n[key] = value
+        return key
+
+    def position(self) -> typing.Tuple[float, float]:
+        """
+        Returns: random position within the mission area
+        """
+        return round(self.random.uniform(*_AREA_X), 4), round(self.random.uniform(*_AREA_Y), 4)
+
+    def _route(self, category: str, pos_x: float, pos_y: float, speed: float, alt: float) -> dict:
+        points = {}
+        heading = self.random.uniform(0, 6.283)
+        for index in range(1, self.spec.route_points + 1):
+            if index > 1:
+                heading += self.random.uniform(-1.0, 1.0)
+                pos_x += round(_LEG_LENGTH * math.cos(heading), 4)
+                pos_y += round(_LEG_LENGTH * math.sin(heading), 4)
+            points[index] = {
+                'action': 'Off Road' if category == 'vehicle' else 'Turning Point',
+                'alt': alt,
+                'alt_type': 'BARO',
+                'ETA': 0,
+                'ETA_locked': index == 1,
+                'formation_template': '',
+                'name': self.key('WptName', ''),
+                'speed': speed,
+                'speed_locked': True,
+                'task': {'id': 'ComboTask', 'params': {'tasks': {}}},
+                'type': 'Turning Point',
+                'x': pos_x,
+                'y': pos_y,
+            }
+        return {'points': points}
+
+    def _unit(self, category: str, group_name: str, number: int, pos_x: float, pos_y: float, speed: float,
+              alt: float) -> dict:
+        self.unit_id += 1
+        unit = {
+            'heading': round(self.random.uniform(0, 6.283), 6),
+            'name': self.key('UnitName', f'{group_name}-{number}'),
+            'skill': self.random.choice(_SKILLS),
+            'type': self.random.choice(_UNIT_TYPES[category]),
+            'unitId': self.unit_id,
+            'x': round(pos_x + self.random.uniform(-_GROUP_SPREAD, _GROUP_SPREAD), 4),
+            'y': round(pos_y + self.random.uniform(-_GROUP_SPREAD, _GROUP_SPREAD), 4),
+        }
+        if category in ('plane', 'helicopter'):
+            unit.update({
+                'alt': alt,
+                'alt_type': 'BARO',
+                'callsign': 100 + self.unit_id % 900,
+                'livery_id': 'default',
+                'onboard_num': f'{self.unit_id % 1000:03d}',
+                'payload': {'chaff': 0, 'flare': 0, 'fuel': 1000, 'gun': 100, 'pylons': {}},
+                'psi': 0,
+                'speed': speed,
+            })
+        elif category == 'vehicle':
+            unit.update({'playerCanDrive': True, 'transportable': {'randomTransportable': False}})
+        return unit
+
+    def group(self, category: str) -> dict:
+        """
+        Args:
+            category: category of the group ("vehicle", "plane", ...)
+
+        Returns: table of a new group
+        """
+        self.group_id += 1
+        name = f'{category}-{self.group_id}'
+        pos_x, pos_y = self.position()
+        speed, alt = {'plane': (200.0, 6000.0), 'helicopter': (50.0, 500.0)}.get(category, (10.0, 0.0))
+        units = {
+            number: self._unit(category, name, number, pos_x, pos_y, speed, alt)
+            for number in range(1, self.spec.units_per_group + 1)
+        }
+        group = {
+            'groupId': self.group_id,
+            'hidden': False,
+            'name': self.key('GroupName', name),
+            'route': self._route(category, pos_x, pos_y, speed, alt),
+            'start_time': 0,
+            'task': {'plane': 'CAP', 'helicopter': 'CAS'}.get(category, 'Ground Nothing'),
+            'tasks': {},
+            'units': units,
+            'visible': False,
+            'x': pos_x,
+            'y': pos_y,
+        }
+        if category in ('plane', 'helicopter'):
+            group.update({'communication': True, 'frequency': 251, 'modulation': 0, 'uncontrolled': False})
+        return group
+
+    def static(self) -> dict:
+        """
+        Returns: table of a new static
+        """
+        self.group_id += 1
+        self.unit_id += 1
+        pos_x, pos_y = self.position()
+        category, type_ = self.random.choice(_STATIC_TYPES)
+        name_key = self.key('GroupName', f'static-{self.group_id}')
+        heading = round(self.random.uniform(0, 6.283), 6)
+        return {
+            'dead': False,
+            'groupId': self.group_id,
+            'heading': heading,
+            'name': name_key,
+            'route': {'points': {1: {'action': '', 'alt': 0, 'formation_template': '', 'name': '', 'speed': 0,
+                                     'type': '', 'x': pos_x, 'y': pos_y}}},
+            'units': {1: {'category': category, 'heading': heading, 'name': name_key, 'type': type_,
+                          'unitId': self.unit_id, 'x': pos_x, 'y': pos_y}},
+            'x': pos_x,
+            'y': pos_y,
+        }
+
+    def countries(self, coalition: dict):
+        """
+        Fills the first countries of a coalition with groups and statics
+        """
+        countries = coalition['country']
+        if self.spec.countries > len(countries):
+            raise ValueError(f'coalition "{coalition["name"]}" only has {len(countries)} countries')
+        for country_index in sorted(countries)[:self.spec.countries]:
+            country = countries[country_index]
+            for _ in range(self.spec.groups):
+                category = self.random.choice(_CATEGORIES)
+                groups = country.setdefault(category, {'group': {}})['group']
+                groups[len(groups) + 1] = self.group(category)
+            if self.spec.statics:
+                country['static'] = {'group': {index: self.static() for index in range(1, self.spec.statics + 1)}}
+
+    def _add_trigger(self, mission_dict: dict, comment: str, condition: dict, condition_code: str, action: dict,
+                     action_code: str):
+        index = len(mission_dict['trigrules']) + 1
+        mission_dict['trigrules'][index] = {
+            'actions': {1: action},
+            'comment': comment,
+            'eventlist': '',
+            'predicate': 'triggerOnce',
+            'rules': {1: condition},
+        }
+        trig = mission_dict['trig']
+        trig['actions'][index] = f'{action_code} mission.trig.func[{index}]=nil;'
+        trig['conditions'][index] = f'return({condition_code} )'
+        trig['func'][index] = f'if mission.trig.conditions[{index}]() then mission.trig.actions[{index}]() end'
+        trig['flag'][index] = True
+
+    def triggers(self, mission_dict: dict):
+        """
+        Adds the trigger zones, the triggers and the scripts of the mission
+        """
+        zones = mission_dict['triggers']['zones']
+        for index in range(1, self.spec.triggers + 1):
+            pos_x, pos_y = self.position()
+            zones[len(zones) + 1] = {
+                'color': {1: 1, 2: 1, 3: 1, 4: 0.15},
+                'hidden': False,
+                'name': f'zone-{index}',
+                'radius': round(self.random.uniform(500, 5000), 2),
+                'x': pos_x,
+                'y': pos_y,
+                'zoneId': index,
+            }
+            text_key = self.key('ActionText', f'message {index}: {self.random.getrandbits(64):016x}')
+            seconds = self.random.randint(1, 3600)
+            self._add_trigger(
+                mission_dict, f'trigger-{index}',
+                {'predicate': 'c_time_after', 'seconds': seconds}, f'c_time_after({seconds})',
+                {'KeyDict_text': text_key, 'predicate': 'a_out_text_delay', 'seconds': 10, 'text': text_key,
+                 'clearview': False},
+                f'a_out_text_delay(getValueDictByKey("{text_key}"), 10, false);',
+            )
+        for index in range(1, self.spec.resources + 1):
+            name = f'script-{index}.lua'
+            res_key = self.key('Action', name, prefix='ResKey')
+            lines = (f'-- {self.random.getrandbits(128):032x}\n' for _ in range(-(-self.spec.resource_size // 36)))
+            self.resources[name] = ''.join(lines).encode()[:self.spec.resource_size]
+            self._add_trigger(
+                mission_dict, f'script-{index}',
+                {'predicate': 'c_time_after', 'seconds': 1}, 'c_time_after(1)',
+                {'file': res_key, 'predicate': 'a_do_script_file'},
+                f'a_do_script_file(getValueResourceByKey("{res_key}"));',
+            )
+
+    def dictionary_entries(self):
+        """
+        Adds the unreferenced dictionary entries
+        """
+        for index in range(1, self.spec.dictionary_entries + 1):
+            self.key('Extra', f'entry {index}: {self.random.getrandbits(64):016x}')
+
+
+def generate_miz(destination: typing.Union[str, Path], spec: MissionSpec = None) -> Path:
+    """
+    Writes a synthetic MIZ file
+
+    Args:
+        destination: MIZ file to write
+        spec: size of the mission (defaults to MissionSpec())
+
+    Returns: destination
+
+    """
+    spec = spec or MissionSpec()
+    spec.check()
+    destination = elib.path.ensure_file(destination, must_exist=False)
+    with tempfile.TemporaryDirectory(prefix='EMIZ_SYNTHETIC') as temp_dir:
+        scaffold = Path(temp_dir, 'scaffold.miz')
+        scaffold.write_bytes(dummy_miz)
+        with Miz(scaffold) as miz:
+            mission = miz.mission
+            builder = _Builder(spec, mission.d['maxDictId'])
+            with mission.editing():
+                mission_dict = mission.d
+                for color in _COALITIONS[:spec.coalitions]:
+                    builder.countries(mission_dict['coalition'][color])
+                builder.triggers(mission_dict)
+                builder.dictionary_entries()
+                mission_dict['maxDictId'] = builder.dict_id
+            miz.l10n.update(builder.l10n)
+            miz.map_res.update(builder.map_res)
+            for name, content in builder.resources.items():
+                resource = Path(temp_dir, name)
+                resource.write_bytes(content)
+                miz.add_resource(resource, name)
+            LOGGER.debug('generated %s groups and %s units, writing: %s', builder.group_id, builder.unit_id,
+                         destination)
+            miz.zip(destination)
+    return destination
@@ -1,9 +1,46 @@
 # coding=utf-8
 """
 Stupid class I wrote a while back to validate values (dummy me)
+
+The rules of a Validator are compiled into a tuple of checks the first time it is used (and again whenever a rule
+attribute is re-assigned); error messages are only built when a check fails. Validators are shared between all
+mission objects, so validating a value never modifies the validator.
+
+Validation can be deferred (or disabled) for the current thread with the "validation" context manager, to avoid
+paying for it on every assignment during bulk edits.
 """
+import contextlib
+import re
+import threading
+import typing
 from os.path import exists
-from re import fullmatch as re_full_match
+
+VALIDATION_MODES = ('immediate', 'deferred', 'off')
+
+_RULES = frozenset(('type', 'instance', 'min', 'max', 'regex', 'in_list', 'path_exists'))
+
+
+class _ValidationState(threading.local):
+    """
+    Validation mode of the current thread
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.mode = 'immediate'
+        # (validator, value, param_name, exc, logger) waiting to be validated, in deferred mode
+        self.pending: typing.List[tuple] = []
+
+
+_STATE = _ValidationState()
+
+
+def _membership(in_list) -> typing.Collection:
+    try:
+        return frozenset(in_list)
+    except TypeError:
+        # unhashable members
+        return tuple(in_list)
 
 
 # pylint: disable=too-many-instance-attributes
@@ -23,6 +60,7 @@ class Validator:
             exc=None,
             logger=None
     ):
+        self._checks: typing.Optional[tuple] = None
         self.type = _type
         self.instance = _instance
         self.min = _min
@@ -33,45 +71,102 @@ class Validator:
         self.exc = exc or ValueError
         self.logger = logger
 
+    def __setattr__(self, name, value):
+        super().__setattr__(name, value)
+        if name in _RULES:
+            super().__setattr__('_checks', None)
+
+    # pylint: disable=too-many-locals
+    def _compile(self) -> tuple:
+        """
+        Builds the checks of this validator
+
+        Returns: tuple of (function returning True if the value is invalid, function building the error message)
+        """
+        checks = []
+        if self.type is not None:
+            expected_type = self.type
+            checks.append((
+                lambda value: type(value) is not expected_type,  # pylint: disable=unidiomatic-typecheck
+                lambda value, param_name: f'invalid type for parameter "{param_name}": {type(value)} '
+                                          f'(value: {value}) -- expected {expected_type}',
+            ))
+        if self.instance is not None:
+            expected_instance = self.instance
+            checks.append((
+                lambda value: not isinstance(value, expected_instance),
+                lambda value, param_name: f'invalid instance for parameter "{param_name}": {type(value)} '
+                                          f'(value: {value}) -- expected {expected_instance}',
+            ))
+        if self.min is not None:
+            minimum = self.min
+            checks.append((
+                lambda value: value < minimum,
+                lambda value, param_name: f'invalid value for parameter "{param_name}" '
+                                          f'(under minima of {minimum}): {value}',
+            ))
+        if self.max is not None:
+            maximum = self.max
+            checks.append((
+                lambda value: value > maximum,
+                lambda value, param_name: f'invalid value for parameter "{param_name}" '
+                                          f'(over maxima if {maximum}): {value}',
+            ))
+        if self.regex is not None:
+            regex = self.regex
+            full_match = re.compile(regex).fullmatch
+            checks.append((
+                lambda value: not full_match(value),
+                lambda value, param_name: f'invalid value for parameter "{param_name}" '
+                                          f'(should match: "{regex}"): {value}',
+            ))
+        if self.in_list is not None:
+            in_list = self.in_list
+            members = _membership(in_list)
+
+            def _not_in_list(value) -> bool:
+                try:
+                    return value not in members
+                except TypeError:
+                    # unhashable values cannot be members of a set of hashable values
+                    return True
+
+            checks.append((
+                _not_in_list,
+                lambda value, param_name: f'invalid value for parameter "{param_name}"; "{value}" '
+                                          f'is not in list: {in_list}',
+            ))
+        if self.path_exists:
+            checks.append((
+                lambda value: not exists(value),
+                lambda value, param_name: f'"{param_name}" file does not exist: {value}',
+            ))
+        checks = tuple(checks)
+        super().__setattr__('_checks', checks)
+        return checks
+
     def validate(self, value, param_name, exc=None, logger=None):
         """
         :param value: value to validate
         :param param_name: name of the value (for logging purpose)
-        :param exc: exception to raise (default is "ValidatorError")
-        :param logger: logger to use (default will be "Validator.logger")
+        :param exc: exception to raise for this call (default is "Validator.exc")
+        :param logger: logger to use for this call (default will be "Validator.logger")
         """
-        if exc is not None:
-            self.exc = exc
-
-        if logger is not None:
-            self.logger = logger
-
-        if self.type is not None and not type(value) == self.type:  # pylint: disable=unidiomatic-typecheck
-            self.error(
-                f'invalid type for parameter "{param_name}": {type(value)} (value: {value}) -- expected {self.type}'
-            )
-
-        if self.instance is not None and not isinstance(value, self.instance):
-            self.error(
-                f'invalid instance for parameter "{param_name}": {type(value)} (value: {value})'
-                f' -- expected {self.instance}'
-            )
-
-        if self.min is not None and value < self.min:
-            self.error(f'invalid value for parameter "{param_name}" (under minima of {self.min}): {value}')
-
-        if self.max is not None and value > self.max:
-            self.error(f'invalid value for parameter "{param_name}" (over maxima if {self.max}): {value}')
-
-        if self.regex is not None and not re_full_match(self.regex, value):
-            self.error(f'invalid value for parameter "{param_name}" (should match: "{self.regex}"): {value}')
-
-        if self.in_list is not None and value not in self.in_list:
-            self.error(f'invalid value for parameter "{param_name}"; "{value}" is not in list: {self.in_list}')
-
-        if self.path_exists and not exists(value):
-            self.error(f'"{param_name}" file does not exist: {value}')
-
+        mode = _STATE.mode
+        if mode != 'immediate':
+            if mode == 'deferred':
+                _STATE.pending.append((self, value, param_name, exc, logger))
+            return True
+
+        return self._validate(value, param_name, exc, logger)
+
+    def _validate(self, value, param_name, exc, logger):
+        checks = self._checks
+        if checks is None:
+            checks = self._compile()
+        for is_invalid, message in checks:
+            if is_invalid(value):
+                self._error(message(value, param_name), exc or self.exc, logger or self.logger)
         return True
 
     def error(self, error_msg):
@@ -82,11 +177,63 @@ class Validator:
             error_msg: message to output
 
         """
-        if self.logger is not None:
-            self.logger.error(error_msg)
+        self._error(error_msg, self.exc, self.logger)
 
-        if self.exc is not None:
-            raise self.exc(error_msg)
+    @staticmethod
+    def _error(error_msg, exc, logger):
+        if logger is not None:
+            logger.error(error_msg)
+
+        if exc is not None:
+            raise exc(error_msg)
+
+
+def _validate_pending(pending: typing.List[tuple]):
+    errors: typing.List[typing.Tuple[typing.Type[Exception], str]] = []
+    for validator, value, param_name, exc, logger in pending:
+        try:
+            validator._validate(value, param_name, exc, logger)  # pylint: disable=protected-access
+        except Exception as error:  # pylint: disable=broad-except
+            errors.append((error.__class__, str(error)))
+    if errors:
+        exc = errors[0][0]
+        raise exc('\n'.join(message for _, message in errors))
+
+
+@contextlib.contextmanager
+def validation(mode: str = 'deferred'):
+    """
+    Changes how values are validated in the current thread, for the duration of the context
+
+    - "immediate": values are validated when they are set (default behaviour)
+    - "deferred": values are validated when the context exits; if any of them is invalid, a single exception listing
+      all the errors is raised (the invalid values have been written by then)
+    - "off": values are not validated
+
+    Nested contexts validate their deferred values when the outermost deferred context exits.
+
+    Args:
+        mode: one of VALIDATION_MODES
+
+    """
+    if mode not in VALIDATION_MODES:
+        raise ValueError(f'invalid validation mode "{mode}", expected one of: {", ".join(VALIDATION_MODES)}')
+    previous_mode, previous_pending = _STATE.mode, _STATE.pending
+    batch = mode == 'deferred' and previous_mode != 'deferred'
+    if batch:
+        _STATE.pending = []
+    _STATE.mode = mode
+    try:
+        yield
+    except BaseException:
+        if batch:
+            _STATE.pending = previous_pending
+        _STATE.mode = previous_mode
+        raise
+    _STATE.mode = previous_mode
+    if batch:
+        pending, _STATE.pending = _STATE.pending, previous_pending
+        _validate_pending(pending)
 
 
 VALID_BOOL = Validator(_type=bool)
@@ -0,0 +1,167 @@
+# coding=utf-8
+"""
+Generates many time and weather variants of a single MIZ file
+
+The source MIZ file is decoded only once; every variant is a clone of it (see Miz.clone), edited and zipped in a
+worker process.
+"""
+import itertools
+import multiprocessing
+import os
+import time as time_
+import typing
+from dataclasses import dataclass
+from pathlib import Path
+
+import elib
+
+import emiz.weather
+from emiz.edit_miz import apply_weather_and_time
+from emiz.mission_time import MissionTime
+from emiz.miz import Miz
+
+LOGGER = elib.custom_logging.get_logger('EMIZ')
+
+# decoded source MIZ, set once per worker process
+_BASE_MIZ: typing.Optional[Miz] = None
+
+
+@dataclass
+class Variant:
+    """
+    Outcome of the generation of a single variant
+    """
+    output: str
+    time: typing.Optional[str]
+    metar: typing.Optional[str]
+    error: str = ''
+    apply_duration: float = 0.0
+    zip_duration: float = 0.0
+
+    @property
+    def duration(self) -> float:
+        """
+        Returns: total time spent on this variant, in seconds
+        """
+        return self.apply_duration + self.zip_duration
+
+
+def _set_base_miz(miz: Miz):
+    global _BASE_MIZ  # pylint: disable=global-statement
+    _BASE_MIZ = miz
+
+
+# pylint: disable=too-many-arguments
+def _make_variant(
+        output: str,
+        time: typing.Optional[str],
+        metar: typing.Optional[str],
+        min_wind: int,
+        max_wind: int,
+) -> Variant:
+    variant = Variant(output=output, time=time, metar=metar)
+    if _BASE_MIZ is None:
+        raise RuntimeError('source MIZ file has not been decoded')
+
+    with _BASE_MIZ.clone() as miz:
+        start = time_.perf_counter()
+        LOGGER.debug('applying METAR and time to variant %s: %s, %s', output, metar, time)
+        try:
+            apply_weather_and_time(miz, metar, time, min_wind, max_wind)
+        except Exception as error:  # pylint: disable=broad-except
+            LOGGER.exception('error while editing variant: %s', output)
+            variant.error = str(error) or type(error).__name__
+            return variant
+        variant.apply_duration = time_.perf_counter() - start
+
+        start = time_.perf_counter()
+        try:
+            miz.zip(output)
+        except OSError:
+            variant.error = f'permission error: cannot write "{output}"; maybe it is in use ?'
+            return variant
+        variant.zip_duration = time_.perf_counter() - start
+
+    return variant
+
+
+def _output_name(stem: str, time: typing.Optional[str], station: typing.Optional[str], taken: set) -> str:
+    parts = [stem]
+    if time:
+        parts.append(time)
+    if station:
+        parts.append(station)
+    name = '_'.join(parts)
+    count = 1
+    while name in taken:
+        count += 1
+        name = f'{"_".join(parts)}_{count}'
+    taken.add(name)
+    return f'{name}.miz'
+
+
+# pylint: disable=too-many-locals
+def generate_variants(
+        infile: typing.Union[str, Path],
+        output_folder: typing.Union[str, Path],
+        times: typing.Iterable[str] = None,
+        metars: typing.Iterable[str] = None,
+        jobs: int = None,
+        min_wind: int = 0,
+        max_wind: int = 40,
+) -> typing.List[Variant]:
+    """
+    Creates one MIZ file per combination of time and METAR
+
+    METARs given as ICAO codes are retrieved once, before any variant is generated.
+
+    Args:
+        infile: source MIZ file
+        output_folder: folder to write the variants into
+        times: time strings to apply (YYYYMMDDHHMMSS)
+        metars: METAR strings or ICAO codes to apply
+        jobs: amount of worker processes (defaults to the amount of CPUs; 1 generates the variants in this process)
+        min_wind: minimum wind
+        max_wind: maximum wind
+
+    Returns: list of Variant, in the order of the combinations (times first)
+
+    """
+    times = list(times or [])
+    metars = list(metars or [])
+    if not times and not metars:
+        raise ValueError('nothing to do!')
+
+    for time in times:
+        MissionTime.from_string(time)
+
+    metar_codes: typing.List[typing.Tuple[str, str]] = []
+    for metar in metars:
+        error, metar_obj = emiz.weather.custom_metar.CustomMetar.get_metar(metar)
+        if error:
+            raise ValueError(error)
+        metar_codes.append((metar_obj.code, metar_obj.station_id))
+
+    infile = elib.path.ensure_file(infile)
+    output_folder = elib.path.ensure_dir(output_folder, must_exist=False)
+    output_folder.mkdir(parents=True, exist_ok=True)
+
+    taken: set = set()
+    tasks = []
+    for time, (metar_code, station) in itertools.product(times or [None], metar_codes or [(None, None)]):
+        output = str(output_folder.joinpath(_output_name(infile.stem, time, station, taken)))
+        tasks.append((output, time, metar_code, min_wind, max_wind))
+
+    jobs = min(jobs or os.cpu_count() or 1, len(tasks))
+    LOGGER.info('generating %s variants of %s using %s worker(s)', len(tasks), infile, jobs)
+
+    with Miz(infile, track_changes=True) as miz:
+        if jobs == 1:
+            _set_base_miz(miz)
+            try:
+                return [_make_variant(*task) for task in tasks]
+            finally:
+                _set_base_miz(None)
+
+        with multiprocessing.Pool(jobs, initializer=_set_base_miz, initargs=(miz,)) as pool:
+            return pool.starmap(_make_variant, tasks)
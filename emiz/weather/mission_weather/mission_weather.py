@@ -10,6 +10,8 @@ from datetime import date, datetime
 import elib
 from metar.Metar import Metar
 
+from emiz.metrics import timed
+
 from ..utils import hpa_to_mmhg
 
 LOGGER = elib.custom_logging.get_logger('EMIZ')
@@ -293,6 +295,7 @@ class MissionWeather:  # pylint: disable=too-many-instance-attributes
             return 0
         return int(min((val - self.wind_at_ground_level_speed) * 10, 60))
 
+    @timed('weather.apply')
     def apply_to_miz(self, miz):
         """
         Applies weather to an opened Miz file (the mission will be mutated)
@@ -84,7 +84,16 @@ setup(
     long_description=read_local_files('README.rst', 'CHANGELOG.rst'),
     packages=find_packages(),
     include_package_data=True,
+    entry_points={
+        'console_scripts': [
+            'emiz=emiz.cli:main',
+        ],
+    },
     install_requires=requirements,
+    extras_require={
+        'arrow': ['pyarrow'],
+        'msgpack': ['msgpack>=1.0'],
+    },
     tests_require=test_requirements,
     python_requires='>=3.6',
     use_scm_version=True,
@@ -0,0 +1,52 @@
+# coding=utf-8
+
+import pytest
+
+from emiz.miz import Miz
+
+pyarrow = pytest.importorskip('pyarrow')
+pyarrow_parquet = pytest.importorskip('pyarrow.parquet')
+
+# pylint: disable=wrong-import-position
+from emiz.arrow_export import COLUMNS, iter_record_batches, record_batches, schema, write_parquet  # noqa: E402
+
+
+def test_record_batches(test_file):
+    with Miz(test_file) as miz:
+        batches = record_batches(miz.mission, 'hash')
+        assert set(batches) == set(COLUMNS)
+        for table, batch in batches.items():
+            assert batch.schema.equals(schema(table))
+        units = batches['units'].to_pydict()
+        assert units['unit_id'] == [unit.unit_id for unit in miz.mission.units]
+        assert units['unit_type'] == [unit.unit_type for unit in miz.mission.units]
+        assert units['x'] == [unit.unit_pos_x for unit in miz.mission.units]
+        assert set(units['mission_hash']) == {'hash'}
+        groups = batches['groups'].to_pydict()
+        assert groups['group_name'] == [group.group_name for group in miz.mission.groups]
+        assert sum(groups['unit_count']) == len(units['unit_id'])
+        statics = batches['statics']
+        assert statics.num_rows == sum(1 for country in miz.mission.countries for _ in country.statics)
+
+
+def test_column_types(test_file):
+    batch = record_batches(Miz.read_mission(test_file))['units']
+    assert batch.schema.field('x').type == pyarrow.float64()
+    assert batch.schema.field('unit_id').type == pyarrow.int32()
+    assert pyarrow.types.is_dictionary(batch.schema.field('unit_type').type)
+
+
+def test_iter_record_batches(test_file, radio_file):
+    results = list(iter_record_batches([test_file, radio_file]))
+    assert [path.name for path, _ in results] == [test_file.name, radio_file.name]
+    hashes = [batches['groups'].to_pydict()['mission_hash'][0] for _, batches in results]
+    assert hashes[0] != hashes[1]
+
+
+def test_write_parquet(test_file, radio_file, tmpdir):
+    paths = write_parquet([test_file, radio_file], str(tmpdir))
+    assert set(paths) == set(COLUMNS)
+    units = pyarrow_parquet.read_table(str(paths['units']))
+    expected = sum(len(list(Miz.read_mission(miz_file).units)) for miz_file in (test_file, radio_file))
+    assert units.num_rows == expected
+    assert units.schema.field('y').type == pyarrow.float64()
@@ -0,0 +1,107 @@
+# coding=utf-8
+
+import asyncio
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import pytest
+
+from emiz.async_miz import AsyncMiz, _zip
+from emiz.miz import Miz
+
+METAR = 'UGTB 240830Z 31017KT CAVOK 11/02 Q1012 R31L/CLRD70 NOSIG'
+
+
+@pytest.fixture(name='loop')
+def _loop():
+    loop = asyncio.new_event_loop()
+    yield loop
+    loop.close()
+
+
+async def _edit(test_file, destination, sltp_executor=None):
+    async with AsyncMiz(test_file, sltp_executor=sltp_executor) as miz:
+        await miz.apply(metar=METAR, time='20180201225000')
+        miz.mission.weather.cloud_density = 4
+        return await miz.save(destination)
+
+
+def _check(destination):
+    with Miz(destination) as miz:
+        assert miz.mission.mission_start_time_as_string == '22:50:00'
+        assert miz.mission.weather.qnh == 759
+        assert miz.mission.weather.cloud_density == 4
+
+
+def test_async_miz(test_file, out_file, loop):
+    assert loop.run_until_complete(_edit(test_file, out_file)) == str(out_file)
+    _check(out_file)
+
+
+def test_async_miz_processes(test_file, out_file, loop):
+    with ProcessPoolExecutor(2) as sltp_executor:
+        loop.run_until_complete(_edit(test_file, out_file, sltp_executor))
+    _check(out_file)
+
+
+def test_async_miz_temp_dir(test_file, loop):
+    async def _open():
+        async with AsyncMiz(test_file) as miz:
+            assert miz.miz.temp_dir.exists()
+            return miz.miz.temp_dir
+
+    assert not loop.run_until_complete(_open()).exists()
+
+
+def test_async_miz_responsive(test_files_folder, loop):
+    ticks = []
+
+    async def _ticker():
+        while True:
+            ticks.append(None)
+            await asyncio.sleep(0.001)
+
+    async def _open():
+        ticker = asyncio.ensure_future(_ticker())
+        async with AsyncMiz(test_files_folder.joinpath('TRMT_6.4.3.miz')) as miz:
+            assert miz.mission.d['theatre']
+        ticker.cancel()
+        await asyncio.wait([ticker])
+
+    loop.run_until_complete(_open())
+    assert len(ticks) > 1
+
+
+def test_async_miz_apply_errors(test_file, loop):
+    async def _apply(**kwargs):
+        async with AsyncMiz(test_file) as miz:
+            await miz.apply(**kwargs)
+
+    with pytest.raises(ValueError):
+        loop.run_until_complete(_apply())
+    with pytest.raises(ValueError):
+        loop.run_until_complete(_apply(time='caribou'))
+
+
+def test_async_miz_cancel_save(test_file, out_file, loop):
+    async def _save():
+        async with AsyncMiz(test_file) as miz:
+            await miz.apply(time='20180201225000')
+            task = asyncio.ensure_future(miz.save(out_file))
+            await asyncio.sleep(0)
+            task.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await task
+        assert not Path(f'{out_file}.part').exists()
+
+    loop.run_until_complete(_save())
+
+
+def test_zip_cancelled(test_file, out_file):
+    with Miz(test_file) as miz:
+        cancelled = threading.Event()
+        cancelled.set()
+        assert _zip(miz, out_file, None, cancelled) == ''
+    assert not out_file.exists()
+    assert not Path(f'{out_file}.part').exists()
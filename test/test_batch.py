@@ -0,0 +1,137 @@
+# coding=utf-8
+
+import json
+from pathlib import Path
+
+import pytest
+from click.testing import CliRunner
+
+from emiz.batch import run_batch
+from emiz.cli import _metar, main
+from emiz.miz import Miz
+
+
+def _size(item: str, offset: int = 0) -> int:
+    return Path(item).stat().st_size + offset
+
+
+def _peek(item: str):
+    return Miz.peek(item).theatre
+
+
+def _fail(item: str):
+    raise ValueError(f'cannot process {Path(item).name}')
+
+
+@pytest.mark.parametrize('jobs', (1, 2))
+def test_run_batch(test_file, radio_file, jobs):
+    batch = run_batch(_size, [test_file, radio_file], (1,), jobs=jobs)
+    assert [task.item for task in batch.tasks] == [str(test_file), str(radio_file)]
+    assert [task.value for task in batch.tasks] == [test_file.stat().st_size + 1, radio_file.stat().st_size + 1]
+    assert not batch.failed
+    assert batch.profile is None
+    assert batch.timings() == []
+
+
+@pytest.mark.parametrize('jobs', (1, 2))
+def test_run_batch_profile_and_timings(test_file, radio_file, jobs):
+    batch = run_batch(_peek, [test_file, radio_file], jobs=jobs, profile=True, timings=True)
+    assert all(task.value for task in batch.tasks)
+    assert all(task.seconds > 0 for task in batch.tasks)
+    assert batch.profile is not None
+    assert any(function_name == 'peek' for _, _, function_name in batch.profile.stats)
+
+
+def test_run_batch_timings(test_file):
+    batch = run_batch(Miz.peek, [test_file], jobs=1, timings=True)
+    assert batch.timings() == []
+    batch = run_batch(_metar, [test_file], ('UGTB', None), jobs=1, timings=True)
+    stages = {stage.name: stage for stage in batch.timings()}
+    assert stages['miz.unzip'].count == 1
+    assert stages['miz.unzip'].size == test_file.stat().st_size
+    assert stages['sltp.decode'].count == 3
+
+
+@pytest.mark.parametrize('jobs', (1, 2))
+def test_run_batch_error(test_file, jobs):
+    batch = run_batch(_fail, [test_file], jobs=jobs)
+    assert batch.failed == batch.tasks
+    assert batch.tasks[0].error == f'cannot process {test_file.name}'
+
+
+def test_cli_peek(test_file, radio_file):
+    result = CliRunner().invoke(main, ['peek', str(test_file), str(radio_file), '-j', '2'])
+    assert result.exit_code == 0, result.output
+    assert f'{test_file}: Caucasus' in result.output
+    assert str(radio_file) in result.output
+
+
+def test_cli_timings_and_profile(test_file, tmpdir):
+    profile_output = Path(str(tmpdir), 'metar.prof')
+    result = CliRunner().invoke(main, ['metar-from-miz', str(test_file), '--icao', 'UGTB', '-j', '1', '--timings',
+                                       '--profile-output', str(profile_output)])
+    assert result.exit_code == 0, result.output
+    assert result.output.startswith('UGTB ')
+    assert 'sltp.decode' in result.output
+    assert 'cumulative' in result.output
+    assert profile_output.exists()
+
+
+def test_cli_edit(test_file, tmpdir):
+    sources = [Path(str(tmpdir), f'{index}.miz') for index in range(3)]
+    for source in sources:
+        source.write_bytes(test_file.read_bytes())
+    output_folder = Path(str(tmpdir), 'edited')
+    result = CliRunner().invoke(main, ['edit', *map(str, sources), '-o', str(output_folder), '-t', '20180101120000'])
+    assert result.exit_code == 0, result.output
+    for source in sources:
+        with Miz(output_folder.joinpath(source.name)) as miz:
+            assert miz.mission.day == 1
+            assert miz.mission.month == 1
+            assert miz.mission.year == 2018
+
+
+def test_cli_edit_nothing_to_do(test_file):
+    result = CliRunner().invoke(main, ['edit', str(test_file)])
+    assert result.exit_code != 0
+    assert 'nothing to do' in result.output
+
+
+def test_cli_edit_failure(test_file, tmpdir):
+    result = CliRunner().invoke(main, ['edit', str(test_file), '-o', str(tmpdir), '-t', 'not a time', '-j', '1'])
+    assert result.exit_code != 0
+    assert 'FAILED' in result.output
+    assert '1 of 1 file(s) failed' in result.output
+
+
+def test_cli_decompose_recompose(test_file, radio_file, tmpdir, monkeypatch):
+    monkeypatch.setenv('XDG_CACHE_HOME', str(Path(str(tmpdir), 'user_cache')))
+    monkeypatch.setenv('LOCALAPPDATA', str(Path(str(tmpdir), 'user_cache')))
+    decomposed = Path(str(tmpdir), 'decomposed')
+    result = CliRunner().invoke(main, ['decompose', str(test_file), str(radio_file), '-o', str(decomposed)])
+    assert result.exit_code == 0, result.output
+    folders = [decomposed.joinpath(test_file.stem), decomposed.joinpath(radio_file.stem)]
+    assert all(folder.is_dir() for folder in folders)
+    result = CliRunner().invoke(main, ['decompose', str(test_file), '-o', str(decomposed), '--incremental'])
+    assert result.exit_code == 0, result.output
+
+    recomposed = Path(str(tmpdir), 'recomposed')
+    result = CliRunner().invoke(main, ['recompose', *map(str, folders), '-o', str(recomposed), '--cache'])
+    assert result.exit_code == 0, result.output
+    for source in (test_file, radio_file):
+        target = recomposed.joinpath(f'{source.stem}.miz')
+        assert Miz.read_mission(target).d == Miz.read_mission(source).d
+
+
+def test_cli_reorder(test_file, tmpdir):
+    result = CliRunner().invoke(main, ['reorder', str(test_file), '-o', str(tmpdir)])
+    assert result.exit_code == 0, result.output
+    assert Path(str(tmpdir), test_file.stem, 'mission').exists()
+
+
+def test_cli_bench_jobs(test_file, radio_file, tmpdir):
+    output = Path(str(tmpdir), 'bench.json')
+    result = CliRunner().invoke(main, ['bench', str(test_file), str(radio_file), '-r', '1', '--no-memory', '-j', '2',
+                                       '-o', str(output)])
+    assert result.exit_code == 0, result.output
+    assert [entry['file'] for entry in json.loads(output.read_text())['results']] == [str(test_file), str(radio_file)]
@@ -0,0 +1,96 @@
+# coding=utf-8
+
+import importlib.util
+import json
+from pathlib import Path
+
+import pytest
+from click.testing import CliRunner
+
+from emiz.bench import _Pipeline, bench_miz, inflate_miz, run_benchmarks
+from emiz.cli import main
+from emiz.miz import Miz
+from emiz.synthetic import MissionSpec, generate_miz
+
+STAGES = [
+    'unzip',
+    'decode:mapResource', 'decode:dictionary', 'decode:mission',
+    'traverse',
+    'encode:mapResource', 'encode:dictionary', 'encode:mission',
+    'zip',
+]
+
+
+def test_bench_miz(test_file):
+    result = bench_miz(test_file, repeat=1)
+    assert [stage.stage for stage in result.stages] == STAGES
+    assert result.groups > 0
+    assert result.units >= result.groups
+    assert result.total == sum(stage.seconds for stage in result.stages)
+    stages = {stage.stage: stage for stage in result.stages}
+    assert stages['unzip'].size == test_file.stat().st_size
+    assert stages['decode:mission'].size > 0
+    assert stages['traverse'].size == 0
+    for stage in result.stages:
+        assert stage.seconds >= 0
+        assert stage.peak_memory > 0
+
+
+def test_bench_miz_no_memory(test_file):
+    result = bench_miz(test_file, repeat=2, memory=False)
+    assert all(stage.peak_memory == 0 for stage in result.stages)
+
+
+def test_run_benchmarks(test_file, tmpdir):
+    output = Path(str(tmpdir), 'bench.json')
+    results = run_benchmarks([test_file], output, repeat=1, memory=False)
+    document = json.loads(output.read_text())
+    assert document['python']
+    assert document['emiz']
+    assert len(document['results']) == 1
+    assert document['results'][0]['file'] == results[0].file
+    assert [stage['stage'] for stage in document['results'][0]['stages']] == STAGES
+
+
+def test_inflate_miz(test_file, out_file):
+    with Miz(test_file) as miz:
+        units = len(list(miz.mission.units))
+    assert inflate_miz(test_file, out_file, units + 10) == out_file
+    with Miz(out_file) as miz:
+        assert len(list(miz.mission.units)) >= units + 10
+        assert miz.mission.get_group_by_name('bench-0') is not None
+
+
+def test_cli(test_file, tmpdir):
+    output = Path(str(tmpdir), 'bench.json')
+    result = CliRunner().invoke(main, ['bench', str(test_file), '-r', '1', '--no-memory', '-o', str(output)])
+    assert result.exit_code == 0, result.output
+    assert 'decode:mission' in result.output
+    assert output.exists()
+
+
+@pytest.fixture(name='bench_files', params=('TRG_KA50.miz', 'TRMT_2.4.0.miz', 'inflated', 'synthetic'))
+def _bench_files(request, test_files_folder, tmpdir):
+    if request.param == 'inflated':
+        yield inflate_miz(test_files_folder.joinpath('test_158.miz'), Path(str(tmpdir), 'inflated.miz'), 2000)
+    elif request.param == 'synthetic':
+        spec = MissionSpec.for_units(10_000, triggers=100, resources=10)
+        yield generate_miz(Path(str(tmpdir), 'synthetic.miz'), spec)
+    else:
+        yield test_files_folder.joinpath(request.param)
+
+
+@pytest.mark.long
+@pytest.mark.skipif(importlib.util.find_spec('pytest_benchmark') is None, reason='pytest-benchmark')
+@pytest.mark.parametrize('stage_name', STAGES)
+def test_benchmark_stage(bench_files, stage_name, tmpdir, benchmark):
+    pipeline = _Pipeline(bench_files, Path(str(tmpdir)))
+    try:
+        stages = pipeline.stages()
+        index = [name for name, _ in stages].index(stage_name)
+        for _, function in stages[:index]:
+            function()
+        benchmark.extra_info['size'] = benchmark(stages[index][1])
+        benchmark.extra_info['peak_memory'] = bench_miz(bench_files, repeat=1).stages[index].peak_memory
+    finally:
+        pipeline.close()
@@ -0,0 +1,69 @@
+# coding=utf-8
+
+import os
+import shutil
+from pathlib import Path
+
+import pytest
+
+from emiz.catalog import MissionCatalog
+from emiz.miz import Miz
+
+
+@pytest.fixture(name='library')
+def _library(tmpdir, test_files_folder):
+    library = Path(str(tmpdir), 'library')
+    library.joinpath('sub').mkdir(parents=True)
+    shutil.copy(str(Path(test_files_folder, 'TRG_KA50.miz')), str(library))
+    shutil.copy(str(Path(test_files_folder, 'radios2.miz')), str(library.joinpath('sub')))
+    shutil.copy(str(Path(test_files_folder, 'bad_zip_file.miz')), str(library))
+    yield library
+
+
+@pytest.fixture(name='catalog')
+def _catalog(tmpdir):
+    with MissionCatalog(str(tmpdir.join('catalog.db'))) as catalog:
+        yield catalog
+
+
+@pytest.mark.parametrize('jobs', [1, 2])
+def test_scan(catalog, library, jobs):
+    result = catalog.scan(library, jobs=jobs)
+    assert (result.added, result.updated, result.removed, result.unchanged, result.errors) == (3, 0, 0, 0, 1)
+    entry = catalog.get(library.joinpath('TRG_KA50.miz'))
+    with Miz(library.joinpath('TRG_KA50.miz')) as miz:
+        assert entry.theatre == miz.mission.d['theatre']
+        assert entry.date == f'{miz.mission.year:04}-{miz.mission.month:02}-{miz.mission.day:02}'
+        assert entry.start_time == miz.mission.mission_start_time
+        assert entry.sortie_name == miz.mission.sortie_name
+        assert entry.countries['blue'] == [country.country_name for country in miz.mission.blue_coa.countries]
+        assert entry.client_slots == len([unit for unit in miz.mission.units if unit.skill == 'Client'])
+        assert sum(count for _, count, _ in entry.unit_types.values()) == len(list(miz.mission.units))
+        assert entry.resources == sorted(miz.map_res.values())
+    assert catalog.get(library.joinpath('bad_zip_file.miz')).error
+
+
+def test_search(catalog, library):
+    catalog.scan(library)
+    assert [Path(entry.path).name for entry in catalog.search()] == ['TRG_KA50.miz', 'radios2.miz']
+    assert [Path(entry.path).name for entry in catalog.search(theatre='Caucasus', client_unit_type='Ka-50')] == [
+        'TRG_KA50.miz'
+    ]
+    assert [Path(entry.path).name for entry in catalog.search(unit_type='SA342M')] == ['radios2.miz']
+    assert not catalog.search(theatre='Nevada')
+    assert not catalog.search(country='caribou')
+
+
+def test_rescan(catalog, library, test_files_folder):
+    catalog.scan(library)
+    result = catalog.scan(library)
+    assert (result.added, result.updated, result.removed, result.unchanged) == (0, 0, 0, 3)
+
+    os.remove(str(library.joinpath('sub', 'radios2.miz')))
+    target = library.joinpath('TRG_KA50.miz')
+    shutil.copy(str(Path(test_files_folder, 'test_158.miz')), str(target))
+    os.utime(str(target), (1, 1))
+    result = catalog.scan(library)
+    assert (result.added, result.updated, result.removed, result.unchanged) == (0, 1, 1, 1)
+    assert catalog.get(library.joinpath('sub', 'radios2.miz')) is None
+    assert catalog.get(target).mtime == 1
@@ -0,0 +1,101 @@
+# coding=utf-8
+
+from zipfile import ZipFile
+
+import pytest
+
+from emiz.compact import compact_miz, referenced_keys
+from emiz.miz import Miz
+
+
+@pytest.fixture(name='trmt_file')
+def _trmt_file(test_files_folder):
+    yield test_files_folder.joinpath('TRMT_6.4.3.miz')
+
+
+def _unused_resources(miz):
+    keys = referenced_keys(miz.mission.d)
+    return miz.resources - {name for key, name in miz.map_res.items() if key in keys}
+
+
+def test_referenced_keys():
+    table = {
+        'sortie': 'DictKey_sortie_5',
+        'trig': {1: 'a_out_text_delay(getValueDictByKey("DictKey_ActionText_12"), 10)'},
+        'files': ['ResKey_Action_3', 'caribou', 12, None],
+    }
+    assert referenced_keys(table) == {'DictKey_sortie_5', 'DictKey_ActionText_12', 'ResKey_Action_3'}
+
+
+def test_compact(trmt_file, out_file):
+    with Miz(trmt_file) as miz:
+        keys = referenced_keys(miz.mission.d)
+        unused_keys = set(miz.l10n) - keys
+        unused_resources = _unused_resources(miz)
+        assert unused_resources
+        sortie = miz.mission.sortie_name
+        report = compact_miz(miz)
+        assert report.removed_keys == len(unused_keys)
+        assert report.removed_resource_keys == 1
+        assert report.removed_resources == len(unused_resources)
+        assert report.merged_resources == 0
+        assert report.bytes_saved > 0
+        assert not unused_resources & miz.resources
+        miz.zip(out_file)
+    with ZipFile(str(out_file)) as zip_file:
+        names = zip_file.namelist()
+        for resource_name in unused_resources:
+            assert f'l10n/DEFAULT/{resource_name}' not in names
+    with Miz(out_file) as miz:
+        assert set(miz.l10n) <= referenced_keys(miz.mission.d)
+        assert miz.mission.sortie_name == sortie
+        assert compact_miz(miz).bytes_saved == 0
+
+
+def test_compact_keeps_keys_outside_mission(trmt_file, tmpdir):
+    with Miz(trmt_file) as miz:
+        unused_keys = sorted(set(miz.l10n) - referenced_keys(miz.mission.d))
+        assert len(unused_keys) >= 3
+        script_key, entry_key, referencing_key = unused_keys[:3]
+        script = tmpdir.join('script.lua')
+        script.write(f'trigger.action.outText(env.getValueDictByKey("{script_key}"), 10)')
+        miz.add_resource(str(script), 'script.lua')
+        miz.map_res['ResKey_script'] = 'script.lua'
+        miz.mission.d['script'] = 'ResKey_script'
+        miz.l10n[referencing_key] = f'see {entry_key}'
+        miz.mission.d['description'] = referencing_key
+        compact_miz(miz)
+        assert script_key in miz.l10n
+        assert entry_key in miz.l10n
+        assert not set(unused_keys[3:]) & set(miz.l10n)
+
+
+def test_compact_merges_identical_resources(trmt_file, out_file):
+    with Miz(trmt_file) as miz:
+        key = next(key for key, name in miz.map_res.items() if name == 'tankers.lua')
+        miz.add_resource(miz.resource_path('mist.lua'), 'mist_copy.lua')
+        miz.map_res[key] = 'mist_copy.lua'
+        unused_resources = _unused_resources(miz)
+        assert 'tankers.lua' in unused_resources
+        report = compact_miz(miz)
+        assert report.merged_resources == 1
+        assert report.removed_resources == len(unused_resources)
+        assert miz.map_res[key] == 'mist.lua'
+        miz.zip(out_file)
+    with ZipFile(str(out_file)) as zip_file:
+        names = zip_file.namelist()
+        assert 'l10n/DEFAULT/mist.lua' in names
+        assert 'l10n/DEFAULT/mist_copy.lua' not in names
+        assert 'l10n/DEFAULT/tankers.lua' not in names
+
+
+def test_compact_clone(trmt_file, out_file):
+    with Miz(trmt_file) as miz:
+        resource_name = sorted(_unused_resources(miz))[0]
+        clone = miz.clone()
+        compact_miz(clone)
+        assert resource_name in miz.resources
+        clone.zip(out_file)
+        assert miz.resource_path(resource_name).exists()
+    with ZipFile(str(out_file)) as zip_file:
+        assert f'l10n/DEFAULT/{resource_name}' not in zip_file.namelist()
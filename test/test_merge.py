@@ -0,0 +1,145 @@
+# coding=utf-8
+
+from emiz.merge import _KEY, merge_miz
+from emiz.miz import Miz
+
+
+def _ids(mission):
+    groups = [group.group_id for group in mission.groups]
+    groups += [static.static_id for coalition in mission.coalitions for static in coalition.statics]
+    units = [unit.unit_id for unit in mission.units]
+    return groups, units
+
+
+def test_merge_into_itself(test_file, out_file):
+    with Miz(test_file) as target, Miz(test_file) as source:
+        groups_before, units_before = _ids(target.mission)
+        group_names = sorted(group.group_name for group in source.mission.groups)
+        report = merge_miz(target, [source])
+        groups_after, units_after = _ids(target.mission)
+        assert len(groups_after) == 2 * len(groups_before)
+        assert len(set(groups_after)) == len(groups_after)
+        assert len(units_after) == 2 * len(units_before)
+        assert len(set(units_after)) == len(units_after)
+        assert report.groups + report.statics == len(groups_before)
+        assert report.units == len(units_before)
+        assert report.remapped_ids >= len(groups_before) + len(units_before)
+        assert report.resources_copied == 0
+        assert report.resources_deduplicated == len(source.map_res)
+        assert sorted(group.group_name for group in target.mission.groups) == sorted(
+            group_names + [f'{name}_2' for name in group_names]
+        )
+        assert target.mission.d['maxDictId'] >= source.mission.d.get('maxDictId', 0)
+        target.zip(out_file)
+    with Miz(out_file) as miz:
+        assert _ids(miz.mission) == (groups_after, units_after)
+
+
+def test_merge_keeps_free_ids(test_file, radio_file):
+    with Miz(test_file) as target, Miz(radio_file) as source:
+        free_groups = set(_ids(source.mission)[0]) - set(_ids(target.mission)[0])
+        merge_miz(target, [source])
+        groups_after, units_after = _ids(target.mission)
+        assert free_groups <= set(groups_after)
+        assert len(set(groups_after)) == len(groups_after)
+        assert len(set(units_after)) == len(units_after)
+
+
+def _key_pairs(source, copy):
+    if isinstance(source, dict):
+        for key, value in source.items():
+            yield from _key_pairs(value, copy[key])
+    elif isinstance(source, list):
+        for value, copied_value in zip(source, copy):
+            yield from _key_pairs(value, copied_value)
+    elif isinstance(source, str) and _KEY.fullmatch(source):
+        yield source, copy
+
+
+def _group_tables(mission_dict):
+    for coalition in mission_dict['coalition'].values():
+        for country in coalition['country'].values():
+            for category in ('helicopter', 'plane', 'ship', 'vehicle', 'static'):
+                if category in country:
+                    yield list(country[category]['group'].values())
+
+
+def test_merge_keys(test_file):
+    with Miz(test_file) as target, Miz(test_file) as source:
+        l10n_before = dict(target.l10n)
+        report = merge_miz(target, [source])
+        assert report.remapped_keys == len(source.l10n) + len(source.map_res)
+        for key, text in l10n_before.items():
+            assert target.l10n[key] == text
+        pairs = []
+        for groups in _group_tables(target.mission.d):
+            # self-merge: the copies of the groups follow the original ones
+            half = len(groups) // 2
+            for group, copy in zip(groups[:half], groups[half:]):
+                pairs.extend(_key_pairs(group, copy))
+        assert pairs
+        for source_key, key in pairs:
+            assert key != source_key
+            assert key not in l10n_before
+            if source_key in source.l10n:
+                # names get a suffix, since the self-merge makes them collide
+                assert target.l10n[key].startswith(source.l10n[source_key])
+            else:
+                assert target.map_res[key] == source.map_res[source_key]
+
+
+def test_merge_renames(test_file, out_file):
+    with Miz(test_file) as target, Miz(test_file) as source:
+        report = merge_miz(target, [source])
+        group_names = [group.group_name for group in target.mission.groups]
+        unit_names = [unit.unit_name for unit in target.mission.units]
+        assert len(set(group_names)) == len(group_names)
+        assert len(set(unit_names)) == len(unit_names)
+        assert report.renamed >= len(group_names) // 2 + len(unit_names) // 2
+        for group in source.mission.groups:
+            assert f'{group.group_name}_2' in group_names
+        target.zip(out_file)
+    with Miz(out_file) as miz:
+        assert [group.group_name for group in miz.mission.groups] == group_names
+
+
+def test_merge_country_in_other_coalition(test_files_folder, radio_file):
+    # Ukraine is blue in the target, red in the source
+    with Miz(test_files_folder.joinpath('test_158.miz')) as target, Miz(radio_file) as source:
+        colors = {country.country_id: country.coa_color for country in target.mission.countries}
+        report = merge_miz(target, [source])
+        assert report.skipped_countries == ['Ukraine']
+        ids = [country.country_id for country in target.mission.countries]
+        assert len(set(ids)) == len(ids)
+        for country in target.mission.countries:
+            assert colors.get(country.country_id, country.coa_color) == country.coa_color
+
+
+def test_merge_triggers(test_files_folder):
+    test_file = test_files_folder.joinpath('TRMT_6.4.3.miz')
+    with Miz(test_file) as target, Miz(test_file) as source:
+        rules_before = len(target.mission.d.get('trigrules', {}))
+        zones_before = len(target.mission.d['triggers']['zones'])
+        report = merge_miz(target, [source])
+        assert report.triggers == rules_before
+        assert report.zones == zones_before
+        assert len(target.mission.d['trigrules']) == 2 * rules_before
+        assert len(target.mission.d['triggers']['zones']) == 2 * zones_before
+        zone_ids = [zone['zoneId'] for zone in target.mission.d['triggers']['zones'].values()]
+        assert len(set(zone_ids)) == len(zone_ids)
+        for name, table in target.mission.d['trig'].items():
+            assert len(table) == 2 * len(source.mission.d['trig'][name])
+
+
+def test_merge_zones_into_triggers_without_zones(test_files_folder):
+    test_file = test_files_folder.joinpath('TRMT_6.4.3.miz')
+    with Miz(test_file) as target, Miz(test_file) as source:
+        zones = len(source.mission.d['triggers']['zones'])
+        target.mission.d['triggers'] = {}
+        clone = target.clone()
+        with clone:
+            report = merge_miz(clone, [source])
+            assert report.zones == zones
+            assert len(clone.mission.d['triggers']['zones']) == zones
+        # the clone shared its tables with the target until the merge
+        assert target.mission.d['triggers'] == {}
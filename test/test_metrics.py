@@ -0,0 +1,157 @@
+# coding=utf-8
+
+import io
+import json
+import threading
+import time
+
+import pytest
+
+from emiz import metrics
+from emiz.edit_miz import edit_miz
+from emiz.metrics import JsonLinesExporter, PrometheusExporter, SpanRecorder, current_span, span, subscribed, timed
+from emiz.miz import Miz
+from emiz.sltp import SLTP
+
+METAR = 'UGTB 240830Z 31017KT CAVOK 11/02 Q1012 R31L/CLRD70 NOSIG'
+
+
+@pytest.fixture(name='recorder')
+def _recorder():
+    recorder = SpanRecorder()
+    with subscribed(recorder):
+        yield recorder
+
+
+def test_edit_miz_spans(test_file, out_file, recorder):
+    assert edit_miz(str(test_file), str(out_file), metar=METAR, time='20180201225000') == ''
+    names = [span_.name for span_ in recorder.spans]
+    for name in ('miz.unzip', 'miz.decode', 'sltp.decode', 'weather.apply', 'time.apply', 'miz.encode',
+                 'sltp.encode', 'miz.zip', 'edit_miz'):
+        assert name in names
+    assert names[-1] == 'edit_miz'
+    edit, = recorder.by_name('edit_miz')
+    assert edit.parent == ''
+    assert edit.seconds >= sum(span_.seconds for span_ in recorder.spans if span_.parent == 'edit_miz')
+    unzip, = recorder.by_name('miz.unzip')
+    assert unzip.parent == 'edit_miz'
+    assert unzip.size == test_file.stat().st_size
+    assert unzip.items > 0
+    zip_, = recorder.by_name('miz.zip')
+    assert zip_.size == out_file.stat().st_size
+    assert recorder.by_name('miz.encode')[0].parent == 'miz.zip'
+    decoded = {span_.attributes['table']: span_ for span_ in recorder.by_name('sltp.decode')}
+    assert set(decoded) == {'mission', 'dictionary', 'mapResource'}
+    assert decoded['mission'].parent == 'miz.decode'
+    assert decoded['mission'].size > 0
+    assert decoded['mission'].items > 0
+    assert 'mission' in {span_.attributes['table'] for span_ in recorder.by_name('sltp.encode')}
+
+
+def test_errors_are_recorded(recorder):
+    with pytest.raises(ValueError):
+        SLTP().decode('caribou = \n{}')
+    with pytest.raises(ZeroDivisionError):
+        with span('custom', kind='test'):
+            _ = 1 / 0
+    custom, = recorder.by_name('custom')
+    assert custom.attributes == {'kind': 'test', 'error': 'ZeroDivisionError'}
+
+
+def test_disabled():
+    assert not metrics.enabled()
+    current = current_span()
+    current.size = 10
+    current.attributes['table'] = 'mission'
+    assert current.size == 0
+    assert current.attributes == {}
+    with span('custom') as current:
+        current.items = 3
+        assert current.items == 0
+
+    @timed('custom')
+    def _func(value):
+        return value
+
+    assert _func(1) == 1
+
+
+def test_timed(recorder):
+    @timed('outer', kind='test')
+    def _outer():
+        current_span().items = 2
+        _inner()
+
+    @timed('inner')
+    def _inner():
+        time.sleep(0.01)
+
+    _outer()
+    inner, outer = recorder.spans
+    assert inner.name == 'inner'
+    assert inner.parent == 'outer'
+    assert inner.seconds >= 0.01
+    assert outer.seconds >= inner.seconds
+    assert outer.items == 2
+    assert outer.attributes == {'kind': 'test'}
+
+
+def test_spans_are_per_thread(recorder):
+    def _worker():
+        with span('worker'):
+            pass
+
+    with span('main'):
+        thread = threading.Thread(target=_worker)
+        thread.start()
+        thread.join()
+    assert recorder.by_name('worker')[0].parent == ''
+
+
+def test_failing_subscriber(recorder):
+    def _fail(_):
+        raise RuntimeError()
+
+    with subscribed(_fail):
+        with span('custom'):
+            pass
+    assert recorder.by_name('custom')
+
+
+def test_json_lines(test_file, tmpdir):
+    stream = io.StringIO()
+    exporter = JsonLinesExporter(stream)
+    with subscribed(exporter):
+        with Miz(test_file):
+            pass
+    lines = [json.loads(line) for line in stream.getvalue().splitlines()]
+    assert {line['name'] for line in lines} == {'miz.unzip', 'miz.decode', 'sltp.decode'}
+    assert all(line['seconds'] >= 0 for line in lines)
+
+    path = str(tmpdir.join('spans.jsonl'))
+    exporter = JsonLinesExporter(path)
+    with subscribed(exporter):
+        with span('custom', kind='test'):
+            pass
+    exporter.close()
+    line = json.loads(open(path).read())
+    assert line['name'] == 'custom'
+    assert line['attributes'] == {'kind': 'test'}
+
+
+def test_prometheus(test_file, tmpdir):
+    exporter = PrometheusExporter()
+    with subscribed(exporter):
+        for _ in range(2):
+            with Miz(test_file):
+                pass
+        with span('quoted', label='a "b"'):
+            pass
+    text = exporter.render()
+    assert '# TYPE emiz_span_seconds_total counter' in text
+    assert 'emiz_span_count_total{span="miz.unzip"} 2' in text
+    assert 'emiz_span_count_total{span="sltp.decode",table="mission"} 2' in text
+    assert 'emiz_span_count_total{span="quoted",label="a \\"b\\""} 1' in text
+    path = tmpdir.join('emiz.prom')
+    exporter.write(str(path))
+    assert path.read() == text
@@ -62,3 +62,61 @@ def test_compare_country(mission):
     assert country1 != country2
     with pytest.raises(ValueError):
         assert country1 == mission.weather
+
+
+def test_add_groups_from_template(mission):
+    template = next(mission.blue_coa.groups)
+    country = mission.blue_coa.get_country_by_name('USA')
+    next_group_id = mission.next_group_id
+    next_unit_id = mission.next_unit_id
+    group_count = len(list(mission.groups))
+    generation = mission.generation
+    positions = [(1000.0 * index, -1000.0 * index) for index in range(1, 51)]
+    names = [f'new_group_{index}' for index in range(1, 51)]
+
+    groups = country.add_groups_from_template(template, positions, names)
+
+    assert len(groups) == 50
+    assert len(list(mission.groups)) == group_count + 50
+    assert mission.generation > generation
+    assert [group.group_name for group in groups] == names
+    assert [group.group_id for group in groups] == list(range(next_group_id, next_group_id + 50))
+    unit_ids = [unit.unit_id for group in groups for unit in group.units]
+    assert unit_ids == list(range(next_unit_id, next_unit_id + len(unit_ids)))
+    assert mission.next_group_id == next_group_id + 50
+    for group, (pos_x, pos_y), name in zip(groups, positions, names):
+        assert group.group_category == template.group_category
+        assert group.country_name == 'USA'
+        expected_unit_names = [f'{name}-{index}' for index in range(1, group.group_size() + 1)]
+        assert [unit.unit_name for unit in group.units] == expected_unit_names
+        for unit, template_unit in zip(group.units, template.units):
+            assert unit.unit_type == template_unit.unit_type
+            assert unit.unit_pos_x - template_unit.unit_pos_x == pytest.approx(pos_x - template._section_group['x'])
+            assert unit.unit_pos_y - template_unit.unit_pos_y == pytest.approx(pos_y - template._section_group['y'])
+    assert template.group_id < next_group_id
+    assert mission.d['maxDictId'] >= max(int(key.split('_')[-1]) for key in mission.l10n)
+
+
+def test_add_groups_from_template_errors(mission):
+    template = next(mission.blue_coa.groups)
+    country = mission.blue_coa.get_country_by_name('USA')
+    with pytest.raises(ValueError):
+        country.add_groups_from_template(template, [(0, 0)], ['a', 'b'])
+    with pytest.raises(ValueError):
+        country.add_groups_from_template(template, [(0, 0), (1, 1)], ['a', 'a'])
+    with pytest.raises(ValueError):
+        country.add_groups_from_template(template, [(0, 0)], [template.group_name])
+    with pytest.raises(ValueError):
+        country.add_groups_from_template(template, [(0, 0)], ['invalid name'])
+
+
+def test_add_groups_from_template_fork(mission):
+    template = next(mission.blue_coa.groups)
+    group_count = len(list(mission.groups))
+    fork = mission.fork()
+    fork.blue_coa.get_country_by_name('USA').add_groups_from_template(
+        next(fork.blue_coa.groups), [(0, 0)], ['forked_group']
+    )
+    assert len(list(fork.groups)) == group_count + 1
+    assert len(list(mission.groups)) == group_count
+    assert template.group_name in [group.group_name for group in fork.groups]
@@ -253,3 +253,76 @@ def test_farps(mission):
     assert len(list(mission.farps())) > 0
     for farp in mission.farps():
         assert isinstance(farp, Static)
+
+
+def test_fork(mission):
+    fork = mission.fork()
+    assert fork.d == mission.d
+    fork.weather.cloud_density = 7
+    fork.day = 3
+    group = list(fork.red_coa.groups)[0]
+    group.group_hidden = not group.group_hidden
+    assert fork.weather.cloud_density == 7
+    assert mission.weather.cloud_density != 7
+    assert mission.day != 3
+    assert list(mission.red_coa.groups)[0].group_hidden != group.group_hidden
+    # untouched tables are still shared
+    assert fork.d['trig'] is mission.d['trig']
+    assert fork.d['coalition']['blue'] is mission.d['coalition']['blue']
+
+
+def test_fork_of_fork(mission):
+    fork = mission.fork()
+    fork.weather.cloud_density = 7
+    sub_fork = fork.fork()
+    sub_fork.weather.cloud_density = 2
+    assert fork.weather.cloud_density == 7
+    assert sub_fork.weather.cloud_density == 2
+    assert mission.weather.cloud_density not in (2, 7)
+
+
+def test_fork_direct_edit(mission):
+    fork = mission.fork()
+    with fork.editing():
+        fork.d['weather']['qnh'] = 742
+    assert fork.weather.qnh == 742
+    assert mission.weather.qnh != 742
+
+
+@pytest.mark.parametrize('validate', ['immediate', 'deferred', 'off'])
+def test_bulk_edit(mission, validate):
+    generation = mission.generation
+    with mission.bulk_edit(validate=validate):
+        for unit in mission.units:
+            unit.unit_name = f'Bulk-{unit.unit_id}'
+        mission.weather.qnh = 742
+    assert mission.generation > generation
+    assert mission.weather.qnh == 742
+    assert all(unit.unit_name == f'Bulk-{unit.unit_id}' for unit in mission.units)
+
+
+def test_bulk_edit_deferred_errors(mission):
+    with pytest.raises(ValueError) as error:
+        with mission.bulk_edit(validate='deferred'):
+            mission.weather.qnh = 5000
+            mission.weather.cloud_density = 8
+            mission.day = 40
+    assert 'qnh' in str(error.value)
+    assert 'day' in str(error.value)
+    # deferred values are written before being validated
+    assert mission.weather.qnh == 5000
+    assert mission.weather.cloud_density == 8
+
+
+def test_bulk_edit_off(mission):
+    with mission.bulk_edit(validate='off'):
+        mission.weather.qnh = 5000
+    assert mission.weather.qnh == 5000
+    with pytest.raises(ValueError):
+        mission.weather.qnh = 5000
+
+
+def test_bulk_edit_invalid_mode(mission):
+    with pytest.raises(ValueError):
+        with mission.bulk_edit(validate='caribou'):
+            pass
@@ -2,10 +2,13 @@
 """
 Test MIZ functionality
 """
+from zipfile import BadZipFile, ZipFile
+
 import pytest
 
 from emiz.mission import Mission
 from emiz.miz import Miz
+from emiz.miz_archive import read_raw_member
 
 
 def test_init(test_file):
@@ -70,3 +73,157 @@ def test_temp_dir_cleaning(test_file):
     assert mis.temp_dir.glob('*')
     mis._remove_temp_dir()
     assert not mis.temp_dir.exists()
+
+
+def _raw_member(miz_file, name):
+    with ZipFile(str(miz_file)) as zip_file:
+        return read_raw_member(zip_file, zip_file.getinfo(name))
+
+
+def test_zip_unchanged_tables(out_file, test_file):
+    with Miz(test_file) as miz:
+        miz.mission.day = 1
+        miz.zip(out_file)
+    for member in ('l10n/DEFAULT/dictionary', 'l10n/DEFAULT/mapResource', 'options', 'warehouses'):
+        assert _raw_member(test_file, member) == _raw_member(out_file, member)
+    assert _raw_member(test_file, 'mission') != _raw_member(out_file, 'mission')
+    with Miz(out_file) as miz:
+        assert miz.mission.day == 1
+
+
+def test_zip_modified_l10n(out_file, test_file):
+    with Miz(test_file) as miz:
+        miz.mission.sortie_name = 'some other name'
+        miz.zip(out_file)
+    assert _raw_member(test_file, 'l10n/DEFAULT/dictionary') != _raw_member(out_file, 'l10n/DEFAULT/dictionary')
+    with Miz(out_file) as miz:
+        assert miz.mission.sortie_name == 'some other name'
+
+
+def test_zip_direct_edit(out_file, test_file):
+    with Miz(test_file) as miz:
+        miz.mission.d['start_time'] = 1234
+        miz.zip(out_file)
+    with Miz(out_file) as miz:
+        assert miz.mission.mission_start_time == 1234
+
+
+def test_zip_track_changes(out_file, test_file):
+    with Miz(test_file, track_changes=True) as miz:
+        miz.zip(out_file)
+    assert _raw_member(test_file, 'mission') == _raw_member(out_file, 'mission')
+
+
+def test_zip_track_changes_direct_edit(out_file, test_file):
+    with Miz(test_file, track_changes=True) as miz:
+        start_time = miz.mission.mission_start_time
+        miz.mission.d['start_time'] = 1234
+        miz.zip(out_file)
+    with Miz(out_file) as miz:
+        # edits made to "d" are not seen without touch()
+        assert miz.mission.mission_start_time == start_time
+    with Miz(test_file, track_changes=True) as miz:
+        miz.mission.d['start_time'] = 1234
+        miz.mission.touch()
+        miz.zip(out_file)
+    with Miz(out_file) as miz:
+        assert miz.mission.mission_start_time == 1234
+
+
+def test_zip_compression_level(test_file, tmpdir):
+    with Miz(test_file) as miz:
+        fast = miz.zip(str(tmpdir.join('fast.miz')), compression_level=1)
+        best = miz.zip(str(tmpdir.join('best.miz')), compression_level=9)
+    with ZipFile(fast) as fast_zip, ZipFile(best) as best_zip:
+        assert fast_zip.namelist() == best_zip.namelist()
+        fast_size = sum(info.compress_size for info in fast_zip.infolist())
+        best_size = sum(info.compress_size for info in best_zip.infolist())
+        for name in fast_zip.namelist():
+            assert fast_zip.read(name) == best_zip.read(name)
+    assert best_size < fast_size
+    with Miz(best) as miz:
+        assert isinstance(miz.mission, Mission)
+
+
+@pytest.mark.parametrize('jobs', [1, 4])
+def test_zip_jobs(test_file, tmpdir, jobs):
+    with Miz(test_file) as miz:
+        miz.mission.day = 1
+        out_file = miz.zip(str(tmpdir.join('out.miz')), compression_level=6, jobs=jobs)
+    with ZipFile(str(test_file)) as source, ZipFile(out_file) as result:
+        assert result.testzip() is None
+        assert sorted(result.namelist()) == sorted(info.filename for info in source.infolist() if not info.is_dir())
+    with Miz(out_file) as miz:
+        assert miz.mission.day == 1
+
+
+def test_peek(test_file):
+    summary = Miz.peek(test_file)
+    with Miz(test_file) as miz:
+        assert summary.theatre == miz.mission.d['theatre']
+        assert summary.day == miz.mission.day
+        assert summary.month == miz.mission.month
+        assert summary.year == miz.mission.year
+        assert summary.mission_start_time == miz.mission.mission_start_time
+        assert summary.sortie_name == miz.mission.sortie_name
+        assert summary.version == miz.mission.d['version']
+
+
+def test_peek_bad_zip_file(bad_zip_file):
+    with pytest.raises(BadZipFile):
+        Miz.peek(bad_zip_file)
+
+
+def test_peek_missing_file(missing_file):
+    with pytest.raises(FileNotFoundError):
+        Miz.peek(missing_file)
+
+
+def test_generation(mission):
+    generation = mission.generation
+    mission.weather.cloud_density = 4
+    assert mission.generation == generation + 1
+    list(mission.blue_coa.groups)[0].group_hidden = True
+    assert mission.generation == generation + 2
+
+
+def test_generation_failed_setter(mission):
+    generation = mission.generation
+    with pytest.raises(ValueError):
+        mission.weather.cloud_density = 42
+    assert mission.generation == generation + 1
+    # the mission is not left in editing mode
+    assert not mission._changes.editing  # pylint: disable=protected-access
+
+
+def test_clone(test_file, tmpdir):
+    with Miz(test_file) as miz:
+        original_day = miz.mission.day
+        outputs = []
+        for day in range(20, 25):
+            clone = miz.clone()
+            with clone:
+                clone.mission.day = day
+                outputs.append(clone.zip(str(tmpdir.join(f'{day}.miz'))))
+        assert miz.mission.day == original_day
+    for day, output in enumerate(outputs, start=20):
+        with Miz(output) as miz:
+            assert miz.mission.day == day
+
+
+def test_read_mission(test_file):
+    mission = Miz.read_mission(test_file)
+    with Miz(test_file) as miz:
+        assert mission.d == miz.mission.d
+        assert mission.l10n == miz.l10n
+
+
+def test_zip_without_raw_write(out_file, test_file, monkeypatch):
+    monkeypatch.setattr('emiz.miz_archive.can_write_raw', lambda zip_file: False)
+    with Miz(test_file) as miz:
+        miz.mission.day = 1
+        miz.zip(out_file)
+    with Miz(test_file) as source, Miz(out_file) as miz:
+        assert miz.mission.day == 1
+        assert miz.l10n == source.l10n
+        assert sorted(miz.zip_content) == sorted(source.zip_content)
@@ -4,7 +4,9 @@ import os
 from pathlib import Path
 
 import pytest
+from click.testing import CliRunner
 
+from emiz.cli import main
 from emiz.mission import Mission
 from emiz.miz import Miz
 
@@ -43,3 +45,28 @@ def test_context(test_file):
         tmpdir = os.path.abspath(miz.temp_dir)
 
     assert not os.path.exists(tmpdir)
+
+
+@pytest.mark.parametrize('table', ['mission', 'warehouses'])
+def test_profile(test_file, table):
+    stats = Miz.profile(test_file, table, top=3)
+    assert stats.tables > 1
+    assert stats.sections
+    assert len(stats.largest_tables) == 3
+
+
+def test_profile_flat_table(test_file):
+    stats = Miz.profile(test_file, 'dictionary')
+    assert stats.tables == 1
+    assert stats.max_depth == 1
+    assert stats.strings > 0
+    assert not stats.largest_tables
+    with pytest.raises(ValueError):
+        Miz.profile(test_file, 'caribou')
+
+
+def test_profile_cli(test_file):
+    result = CliRunner().invoke(main, ['profile', str(test_file), '-n', '2'])
+    assert result.exit_code == 0, result.output
+    assert 'heaviest sections:' in result.output
+    assert 'coalition' in result.output
@@ -0,0 +1,119 @@
+# coding=utf-8
+
+from pathlib import Path
+
+import pytest
+from click.testing import CliRunner
+
+from emiz.bench import bench_layouts
+from emiz.cli import main
+from emiz.miz import Miz
+
+msgpack = pytest.importorskip('msgpack')
+
+# pylint: disable=wrong-import-position
+from emiz.miz_pack import MAGIC, MizPack, decompose_to_pack, recompose_from_pack  # noqa: E402
+
+
+def _members(miz_file):
+    with Miz(miz_file) as miz:
+        return {
+            member.relative_to(miz.temp_dir).as_posix(): member.read_bytes()
+            for member in miz.temp_dir.rglob('*')
+            if member.is_file() and member.name != 'mission'
+        }
+
+
+@pytest.mark.parametrize('block_size', [16 * 1024, 64])
+def test_round_trip(test_file, tmpdir, block_size):
+    pack_file = decompose_to_pack(test_file, Path(str(tmpdir), 'test.emizpack'), block_size=block_size)
+    target = recompose_from_pack(pack_file, Path(str(tmpdir), 'test.miz'))
+    with Miz(test_file) as source, Miz(target) as result:
+        assert result.mission.d == source.mission.d
+        assert result.l10n == source.l10n
+    assert _members(target) == _members(test_file)
+
+
+def test_read(test_file, tmpdir):
+    pack_file = decompose_to_pack(test_file, Path(str(tmpdir), 'test.emizpack'), block_size=256)
+    with Miz(test_file) as miz:
+        mission = miz.mission.d
+        qualifier = miz._mission_qual  # pylint: disable=protected-access
+    with MizPack(pack_file) as pack:
+        assert len(pack.blocks) > 1
+        assert () in pack.blocks
+        assert pack.qualifier == qualifier
+        assert pack.version == mission['version']
+        assert pack.read() == mission
+        assert pack.read('coalition', 'blue') == mission['coalition']['blue']
+        assert pack.read('coalition', 'blue', 'name') == 'blue'
+        for path in pack.blocks:
+            expected = mission
+            for key in path:
+                expected = expected[key]
+            assert pack.read(*path) == expected
+            # keys keep their type and order
+            assert list(pack.read(*path)) == list(expected)
+        with pytest.raises(KeyError):
+            pack.read('no such key')
+
+
+def test_assets(radio_file, tmpdir):
+    pack_file = decompose_to_pack(radio_file, Path(str(tmpdir), 'radio.emizpack'))
+    members = _members(radio_file)
+    with MizPack(pack_file) as pack:
+        assert sorted(pack.assets) == sorted(members)
+        for name in pack.assets:
+            assert pack.asset(name) == members[name]
+
+
+def test_overwrite(test_file, radio_file, tmpdir):
+    pack_file = Path(str(tmpdir), 'test.emizpack')
+    decompose_to_pack(radio_file, pack_file)
+    decompose_to_pack(test_file, pack_file)
+    with Miz(test_file) as miz, MizPack(pack_file) as pack:
+        assert pack.read() == miz.mission.d
+    assert [path.name for path in Path(str(tmpdir)).iterdir()] == ['test.emizpack']
+
+
+def test_not_a_pack(test_file, tmpdir):
+    with pytest.raises(ValueError, match='not a MIZ pack'):
+        MizPack(test_file)
+    pack_file = decompose_to_pack(test_file, Path(str(tmpdir), 'test.emizpack'))
+    data = bytearray(pack_file.read_bytes())
+    data[len(MAGIC)] = 99
+    pack_file.write_bytes(bytes(data))
+    with pytest.raises(ValueError, match='unsupported MIZ pack format'):
+        MizPack(pack_file)
+
+
+def test_bench_layouts(test_file):
+    result = bench_layouts(test_file, repeat=1)
+    stages = {stage.stage: stage for stage in result.stages}
+    assert list(stages) == ['decompose:json', 'recompose:json', 'decompose:pack', 'recompose:pack']
+    assert all(stage.seconds > 0 and stage.size > 0 for stage in result.stages)
+
+
+def test_cli_pack(test_file, tmpdir):
+    decomposed = Path(str(tmpdir), 'decomposed')
+    result = CliRunner().invoke(main, ['decompose', str(test_file), '-o', str(decomposed), '--format', 'pack'])
+    assert result.exit_code == 0, result.output
+    pack_file = decomposed.joinpath(f'{test_file.stem}.emizpack')
+    assert pack_file.is_file()
+    recomposed = Path(str(tmpdir), 'recomposed')
+    result = CliRunner().invoke(main, ['recompose', str(pack_file), '-o', str(recomposed)])
+    assert result.exit_code == 0, result.output
+    with Miz(test_file) as source, Miz(recomposed.joinpath(f'{test_file.stem}.miz')) as target:
+        assert target.mission.d == source.mission.d
+
+
+def test_cli_pack_incremental(test_file, tmpdir):
+    result = CliRunner().invoke(main, ['decompose', str(test_file), '-o', str(tmpdir), '-f', 'pack', '-i'])
+    assert result.exit_code != 0
+    assert '--incremental' in result.output
+
+
+def test_cli_bench_layouts(test_file):
+    result = CliRunner().invoke(main, ['bench', str(test_file), '-r', '1', '--layouts', '-j', '1'])
+    assert result.exit_code == 0, result.output
+    assert 'recompose:pack' in result.output
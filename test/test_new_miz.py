@@ -0,0 +1,247 @@
+# coding=utf-8
+
+import json
+import os
+import queue
+import shutil
+import threading
+import time
+from pathlib import Path
+from zipfile import ZipFile
+
+import pytest
+
+from emiz.miz import Miz
+from emiz.new_miz import NewMiz, _DecompositionPlan, _RecomposeCache
+
+
+@pytest.fixture(autouse=True)
+def _user_cache(tmpdir, monkeypatch):
+    # recompose caches go to the cache folder of the user
+    for variable in ('XDG_CACHE_HOME', 'LOCALAPPDATA'):
+        monkeypatch.setenv(variable, str(Path(str(tmpdir), 'user_cache')))
+
+
+def _tree(folder: Path) -> dict:
+    return {
+        str(path.relative_to(folder)): path.read_bytes() if path.is_file() else None
+        for path in sorted(folder.rglob('*'))
+    }
+
+
+def test_decompose(test_file, tmpdir):
+    output_folder = Path(str(tmpdir))
+    NewMiz.decompose(test_file, output_folder)
+    mission_folder = output_folder.joinpath('mission')
+    assert mission_folder.joinpath('base_info.json').exists()
+    assert mission_folder.joinpath('coalition').is_dir()
+    assert output_folder.joinpath('assets', 'l10n', 'DEFAULT', 'dictionary').exists()
+    assert not output_folder.joinpath('assets', 'mission').exists()
+
+
+def test_decompose_jobs(test_file, tmpdir):
+    sequential = Path(str(tmpdir), 'sequential')
+    parallel = Path(str(tmpdir), 'parallel')
+    NewMiz.decompose(test_file, sequential, jobs=1)
+    NewMiz.decompose(test_file, parallel, jobs=4)
+    assert _tree(sequential) == _tree(parallel)
+
+
+def test_decompose_missing_names(test_file, out_file, tmpdir):
+    with Miz(test_file) as miz:
+        for index, country in miz.mission.d['coalition']['blue']['country'].items():
+            country['name'] = f'DictKey_missing_{index}'
+        miz.zip(out_file)
+    first = Path(str(tmpdir), 'first')
+    second = Path(str(tmpdir), 'second')
+    NewMiz.decompose(out_file, first)
+    NewMiz.decompose(out_file, second)
+    order = first.joinpath('mission', 'coalition', 'blue', 'country', '__order__.json')
+    assert '__MISSING_NAME #001' in order.read_text()
+    assert _tree(first) == _tree(second)
+    # a repeated incremental decomposition does not rename anything
+    for path in first.rglob('*'):
+        os.utime(str(path), (0, 0))
+    NewMiz.decompose(out_file, first, incremental=True)
+    assert not [path for path in first.rglob('*') if path.is_file() and path.stat().st_mtime]
+
+
+def test_decompose_incremental(test_file, out_file, tmpdir):
+    output_folder = Path(str(tmpdir), 'decomposed')
+    NewMiz.decompose(test_file, output_folder)
+    for path in output_folder.rglob('*'):
+        os.utime(str(path), (0, 0))
+    stale_file = output_folder.joinpath('mission', 'stale.json')
+    stale_file.write_text('{}')
+    stale_folder = output_folder.joinpath('assets', 'stale')
+    stale_folder.mkdir()
+
+    with Miz(test_file) as miz:
+        miz.mission.weather.wind_at_ground_level_speed = 7
+        miz.zip(out_file)
+    NewMiz.decompose(out_file, output_folder, incremental=True)
+
+    expected = Path(str(tmpdir), 'expected')
+    NewMiz.decompose(out_file, expected)
+    assert _tree(output_folder) == _tree(expected)
+    assert not stale_file.exists()
+    assert not stale_folder.exists()
+    changed = [path for path in output_folder.rglob('*') if path.is_file() and path.stat().st_mtime]
+    assert output_folder.joinpath('mission', 'weather', 'wind', 'atGround.json') in changed
+    assert len(changed) < 5
+
+
+def test_recompose(test_file, out_file, tmpdir):
+    output_folder = Path(str(tmpdir), 'decomposed')
+    NewMiz.decompose(test_file, output_folder)
+    assert not out_file.exists()
+    NewMiz.recompose(output_folder, out_file)
+    original = Miz.read_mission(test_file)
+    recomposed = Miz.read_mission(out_file)
+    assert recomposed.d == original.d
+    assert recomposed.l10n == original.l10n
+    assert not _RecomposeCache.cache_file_for(output_folder).exists()
+
+
+def test_recompose_existing_target(test_file, out_file, tmpdir, monkeypatch):
+    output_folder = Path(str(tmpdir), 'decomposed')
+    NewMiz.decompose(test_file, output_folder)
+    shutil.copy(str(test_file), str(out_file))
+
+    def _decode(_):
+        raise AssertionError('the target should not be decoded')
+
+    monkeypatch.setattr(Miz, 'decode', _decode)
+    NewMiz.recompose(output_folder, out_file)
+    monkeypatch.undo()
+    assert Miz.read_mission(out_file).d == Miz.read_mission(test_file).d
+
+
+def test_recompose_cache(test_file, out_file, tmpdir):
+    output_folder = Path(str(tmpdir), 'decomposed')
+    NewMiz.decompose(test_file, output_folder)
+    NewMiz.recompose(output_folder, out_file, cache=True)
+    cache_file = _RecomposeCache.cache_file_for(output_folder)
+    assert cache_file.exists()
+    assert str(cache_file).startswith(str(tmpdir.join('user_cache')))
+    # nothing is written to the decomposed folder, which may be shared
+    assert sorted(path.name for path in output_folder.iterdir()) == ['assets', 'mission']
+
+    wind_file = output_folder.joinpath('mission', 'weather', 'wind', 'atGround.json')
+    wind = json.loads(wind_file.read_text(encoding='utf8'))
+    wind['speed'] = 7
+    wind_file.write_text(json.dumps(wind, indent=2), encoding='utf8')
+
+    mission_folder = output_folder.joinpath('mission').absolute()
+    version = Miz.read_mission(test_file).d['version']
+    cache = _RecomposeCache(mission_folder, cache_file, version)
+    assert NewMiz._recreate_dict_from_folder(mission_folder, version, cache) == \
+        NewMiz._recreate_dict_from_folder(mission_folder, version)
+    # "coalition", "trig", ... are reused as a whole; only "weather" and "wind" are rebuilt
+    assert cache.hits > 5
+    assert cache.misses == 3
+
+    NewMiz.recompose(output_folder, out_file, cache=True)
+    assert Miz.read_mission(out_file).weather.wind_at_ground_level_speed == 7
+
+
+def test_recompose_cache_outdated(test_file, out_file, tmpdir):
+    output_folder = Path(str(tmpdir), 'decomposed')
+    NewMiz.decompose(test_file, output_folder)
+    cache_file = _RecomposeCache.cache_file_for(output_folder)
+    cache_file.parent.mkdir(parents=True)
+    cache_file.write_bytes(b'not a cache')
+    NewMiz.recompose(output_folder, out_file, cache=True)
+    assert Miz.read_mission(out_file).d == Miz.read_mission(test_file).d
+    assert cache_file.read_bytes() != b'not a cache'
+
+
+def test_recompose_cache_other_folder(test_file, out_file, tmpdir):
+    output_folder = Path(str(tmpdir), 'decomposed')
+    NewMiz.decompose(test_file, output_folder)
+    NewMiz.recompose(output_folder, out_file, cache=True)
+    copy = Path(str(tmpdir), 'copy')
+    shutil.copytree(str(output_folder), str(copy), copy_function=shutil.copy2)
+    assert _RecomposeCache.cache_file_for(copy) != _RecomposeCache.cache_file_for(output_folder)
+    # even when given the cache of another folder, entries are not reused
+    mission_folder = copy.joinpath('mission').absolute()
+    version = Miz.read_mission(test_file).d['version']
+    cache = _RecomposeCache(mission_folder, _RecomposeCache.cache_file_for(output_folder), version)
+    NewMiz._recreate_dict_from_folder(mission_folder, version, cache)
+    assert cache.hits == 0
+
+
+def test_watch(test_file, out_file, tmpdir):
+    output_folder = Path(str(tmpdir), 'decomposed')
+    NewMiz.decompose(test_file, output_folder)
+    results = queue.Queue()
+    stop = threading.Event()
+    watcher = threading.Thread(
+        target=NewMiz.watch,
+        args=(output_folder, out_file),
+        kwargs=dict(interval=0.05, debounce=0.05, stop=stop, on_recompose=results.put),
+    )
+    watcher.start()
+    try:
+        first = results.get(timeout=60)
+        assert first.mission_changed and first.assets_changed
+        assert Miz.read_mission(out_file).d == Miz.read_mission(test_file).d
+
+        wind_file = output_folder.joinpath('mission', 'weather', 'wind', 'atGround.json')
+        wind = json.loads(wind_file.read_text(encoding='utf8'))
+        wind['speed'] = 7
+        wind_file.write_text(json.dumps(wind, indent=2), encoding='utf8')
+        second = results.get(timeout=60)
+        assert second.mission_changed and not second.assets_changed
+        assert second.parsed == 3
+        assert second.reused > 5
+        assert Miz.read_mission(out_file).weather.wind_at_ground_level_speed == 7
+
+        output_folder.joinpath('assets', 'l10n', 'DEFAULT', 'new.txt').write_text('new')
+        third = results.get(timeout=60)
+        assert third.assets_changed and not third.mission_changed
+        with ZipFile(str(out_file)) as archive:
+            assert 'l10n/DEFAULT/new.txt' in archive.namelist()
+        assert Miz.read_mission(out_file).weather.wind_at_ground_level_speed == 7
+    finally:
+        stop.set()
+        watcher.join()
+    assert _RecomposeCache.cache_file_for(output_folder).exists()
+
+
+def test_watch_error(test_file, out_file, tmpdir):
+    output_folder = Path(str(tmpdir), 'decomposed')
+    NewMiz.decompose(test_file, output_folder)
+    base_info = output_folder.joinpath('mission', 'base_info.json')
+    content = base_info.read_text(encoding='utf8')
+    base_info.write_text('{', encoding='utf8')
+    results = queue.Queue()
+    stop = threading.Event()
+    watcher = threading.Thread(
+        target=NewMiz.watch,
+        args=(output_folder, out_file),
+        kwargs=dict(interval=0.05, debounce=0.05, stop=stop, on_recompose=results.put),
+    )
+    watcher.start()
+    try:
+        time.sleep(0.5)
+        assert results.empty()
+        base_info.write_text(content, encoding='utf8')
+        assert results.get(timeout=60).mission_changed
+    finally:
+        stop.set()
+        watcher.join()
+    assert Miz.read_mission(out_file).d == Miz.read_mission(test_file).d
+
+
+@pytest.mark.parametrize('jobs', (1, 3))
+def test_plan_write(tmpdir, jobs):
+    root = Path(str(tmpdir))
+    plan = _DecompositionPlan(root)
+    plan.add_folder(root.joinpath('a', 'b'))
+    plan.add_folder(root.joinpath('a'))
+    for index in range(plan.batch_size * 2 + 1):
+        plan.add_file(root.joinpath('a', 'b', f'{index}.json'), {'index': index})
+    plan.write(jobs)
+    assert len(list(root.joinpath('a', 'b').iterdir())) == plan.batch_size * 2 + 1
+    assert json.loads(root.joinpath('a', 'b', '3.json').read_text(encoding='utf8')) == {'index': 3}
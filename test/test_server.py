@@ -0,0 +1,267 @@
+# coding=utf-8
+
+import http.client
+import json
+import shutil
+import socket
+import sys
+import threading
+from pathlib import Path
+
+import pytest
+
+from emiz.miz import Miz
+from emiz.server import EditService, make_server
+
+METAR = 'UGTB 240830Z 31017KT CAVOK 11/02 Q1012 R31L/CLRD70 NOSIG'
+
+
+class _UnixConnection(http.client.HTTPConnection):
+
+    def __init__(self, socket_path):
+        super().__init__('localhost')
+        self.socket_path = socket_path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.connect(self.socket_path)
+
+
+@pytest.fixture(name='source')
+def _source(tmpdir, test_file):
+    path = Path(str(tmpdir), test_file.name)
+    shutil.copy(str(test_file), str(path))
+    yield path
+
+
+@pytest.fixture(name='service')
+def _service():
+    service = EditService()
+    yield service
+    service.cache.clear()
+
+
+@pytest.fixture(name='connect')
+def _connect(service):
+    server = make_server(service, port=0)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield lambda: http.client.HTTPConnection('127.0.0.1', server.server_address[1], timeout=60)
+    server.shutdown()
+    server.server_close()
+
+
+def _request(connection, method, path, body=None, content_type='application/json'):
+    connection.request(method, path, body=json.dumps(body) if body is not None else None,
+                       headers={'Content-Type': content_type})
+    response = connection.getresponse()
+    return response.status, json.loads(response.read().decode('utf8'))
+
+
+def test_edit(source, tmpdir, service):
+    output = str(Path(str(tmpdir), 'out.miz'))
+    result = service.edit({'miz': str(source), 'output': output, 'metar': METAR, 'time': '20180201225000'})
+    assert result['output'] == output
+    assert not result['cache_hit']
+    assert service.edit({'miz': str(source), 'output': output, 'time': '20180201225000'})['cache_hit']
+    with Miz(output) as miz:
+        assert miz.mission.mission_start_time_as_string == '22:50:00'
+    with Miz(source) as miz:
+        # the source was not edited, and neither was its cached mission
+        assert miz.mission.mission_start_time_as_string != '22:50:00'
+    cached, _ = service.cache.get(str(source.absolute()))
+    assert cached.mission.mission_start_time_as_string != '22:50:00'
+
+
+def test_edit_in_place(source, service):
+    service.edit({'miz': str(source), 'time': '20180201225000'})
+    result = service.edit({'miz': str(source), 'metar': METAR})
+    assert result['cache_hit']
+    with Miz(source) as miz:
+        assert miz.mission.mission_start_time_as_string == '22:50:00'
+        assert miz.mission.weather.qnh == 759
+
+
+def test_edit_groups(source, service):
+    with Miz(source) as miz:
+        group_name = next(miz.mission.groups).group_name
+    service.edit({'miz': str(source), 'groups': {group_name: 'Renamed'}})
+    with Miz(source) as miz:
+        assert miz.mission.get_group_by_name('Renamed') is not None
+    with pytest.raises(ValueError):
+        service.edit({'miz': str(source), 'groups': {'caribou': 'Renamed'}})
+
+
+def test_edit_radios(radio_file, tmpdir, service):
+    output = str(Path(str(tmpdir), 'out.miz'))
+    service.edit({
+        'miz': str(radio_file), 'output': output,
+        'radios': [{'unit': 'Pilot #001', 'radio': 1, 'channels': {'1': 251.0}}],
+    })
+    with Miz(output) as miz:
+        unit = miz.mission.get_unit_by_name('Pilot #001')
+        assert unit.get_radio_by_number(1).get_frequency(1) == 251.0
+
+
+def test_edit_radios_not_found(radio_file, tmpdir, service):
+    output = str(Path(str(tmpdir), 'out.miz'))
+    for radio in (99, 'caribou'):
+        with pytest.raises(ValueError, match='radio not found'):
+            service.edit({
+                'miz': str(radio_file), 'output': output,
+                'radios': [{'unit': 'Pilot #001', 'radio': radio, 'channels': {'1': 251.0}}],
+            })
+
+
+def test_edit_not_a_miz_file(source, tmpdir, service):
+    with pytest.raises(ValueError, match='not a MIZ file'):
+        service.edit({'miz': str(source), 'output': str(Path(str(tmpdir), '.bashrc')), 'time': '20180201225000'})
+    assert not Path(str(tmpdir), '.bashrc').exists()
+
+
+def test_edit_outside_root(source, tmpdir):
+    root = Path(str(tmpdir), 'root')
+    root.mkdir()
+    service = EditService(root=root)
+    inside = str(root.joinpath('out.miz'))
+    outside = str(Path(str(tmpdir), 'out.miz'))
+    with pytest.raises(ValueError, match='outside of the root folder'):
+        service.edit({'miz': str(source), 'output': inside, 'time': '20180201225000'})
+    shutil.copy(str(source), str(root.joinpath('source.miz')))
+    with pytest.raises(ValueError, match='outside of the root folder'):
+        service.edit({'miz': str(root.joinpath('source.miz')), 'output': outside, 'time': '20180201225000'})
+    with pytest.raises(ValueError, match='outside of the root folder'):
+        service.edit({'miz': str(root.joinpath('source.miz')), 'output': str(root.joinpath('..', 'out.miz')),
+                      'time': '20180201225000'})
+    assert not Path(outside).exists()
+    service.edit({'miz': str(root.joinpath('source.miz')), 'output': inside, 'time': '20180201225000'})
+    assert Path(inside).exists()
+    service.cache.clear()
+
+
+def test_edit_output_is_cached(source, tmpdir, service):
+    other = Path(str(tmpdir), 'other.miz')
+    shutil.copy(str(source), str(other))
+    service.edit({'miz': str(other), 'time': '20180201225000'})
+    assert str(other.absolute()) in service.cache._entries
+    service.edit({'miz': str(source), 'output': str(other), 'time': '20180715063000'})
+    assert str(other.absolute()) not in service.cache._entries
+    cached, cache_hit = service.cache.get(str(other.absolute()))
+    assert not cache_hit
+    assert cached.mission.mission_start_time_as_string == '06:30:00'
+    # no temporary file is left behind
+    assert sorted(path.name for path in Path(str(tmpdir)).iterdir()) == sorted([source.name, other.name])
+
+
+def test_crossed_edits(source, tmpdir, service):
+    other = Path(str(tmpdir), 'other.miz')
+    shutil.copy(str(source), str(other))
+    errors = []
+
+    def _edit(miz, output):
+        try:
+            for _ in range(3):
+                service.edit({'miz': str(miz), 'output': str(output), 'time': '20180201225000'})
+        except Exception as error:  # pylint: disable=broad-except
+            errors.append(error)
+
+    threads = [
+        threading.Thread(target=_edit, args=(source, other)),
+        threading.Thread(target=_edit, args=(other, source)),
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(timeout=120)
+    assert not any(thread.is_alive() for thread in threads)
+    assert not errors
+    for path in (source, other):
+        with Miz(path) as miz:
+            assert miz.mission.mission_start_time_as_string == '22:50:00'
+
+
+def test_source_changed(source, tmpdir, service, test_files_folder):
+    service.edit({'miz': str(source), 'output': str(Path(str(tmpdir), 'out.miz')), 'time': '20180201225000'})
+    shutil.copy(str(test_files_folder.joinpath('time.miz')), str(source))
+    result = service.edit({'miz': str(source), 'output': str(Path(str(tmpdir), 'out.miz')), 'time': '20180201225000'})
+    assert not result['cache_hit']
+
+
+def test_cache_eviction(source, tmpdir, test_files_folder):
+    service = EditService(cache_size=1)
+    other = Path(str(tmpdir), 'other.miz')
+    shutil.copy(str(test_files_folder.joinpath('time.miz')), str(other))
+    for path in (source, other, source):
+        assert not service.edit({'miz': str(path), 'time': '20180201225000'})['cache_hit']
+        assert len(service.cache) == 1
+    service.cache.clear()
+    assert len(service.cache) == 0
+
+
+def test_concurrent_edits(source, service):
+    errors = []
+
+    def _edit(index):
+        try:
+            service.edit({'miz': str(source), 'time': f'201802012{index}0000'})
+        except Exception as error:  # pylint: disable=broad-except
+            errors.append(error)
+
+    threads = [threading.Thread(target=_edit, args=(index,)) for index in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert not errors
+    assert service.stats()['requests'] == 4
+    assert service.stats()['cache_misses'] == 1
+    with Miz(source) as miz:
+        assert miz.mission.mission_start_time_as_string in ('20:00:00', '21:00:00', '22:00:00', '23:00:00')
+
+
+def test_http(source, tmpdir, connect):
+    output = str(Path(str(tmpdir), 'out.miz'))
+    status, body = _request(connect(), 'POST', '/edit', {'miz': str(source), 'output': output, 'metar': METAR})
+    assert status == 200
+    assert body['output'] == output
+    status, body = _request(connect(), 'POST', '/edit', {'miz': str(source), 'output': output, 'metar': METAR})
+    assert status == 200
+    assert body['cache_hit']
+    status, body = _request(connect(), 'POST', '/edit', {'miz': str(source), 'caribou': True})
+    assert status == 400
+    assert 'caribou' in body['error']
+    status, body = _request(connect(), 'POST', '/edit', {'miz': 'missing.miz'})
+    assert status == 400
+    status, stats = _request(connect(), 'GET', '/stats')
+    assert status == 200
+    assert stats['requests'] == 4
+    assert stats['errors'] == 2
+    assert stats['cache_hit_rate'] == 0.5
+    assert stats['latency']['max'] >= stats['latency']['p50'] > 0
+    status, _ = _request(connect(), 'GET', '/caribou')
+    assert status == 404
+
+
+def test_http_content_type(source, tmpdir, connect):
+    output = Path(str(tmpdir), 'out.miz')
+    status, body = _request(connect(), 'POST', '/edit', {'miz': str(source), 'output': str(output), 'metar': METAR},
+                            content_type='text/plain')
+    assert status == 415
+    assert 'application/json' in body['error']
+    assert not output.exists()
+
+
+@pytest.mark.skipif(sys.platform == 'win32', reason='Unix sockets')
+def test_unix_socket(source, tmpdir, service):
+    socket_path = str(Path(str(tmpdir), 'emiz.sock'))
+    server = make_server(service, socket_path=socket_path)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        status, body = _request(_UnixConnection(socket_path), 'POST', '/edit',
+                                {'miz': str(source), 'time': '20180201225000'})
+        assert status == 200
+        assert body['output'] == str(source.absolute())
+    finally:
+        server.shutdown()
+        server.server_close()
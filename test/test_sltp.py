@@ -4,7 +4,7 @@ import datadiff
 import pytest
 
 from emiz.miz import ENCODING
-from emiz.sltp import SLTP, SLTPParsingError
+from emiz.sltp import SLTP, SLTPParsingError, peek
 
 
 def _assert_same(input_, output):
@@ -59,3 +59,61 @@ def test_encode_decode_files_fail(sltp_fail):
 
 def test_encode_decode_files_diff(sltp_diff):
     _do_test(sltp_diff, _assert_different)
+
+
+def test_peek(sltp_pass):
+    with open(sltp_pass, encoding=ENCODING) as f:
+        decoded_data, _ = SLTP().decode(f.read())
+    keys = list(decoded_data)[-3:]
+    with open(sltp_pass, encoding=ENCODING) as f:
+        assert peek(f, keys) == {key: decoded_data[key] for key in keys}
+
+
+def test_peek_nested_keys_are_ignored():
+    text = 'mission = \n{\n    ["a"] =\n    {\n        ["b"] = "}{--\\"",\n        ["c"] = 2,\n    }, -- end of ["a"]\n' \
+           '    ["c"] = 1,\n} -- end of mission\n'
+    assert peek(text.splitlines(keepends=True), ['b', 'c']) == {'c': 1}
+
+
+def test_decode_stats():
+    text = 'mission = \n{\n    ["a"] = \n    {\n        [1] = \n        {\n            ["b"] = "some text",\n' \
+           '        }, -- end of [1]\n        [2] = "x",\n    }, -- end of ["a"]\n    ["c"] = 1,\n' \
+           '    ["d"] = \n    {\n        [1] = "y",\n    }, -- end of ["d"]\n} -- end of mission\n'
+    decoded, qualifier = SLTP().decode(text)
+    stats_decoded, stats_qualifier, stats = SLTP().decode(text, stats=True, top=2)
+    assert stats_decoded == decoded
+    assert stats_qualifier == qualifier
+    assert stats.tables == 4
+    assert stats.max_depth == 3
+    assert stats.strings == 7
+    assert stats.string_chars == len('abc' 'some text' 'x' 'dy')
+    assert stats.size > 0
+    assert stats.seconds > 0
+    assert [table.path for table in stats.largest_tables] == ['a', 'a/1']
+    assert stats.largest_tables[0].entries == 2
+    assert sorted(section.path for section in stats.sections) == ['a', 'c', 'd']
+    assert stats.sections[0].seconds >= stats.sections[-1].seconds
+
+
+def test_decode_stats_files(sltp_pass):
+    with open(sltp_pass, encoding=ENCODING) as f:
+        text = f.read()
+    decoded, _ = SLTP().decode(text)
+    stats_decoded, _, stats = SLTP().decode(text, stats=True)
+    assert stats_decoded == decoded
+    assert stats.tables >= 1
+    assert len(stats.sections) == len(decoded)
+
+
+def test_encode_memo(sltp_pass):
+    data, qualifier = SLTP().decode(sltp_pass.read_text(encoding=ENCODING))
+    memo = {}
+    expected = SLTP().encode(data, qualifier)
+    assert SLTP().encode(data, qualifier, memo) == expected
+    assert memo or not data
+    # re-uses the unchanged tables; a modified copy of the top-level table is encoded again
+    assert SLTP().encode(data, qualifier, memo) == expected
+    changed = dict(data)
+    changed['memo_test'] = 1
+    assert SLTP().encode(changed, qualifier, memo) == SLTP().encode(changed, qualifier)
+    assert all(entry[0] is not data for entry in memo.values())
@@ -0,0 +1,60 @@
+# coding=utf-8
+
+from pathlib import Path
+
+import pytest
+
+from emiz.mission_tables import TABLES, mission_tables
+from emiz.miz import Miz
+from emiz.sqlite_export import SQLiteExporter
+
+
+def _count(exporter, table):
+    return exporter.connection.execute(f'SELECT COUNT(*) FROM {table}').fetchone()[0]
+
+
+def test_mission_tables(test_file):
+    with Miz(test_file) as miz:
+        mission = miz.mission
+        tables = mission_tables(mission, 'hash')
+        assert set(tables) == set(TABLES)
+        for table, rows in tables.items():
+            for row in rows:
+                assert len(row) == len(TABLES[table])
+                assert row[0] == 'hash'
+        assert len(tables['units']) == len(list(mission.units))
+        assert len(tables['groups']) == len(list(mission.groups))
+        assert len(tables['countries']) == len(list(mission.countries))
+        assert tables['missions'][0][2] == mission.sortie_name
+        assert tables['weather'][0][3] == mission.weather.qnh
+
+
+@pytest.mark.parametrize('jobs', [1, 2])
+def test_export_miz_files(test_file, radio_file, bad_zip_file, jobs):
+    with SQLiteExporter() as exporter:
+        result = exporter.export_miz_files([test_file, radio_file, bad_zip_file], jobs=jobs)
+        assert (result.exported, result.skipped, result.errors) == (2, 0, 1)
+        assert _count(exporter, 'missions') == 2
+        assert _count(exporter, 'radio_presets') > 0
+        assert _count(exporter, 'sources') == 3
+        units = _count(exporter, 'units')
+
+        result = exporter.export_miz_files([test_file, radio_file, bad_zip_file], jobs=jobs)
+        assert (result.exported, result.skipped, result.errors) == (0, 3, 0)
+
+        result = exporter.export_miz_files([test_file], incremental=False, jobs=jobs)
+        assert (result.exported, result.skipped, result.errors) == (1, 0, 0)
+        assert _count(exporter, 'missions') == 2
+        assert _count(exporter, 'units') == units
+
+
+def test_export_mission(mission, tmpdir):
+    database = Path(str(tmpdir), 'export.db')
+    with SQLiteExporter(database) as exporter:
+        assert exporter.export_mission(mission, 'some_hash')
+        assert not exporter.export_mission(mission, 'some_hash')
+        assert exporter.export_mission(mission, 'some_hash', incremental=False)
+    with SQLiteExporter(database) as exporter:
+        assert _count(exporter, 'missions') == 1
+        assert exporter.has_mission('some_hash')
+        assert not exporter.has_mission('other_hash')
@@ -0,0 +1,89 @@
+# coding=utf-8
+
+import pytest
+from click.testing import CliRunner
+
+from emiz.cli import main
+from emiz.compact import referenced_keys
+from emiz.miz import Miz
+from emiz.synthetic import MissionSpec, generate_miz
+
+
+@pytest.fixture(name='spec')
+def _spec():
+    yield MissionSpec(seed=3, countries=2, groups=5, units_per_group=3, route_points=4, statics=2, triggers=3,
+                      dictionary_entries=7, resources=2, resource_size=100)
+
+
+def test_generate_miz(spec, tmpdir):
+    destination = generate_miz(str(tmpdir.join('synthetic.miz')), spec)
+    with Miz(destination) as miz:
+        mission = miz.mission
+        assert len(list(mission.groups)) == 20
+        assert len(list(mission.units)) == spec.units == 60
+        for group in mission.groups:
+            assert group.group_name == group.group_category + f'-{group.group_id}'
+            assert len(group._section_group['route']['points']) == 4  # pylint: disable=protected-access
+            for number, unit in enumerate(group.units, start=1):
+                assert unit.unit_name == f'{group.group_name}-{number}'
+        for coalition in mission.coalitions:
+            countries = [country for country in coalition.countries if list(country.groups)]
+            assert len(countries) == 2
+            assert sum(1 for country in countries for _ in country.statics) == 4
+        assert len(mission.d['trigrules']) == 5
+        assert len(mission.d['triggers']['zones']) == 3
+        assert miz.resources == {'script-1.lua', 'script-2.lua'}
+        assert sorted(miz.map_res.values()) == ['script-1.lua', 'script-2.lua']
+        for resource in miz.resources:
+            assert miz.resource_path(resource).stat().st_size == 100
+        unreferenced = set(miz.l10n) - referenced_keys(mission.d)
+        assert len(unreferenced) == 7
+
+
+def test_generate_miz_deterministic(spec, tmpdir):
+    first = generate_miz(str(tmpdir.join('first.miz')), spec)
+    second = generate_miz(str(tmpdir.join('second.miz')), spec)
+    other = generate_miz(str(tmpdir.join('other.miz')), MissionSpec(seed=4))
+    with Miz(first) as miz_1, Miz(second) as miz_2, Miz(other) as miz_3:
+        assert miz_1.mission.d == miz_2.mission.d
+        assert miz_1.l10n == miz_2.l10n
+        assert miz_1.map_res == miz_2.map_res
+        for resource in miz_1.resources:
+            assert miz_1.resource_path(resource).read_bytes() == miz_2.resource_path(resource).read_bytes()
+        assert miz_1.mission.d != miz_3.mission.d
+
+
+def test_for_units():
+    spec = MissionSpec.for_units(1000, coalitions=1, units_per_group=6)
+    assert spec.coalitions == 1
+    assert spec.units_per_group == 6
+    assert spec.groups == 167
+    assert spec.units >= 1000
+    assert MissionSpec.for_units(0).groups == 1
+
+
+def test_single_coalition(tmpdir):
+    destination = generate_miz(str(tmpdir.join('synthetic.miz')), MissionSpec(coalitions=1, groups=3))
+    with Miz(destination) as miz:
+        assert len(list(miz.mission.blue_coa.groups)) == 3
+        assert not list(miz.mission.red_coa.groups)
+
+
+@pytest.mark.parametrize(
+    'kwargs',
+    [{'coalitions': 0}, {'coalitions': 3}, {'countries': 0}, {'units_per_group': 0}, {'route_points': 0},
+     {'groups': -1}, {'resources': -1}, {'countries': 50}]
+)
+def test_invalid_spec(kwargs, tmpdir):
+    with pytest.raises(ValueError):
+        generate_miz(str(tmpdir.join('synthetic.miz')), MissionSpec(**kwargs))
+
+
+def test_cli(tmpdir):
+    destination = str(tmpdir.join('synthetic.miz'))
+    result = CliRunner().invoke(main, ['generate', destination, '-u', '100', '--seed', '1', '--statics', '1'])
+    assert result.exit_code == 0, result.output
+    with Miz(destination) as miz:
+        assert len(list(miz.mission.units)) == 104
+    result = CliRunner().invoke(main, ['generate', destination, '--coalitions', '3'])
+    assert result.exit_code != 0
@@ -0,0 +1,112 @@
+# coding=utf-8
+"""
+Stress tests for concurrent use of Miz, Mission and validators in a single process
+"""
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import pytest
+
+from emiz.mission import Mission
+from emiz.miz import Miz
+from emiz.validator import VALID_INT, VALID_STR, validation
+
+THREADS = 8
+
+
+def _run(function, count):
+    barrier = threading.Barrier(min(THREADS, count))
+
+    def _task(index):
+        barrier.wait()
+        return function(index)
+
+    with ThreadPoolExecutor(THREADS) as executor:
+        return list(executor.map(_task, range(count)))
+
+
+def test_validators_exceptions():
+    exceptions = [type(f'Error{index}', (Exception,), {}) for index in range(THREADS)]
+
+    def _validate(index):
+        for _ in range(2000):
+            with pytest.raises(exceptions[index]):
+                VALID_INT.validate('1', 'value', exc=exceptions[index])
+            VALID_STR.validate('1', 'value')
+        return True
+
+    assert all(_run(_validate, THREADS))
+    assert VALID_INT.exc is ValueError
+
+
+def test_validation_modes():
+    def _validate(index):
+        mode = ('immediate', 'off')[index % 2]
+        with validation(mode):
+            for _ in range(2000):
+                try:
+                    VALID_INT.validate('1', 'value')
+                except ValueError:
+                    if mode == 'off':
+                        return False
+                else:
+                    if mode == 'immediate':
+                        return False
+        return True
+
+    assert all(_run(_validate, THREADS))
+
+
+def test_edit_missions(mission):
+    def _edit(index):
+        fork = mission.fork()
+        with fork.bulk_edit(validate='deferred'):
+            fork.weather.qnh = 740 + index
+            fork.day = index + 1
+            for unit in fork.units:
+                unit.unit_name = f'Unit-{index}-{unit.unit_id}'
+        for _ in range(50):
+            with pytest.raises(ValueError):
+                fork.weather.qnh = 0
+        return fork
+
+    forks = _run(_edit, THREADS * 2)
+    for index, fork in enumerate(forks):
+        assert fork.weather.qnh == 740 + index
+        assert fork.day == index + 1
+        assert all(unit.unit_name == f'Unit-{index}-{unit.unit_id}' for unit in fork.units)
+    assert all(not unit.unit_name.startswith('Unit-') for unit in mission.units)
+
+
+def test_edit_miz_files(test_file, tmpdir):
+    def _edit(index):
+        output = Path(str(tmpdir), f'{index}.miz')
+        with Miz(test_file) as miz:
+            miz.mission.weather.qnh = 740 + index
+            miz.mission.mission_start_time = index * 60
+            for unit in miz.mission.units:
+                unit.unit_name = f'Unit-{index}-{unit.unit_id}'
+            miz.zip(output)
+        return output
+
+    outputs = _run(_edit, THREADS * 2)
+    for index, output in enumerate(outputs):
+        with Miz(output) as miz:
+            mission: Mission = miz.mission
+            assert mission.weather.qnh == 740 + index
+            assert mission.mission_start_time == index * 60
+            assert all(unit.unit_name == f'Unit-{index}-{unit.unit_id}' for unit in mission.units)
+
+
+def test_zip_clones(test_file, tmpdir):
+    with Miz(test_file) as miz:
+        def _edit(index):
+            clone = miz.clone()
+            clone.mission.weather.qnh = 740 + index
+            return clone.zip(Path(str(tmpdir), f'{index}.miz'))
+
+        outputs = _run(_edit, THREADS * 2)
+    for index, output in enumerate(outputs):
+        with Miz(output) as miz:
+            assert miz.mission.weather.qnh == 740 + index
@@ -0,0 +1,112 @@
+# coding=utf-8
+
+import logging
+import threading
+
+import pytest
+
+from emiz.validator import VALID_INT, Validator, validation
+
+
+def test_validate():
+    validator = Validator(_type=int, _min=0, _max=10)
+    assert validator.validate(5, 'value')
+    for value in (-1, 11, 5.0, '5'):
+        with pytest.raises(ValueError):
+            validator.validate(value, 'value')
+
+
+def test_messages():
+    with pytest.raises(ValueError, match=r'invalid type for parameter "caribou"'):
+        VALID_INT.validate('1', 'caribou')
+    with pytest.raises(ValueError, match=r'under minima of 0'):
+        Validator(_min=0).validate(-1, 'value')
+    with pytest.raises(ValueError, match=r'should match'):
+        Validator(_regex=r'[0-9]{3}').validate('12', 'value')
+    with pytest.raises(ValueError, match=r'"meh" is not in list'):
+        Validator(_in_list=['a', 'b']).validate('meh', 'value')
+
+
+def test_in_list_unhashable():
+    validator = Validator(_in_list=['a', 'b'])
+    with pytest.raises(ValueError):
+        validator.validate(['a'], 'value')
+    assert Validator(_in_list=[['a'], 'b']).validate(['a'], 'value')
+
+
+def test_does_not_mutate_validator():
+    class CustomError(Exception):
+        pass
+
+    logger = logging.getLogger('test_validator')
+    validator = Validator(_type=int)
+    with pytest.raises(CustomError):
+        validator.validate('1', 'value', exc=CustomError, logger=logger)
+    assert validator.exc is ValueError
+    assert validator.logger is None
+    with pytest.raises(ValueError):
+        validator.validate('1', 'value')
+
+
+def test_rules_are_recompiled():
+    validator = Validator(_type=int, _max=10)
+    with pytest.raises(ValueError):
+        validator.validate(12, 'value')
+    validator.max = 20
+    assert validator.validate(12, 'value')
+
+
+def test_deferred():
+    validator = Validator(_type=int, _max=10)
+    with pytest.raises(ValueError) as error:
+        with validation('deferred'):
+            assert validator.validate(11, 'first')
+            assert validator.validate(5, 'second')
+            assert validator.validate(12, 'third')
+    assert 'first' in str(error.value)
+    assert 'second' not in str(error.value)
+    assert 'third' in str(error.value)
+    with pytest.raises(ValueError):
+        validator.validate(11, 'value')
+
+
+def test_deferred_nested():
+    validator = Validator(_max=10)
+    with pytest.raises(ValueError):
+        with validation('deferred'):
+            with validation('deferred'):
+                validator.validate(11, 'value')
+            with validation('off'):
+                validator.validate(12, 'ignored')
+    with validation('deferred'):
+        with pytest.raises(ValueError):
+            with validation('immediate'):
+                validator.validate(11, 'value')
+
+
+def test_deferred_discarded_on_error():
+    validator = Validator(_max=10)
+    with pytest.raises(KeyError):
+        with validation('deferred'):
+            validator.validate(11, 'value')
+            raise KeyError()
+    with validation('deferred'):
+        pass
+
+
+def test_validation_is_thread_local():
+    validator = Validator(_max=10)
+    errors = []
+
+    def _validate():
+        try:
+            validator.validate(11, 'value')
+        except ValueError as error:
+            errors.append(error)
+
+    with validation('off'):
+        thread = threading.Thread(target=_validate)
+        thread.start()
+        thread.join()
+        assert validator.validate(11, 'value')
+    assert len(errors) == 1
@@ -0,0 +1,64 @@
+# coding=utf-8
+
+from pathlib import Path
+
+import pytest
+from click.testing import CliRunner
+
+import emiz.variants
+from emiz.cli import main
+from emiz.miz import Miz
+from emiz.variants import generate_variants
+
+METAR = 'UGTB 240830Z 31017KT CAVOK 11/02 Q1012 R31L/CLRD70 NOSIG'
+TIMES = ('20180201225000', '20180715063000')
+
+
+@pytest.mark.parametrize('jobs', [1, 2])
+def test_generate_variants(test_file, tmpdir, jobs):
+    results = generate_variants(test_file, str(tmpdir), times=TIMES, metars=[METAR], jobs=jobs)
+    assert len(results) == 2
+    for variant, start_time in zip(results, ('22:50:00', '06:30:00')):
+        assert not variant.error
+        assert variant.zip_duration > 0
+        assert Path(variant.output).exists()
+        with Miz(variant.output) as miz:
+            assert miz.mission.mission_start_time_as_string == start_time
+            assert miz.mission.weather.qnh == 759
+
+
+def test_generate_variants_nothing_to_do(test_file, tmpdir):
+    with pytest.raises(ValueError):
+        generate_variants(test_file, str(tmpdir))
+
+
+def test_generate_variants_bad_time(test_file, tmpdir):
+    with pytest.raises(ValueError):
+        generate_variants(test_file, str(tmpdir), times=['caribou'])
+
+
+def test_cli_variants(test_file, tmpdir):
+    result = CliRunner().invoke(main, ['variants', str(test_file), '-o', str(tmpdir), '-t', TIMES[0], '-j', '1'])
+    assert result.exit_code == 0, result.output
+    assert len(list(Path(str(tmpdir)).glob('*.miz'))) == 1
+
+
+def test_generate_variants_weather_not_applied(test_file, tmpdir, monkeypatch):
+    monkeypatch.setattr('emiz.weather.mission_weather.MissionWeather.apply_to_miz', lambda self, miz: False)
+    results = generate_variants(test_file, str(tmpdir), metars=[METAR], jobs=1)
+    assert results[0].error == 'error while applying METAR to mission'
+    assert not Path(results[0].output).exists()
+
+
+def test_generate_variants_error(test_file, tmpdir, monkeypatch):
+    apply = emiz.variants.apply_weather_and_time
+
+    def _apply(miz, metar, time, *args):
+        if time == TIMES[0]:
+            raise RuntimeError('some error')
+        apply(miz, metar, time, *args)
+
+    monkeypatch.setattr(emiz.variants, 'apply_weather_and_time', _apply)
+    results = generate_variants(test_file, str(tmpdir), times=TIMES, jobs=1)
+    assert [variant.error for variant in results] == ['some error', '']
+    assert Path(results[1].output).exists()